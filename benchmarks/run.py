@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# Offline benchmarks of the scrapers, the evaluation, the store and the
+# startup of the analyser command.
+#
+# The data source responses are served from the pages in benchmarks/fixtures
+# via the HTTP cache in offline mode, price histories and the store are
+# created in a temporary directory. Results are printed and written as JSON
+# with --output.
+#
+# The fixtures are synthetic, the benchmarks run without network access and
+# must not change when the websites change. They contain the elements the
+# scrapers parse in the structure of the real responses, the yahoo page is
+# padded with filler data to the size of a real quote page.
+#
+#   python benchmarks/run.py -o results.json
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+import numpy as np
+
+BASEDIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(BASEDIR, ".."))
+
+from stockanalyser import config
+from stockanalyser.store import Store
+from stockanalyser.stock import Stock, Cap, EPS
+from stockanalyser.mymoney import Money
+from stockanalyser.analysis import batch, levermann
+from stockanalyser.analysis.levermann import Levermann
+from stockanalyser.data_source import common, alphavantage, yahoo
+from stockanalyser.data_source.cache import ResponseCache
+from stockanalyser.data_source.onvista import OnvistaScraper
+from stockanalyser.data_source.finanzen_net import FinanzenNetScraper
+from stockanalyser.data_source.price_history import (PriceHistory, PriceStore,
+                                                     DTYPE, from_time_series)
+
+FIXTURES_PATH = os.path.join(BASEDIR, "fixtures")
+ROOT_PATH = os.path.join(BASEDIR, "..")
+ANALYSER = os.path.join(ROOT_PATH, "analyser")
+
+# runs the analyser command with the data path and store passed as first
+# arguments
+RUN_ANALYSER = """
+import runpy
+import sys
+from stockanalyser import config
+config.DATA_PATH, config.STORE_PATH = sys.argv[1:3]
+sys.argv = [sys.argv[3]] + sys.argv[4:]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+ONVISTA_URL = "http://www.onvista.de/aktien/Bayer-Aktie-DE000BAY0017"
+FINANZEN_NET_URL = "http://www.finanzen.net/aktien/Allianz-Aktie"
+FINANZEN_NET_TERMINE_URL = "http://www.finanzen.net/termine/Allianz"
+YAHOO_SYMBOL = "VOW3.DE"
+# number of trading days of a full alphavantage response
+FULL_TIME_SERIES_DAYS = 5000
+
+REFERENCE_INDICES = ("^GDAXI", "^MDAXI", "^SDAXI")
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES_PATH, name), "rb") as f:
+        return f.read()
+
+
+def time_series_url(symbol, outputsize):
+    return (alphavantage.BASE_URL + "?function=TIME_SERIES_DAILY_ADJUSTED"
+            "&apikey=" + alphavantage.API_KEY + "&outputsize=" + outputsize +
+            "&symbol=" + symbol)
+
+
+def full_time_series():
+    # returns a "Time Series (Daily)" dict of a full response, the quotes of
+    # the compact fixture are repeated
+    quotes = list(json.loads(fixture("alphavantage_time_series.json")
+                             .decode("utf-8"))["Time Series (Daily)"]
+                  .values())
+    d = datetime.date(2017, 6, 30)
+    series = {}
+    while len(series) < FULL_TIME_SERIES_DAYS:
+        if d.weekday() < 5:
+            series[d.isoformat()] = quotes[len(series) % len(quotes)]
+        d -= datetime.timedelta(days=1)
+    return series
+
+
+def record_responses(cache):
+    onvista = OnvistaScraper(ONVISTA_URL)
+    cache.put(onvista.overview_url, fixture("onvista_overview.html"))
+    cache.put(onvista.fundamental_url, fixture("onvista_fundamental.html"))
+    cache.put(FINANZEN_NET_URL, fixture("finanzen_net_stock.html"))
+    cache.put(FINANZEN_NET_TERMINE_URL, fixture("finanzen_net_termine.html"))
+    cache.put("https://finance.yahoo.com/quote/" + YAHOO_SYMBOL,
+              fixture("yahoo_quote.html"))
+    cache.put(time_series_url(YAHOO_SYMBOL, "compact"),
+              fixture("alphavantage_time_series.json"))
+
+
+def price_history(symbol, rnd, days):
+    today = datetime.date.today()
+    dates = [today - datetime.timedelta(days=i) for i in range(days, -1, -1)]
+    dates = [d for d in dates if d.weekday() < 5]
+    closes = 100 * np.cumprod(1 + np.array([rnd.gauss(0, 0.015) for _ in
+                                            dates]))
+    data = np.empty(len(dates), dtype=DTYPE)
+    data["date"] = [d.toordinal() for d in dates]
+    data["close"] = closes
+    return PriceHistory(symbol, data)
+
+
+def synthetic_universe(n, prices, rnd):
+    # returns n Levermann objects of random stocks, their price histories
+    # are stored in prices
+    this_year = datetime.date.today().year
+    last_weekday = datetime.date.today()
+    while last_weekday.weekday() >= 5:
+        last_weekday -= datetime.timedelta(days=1)
+
+    objs = []
+    for i in range(n):
+        s = Stock("S%s.DE" % i)
+        s.name = "Stock %s" % i
+        s.cap_type = rnd.choice(list(Cap))
+        s.market_cap = rnd.uniform(10**8, 10**11)
+        h = price_history(s.symbol, rnd, 800)
+        prices.save(h)
+        s.set_quote(Money(float(h.closes[-1]), "EUR"))
+
+        for year in range(this_year - 5, this_year + 1):
+            s.roe[year] = rnd.uniform(-10, 40)
+            s.equity_ratio[year] = rnd.uniform(0, 60)
+            s.ebit_margin[year] = rnd.uniform(-5, 30)
+        for year in range(this_year - 3, this_year + 2):
+            for _ in range(rnd.randint(1, 2)):
+                v = Decimal("%.2f" % rnd.uniform(0.1, 10))
+                s.eps.setdefault(year, []).append(
+                    EPS(Money(v, "EUR"), datetime.date.today()))
+        s.analyst_ratings = (rnd.randint(0, 10), rnd.randint(0, 10),
+                             rnd.randint(1, 10))
+        qf_date = last_weekday - datetime.timedelta(days=7 * rnd.randint(1, 8))
+        s.quarterly_figure_dates = [qf_date]
+
+        objs.append(Levermann(s))
+    return objs
+
+
+def measure(func, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        start = time.perf_counter()
+        if setup is not None:
+            func(arg)
+        else:
+            func()
+        times.append(time.perf_counter() - start)
+    return {"repeat": repeat, "min": min(times),
+            "median": statistics.median(times),
+            "mean": statistics.mean(times)}
+
+
+def scraper_benchmarks(repeat):
+    results = {}
+
+    for metric in ("eps", "ebit_margin", "equity_ratio", "roe",
+                   "analyst_ratings"):
+        # a new scraper parses the page again
+        results["onvista.%s" % metric] = measure(
+            lambda scr: getattr(scr, metric)(), repeat,
+            lambda: OnvistaScraper(ONVISTA_URL))
+
+    def all_metrics(scr):
+        scr.eps()
+        scr.ebit_margin()
+        scr.equity_ratio()
+        scr.roe()
+        scr.analyst_ratings()
+    results["onvista.all_metrics"] = measure(
+        all_metrics, repeat, lambda: OnvistaScraper(ONVISTA_URL))
+
+    results["finanzen_net.quarterly_figures_release_dates"] = measure(
+        lambda scr: scr.fetch_recent_quarterly_figures_release_date(), repeat,
+        lambda: FinanzenNetScraper(FINANZEN_NET_URL))
+
+    results["yahoo.get_stock_info"] = measure(
+        lambda: yahoo.get_stock_info(YAHOO_SYMBOL), repeat)
+
+    # includes reading and decoding the cached response
+    results["alphavantage.compact_time_series"] = measure(
+        lambda: from_time_series(YAHOO_SYMBOL, alphavantage._fetch_time_series(
+            YAHOO_SYMBOL, "compact")), repeat)
+    series = full_time_series()
+    results["alphavantage.from_time_series_full"] = measure(
+        lambda: from_time_series(YAHOO_SYMBOL, series), repeat)
+
+    return results
+
+
+def evaluation_benchmarks(sizes, repeat, prices, st_path):
+    results = {}
+    rnd = random.Random(1)
+    for sym in REFERENCE_INDICES:
+        prices.save(price_history(sym, rnd, 800))
+
+    for n in sizes:
+        objs = synthetic_universe(n, prices, rnd)
+        # the first evaluation loads the price histories
+        results["levermann.evaluate_%s" % n] = measure(
+            lambda: [l.evaluate() for l in objs], repeat)
+        results["batch.evaluate_%s" % n] = measure(
+            lambda: batch.evaluate(batch.inputs_from_levermann(objs)), repeat)
+
+        def save(st):
+            for l in objs:
+                l.save(st)
+
+        def new_store():
+            path = os.path.join(st_path, "store-%s.sqlite" % time.time())
+            return Store(path)
+
+        results["store.save_%s" % n] = measure(save, repeat, new_store)
+        st = new_store()
+        save(st)
+        results["store.load_%s" % n] = measure(
+            lambda: levermann.load_levermann_objs(st), repeat)
+        st.close()
+
+    return results
+
+
+def startup_benchmarks(repeat, prices, tmpdir):
+    # every run starts a new interpreter, the measured time includes the
+    # startup of Python and all imports of the command
+    st_path = os.path.join(tmpdir, "startup.sqlite")
+    st = Store(st_path)
+    for l in synthetic_universe(10, prices, random.Random(2)):
+        l.evaluate()
+        l.save(st)
+    st.close()
+
+    def run(*args):
+        subprocess.run([sys.executable, "-c", RUN_ANALYSER, tmpdir, st_path,
+                        ANALYSER] + list(args), cwd=ROOT_PATH, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    return {"startup.python": measure(
+                lambda: subprocess.run([sys.executable, "-c", "pass"],
+                                       check=True), repeat),
+            "startup.help": measure(lambda: run("--help"), repeat),
+            "startup.list": measure(lambda: run("list"), repeat)}
+
+
+def configure_argparse():
+    parser = argparse.ArgumentParser(description="run the offline"
+                                     " benchmarks")
+    parser.add_argument("-o", "--output", help="write the results as JSON to"
+                        " the file")
+    parser.add_argument("-r", "--repeat", type=int, default=5,
+                        help="number of runs of each benchmark")
+    parser.add_argument("-s", "--sizes", type=int, nargs="+",
+                        default=[10, 100, 1000], help="number of stocks of"
+                        " the evaluated universes")
+    return parser
+
+
+def main(argv=None):
+    args = configure_argparse().parse_args(argv)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache_path = os.path.join(tmpdir, "http_cache")
+        config.HTTP_CACHE_PATH = cache_path
+        common.offline = True
+        record_responses(ResponseCache(cache_path))
+
+        prices = PriceStore(os.path.join(tmpdir, "prices"))
+        alphavantage._store = prices
+
+        results = scraper_benchmarks(args.repeat)
+        results.update(evaluation_benchmarks(args.sizes, args.repeat, prices,
+                                             tmpdir))
+        results.update(startup_benchmarks(args.repeat, prices, tmpdir))
+
+    for name, r in sorted(results.items()):
+        print("%-50s %10.3fms %10.3fms" % (name, r["min"] * 1000,
+                                           r["median"] * 1000))
+
+    if args.output:
+        doc = {"timestamp": datetime.datetime.now().isoformat(),
+               "python": platform.python_version(),
+               "platform": platform.platform(),
+               "benchmarks": results}
+        with open(args.output, "w") as f:
+            json.dump(doc, f, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,6 @@
 
 virtualenv -p /usr/bin/python3.5 venv
 source venv/bin/activate 
-pip install money pytest pep8 pylint lxml requests
+pip install money pytest pep8 pylint lxml requests numpy
 
 echo "Switch to Virtualenv with: 'source venv/bin/activate'"
@@ -0,0 +1,204 @@
+import bisect
+import datetime
+import logging
+from decimal import Decimal
+import numpy as np
+from stockanalyser import store, metrics
+from stockanalyser.mymoney import Money
+from stockanalyser.stock import Stock, EPS, Cap, cap_type
+from stockanalyser.analysis import batch
+from stockanalyser.analysis.levermann import (Levermann, Recommendation,
+                                              recommendation)
+from stockanalyser.data_source import alphavantage
+from stockanalyser.exceptions import InvalidValueError
+
+logger = logging.getLogger(__name__)
+
+
+class Fundamentals(object):
+    # fundamental data of a stock from a snapshot of the store
+    def __init__(self, data):
+        self.roe = {int(k): v for k, v in data["roe"].items()}
+        self.ebit_margin = {int(k): v for k, v in data["ebit_margin"].items()}
+        self.equity_ratio = {int(k): v for k, v in
+                             data["equity_ratio"].items()}
+        self.eps = {}
+        for year, vals in data["eps"].items():
+            self.eps[int(year)] = [
+                EPS(Money(Decimal(amount), currency), store._parse_date(d))
+                for amount, currency, d in vals]
+        self.analyst_ratings = tuple(data["analyst_ratings"] or
+                                     (None, None, None))
+        self.quarterly_figure_dates = [store._parse_date(d) for d in
+                                       data["quarterly_figure_dates"]]
+        self.market_cap = data["market_cap"]
+        self.currency = "EUR"
+        if data["quote"]:
+            self.currency = data["quote"][1]
+
+
+class FundamentalsHistory(object):
+    def __init__(self, snapshots):
+        self.timestamps = [ts for ts, _ in snapshots]
+        self.snapshots = [Fundamentals(data) for _, data in snapshots]
+
+    def as_of(self, adate):
+        # returns the last snapshot that was stored on or before adate
+        ts = datetime.datetime.combine(adate, datetime.time.max)
+        i = bisect.bisect_right(self.timestamps, ts)
+        if i == 0:
+            return None
+        return self.snapshots[i - 1]
+
+
+def stock_as_of(stock, fundamentals, as_of, quote):
+    # returns a copy of stock containing the data that was known at as_of
+    s = Stock(stock.symbol, isin=stock.isin)
+    s.name = stock.name
+    s.market_cap = fundamentals.market_cap
+    if s.market_cap is not None:
+        s.cap_type = cap_type(s.market_cap)
+    else:
+        s.cap_type = stock.cap_type
+    s.set_quote(Money(quote, fundamentals.currency))
+
+    s.roe = fundamentals.roe
+    s.ebit_margin = fundamentals.ebit_margin
+    s.equity_ratio = fundamentals.equity_ratio
+    for year, vals in fundamentals.eps.items():
+        eps = [e for e in vals if e.update_date <= as_of]
+        if eps:
+            s.eps[year] = eps
+    s.analyst_ratings = fundamentals.analyst_ratings
+    s.quarterly_figure_dates = fundamentals.quarterly_figure_dates
+
+    return s
+
+
+class BacktestResult(object):
+    def __init__(self, dates, symbols):
+        self.dates = dates
+        self.symbols = symbols
+
+        shape = (len(dates), len(symbols))
+        # NaN if the stock couldn't be evaluated at the date
+        self.scores = np.full(shape, np.nan)
+        # Recommendation values, 0 if the stock couldn't be evaluated
+        self.signals = np.zeros(shape, dtype=np.int8)
+        # closing quote at each date, NaN if not available
+        self.closes = np.full(shape, np.nan)
+        # True if the stock is held from the date to the next one
+        self.positions = np.zeros(shape, dtype=bool)
+
+        # return from each date to the next one
+        self.returns = np.full(len(dates), np.nan)
+        # return of an equal weighted portfolio of all stocks
+        self.benchmark_returns = np.full(len(dates), np.nan)
+
+    def score_series(self, symbol):
+        j = self.symbols.index(symbol)
+        return [(d, int(s)) for d, s in zip(self.dates, self.scores[:, j])
+                if not np.isnan(s)]
+
+    def signal_series(self, symbol):
+        j = self.symbols.index(symbol)
+        return [(d, Recommendation(s)) for d, s in
+                zip(self.dates, self.signals[:, j]) if s]
+
+    def total_return(self):
+        r = self.returns[~np.isnan(self.returns)]
+        return float(np.prod(1 + r) - 1)
+
+    def total_benchmark_return(self):
+        r = self.benchmark_returns[~np.isnan(self.benchmark_returns)]
+        return float(np.prod(1 + r) - 1)
+
+    def _calc_returns(self):
+        # the strategy buys a stock on a BUY signal and holds it until a
+        # SELL signal, all held stocks are equally weighted
+        held = np.zeros(len(self.symbols), dtype=bool)
+        for i in range(len(self.dates)):
+            held[self.signals[i] == Recommendation.BUY.value] = True
+            held[self.signals[i] == Recommendation.SELL.value] = False
+            self.positions[i] = held
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            chg = self.closes[1:] / self.closes[:-1] - 1
+        valid = ~np.isnan(chg)
+
+        for i in range(len(self.dates) - 1):
+            r = chg[i][valid[i]]
+            if len(r):
+                self.benchmark_returns[i] = r.mean()
+
+            r = chg[i][valid[i] & self.positions[i]]
+            # without positions the strategy stays in cash
+            self.returns[i] = r.mean() if len(r) else 0.0
+
+
+def run(levermann_objs, dates, st=None):
+    # evaluates the stocks as of each of the passed trading days with the
+    # fundamentals that were stored at that time
+    if st is None:
+        st = store.default_store()
+
+    symbols = [l.stock.symbol for l in levermann_objs]
+    histories = [FundamentalsHistory(st.fundamentals_history(sym))
+                 for sym in symbols]
+    result = BacktestResult(dates, symbols)
+    prev_scores = [None] * len(symbols)
+
+    for i, d in enumerate(dates):
+        inputs = batch.BatchInputs(len(symbols))
+        rows = []
+        skipped = 0
+
+        for j, l in enumerate(levermann_objs):
+            try:
+                quote = alphavantage.stock_quote(symbols[j], d)
+                result.closes[i, j] = quote
+            except (KeyError, InvalidValueError):
+                logger.debug("No quote of %s as of %s" % (symbols[j], d))
+                skipped += 1
+                continue
+
+            fundamentals = histories[j].as_of(d)
+            if fundamentals is None:
+                logger.debug("No fundamentals of %s as of %s" %
+                             (symbols[j], d))
+                skipped += 1
+                continue
+
+            try:
+                s = stock_as_of(l.stock, fundamentals, d, quote)
+                batch.gather(inputs, j, Levermann(s), d)
+            except Exception as e:
+                logger.debug("Evaluating %s as of %s failed: %s" %
+                             (symbols[j], d, e))
+                skipped += 1
+                continue
+            rows.append(j)
+
+        if skipped:
+            # the averages of the date only contain the evaluated stocks
+            metrics.inc("backtest_stocks_skipped", skipped)
+            logger.info("Skipped %s of %s stocks as of %s" %
+                        (skipped, len(symbols), d))
+
+        if not rows:
+            logger.debug("No stock could be evaluated as of %s" % d)
+            continue
+
+        res = batch.evaluate(inputs.take(rows))
+        metrics.inc("stocks_evaluated", len(rows))
+        for k, j in enumerate(rows):
+            score = int(res.score[k])
+            rec = recommendation(Cap(int(inputs.cap_type[j])), score,
+                                 prev_scores[j])
+            result.scores[i, j] = score
+            result.signals[i, j] = rec.value
+            prev_scores[j] = score
+        logger.info("Evaluated %s stocks as of %s" % (len(rows), d))
+
+    result._calc_returns()
+    return result
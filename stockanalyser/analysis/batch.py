@@ -0,0 +1,216 @@
+import logging
+import numpy as np
+from stockanalyser.stock import Cap
+from stockanalyser.analysis import levermann
+
+logger = logging.getLogger(__name__)
+
+CRITERIA = levermann.CRITERIA
+
+# same rounding of EPS ratios as in the per-stock evaluation
+DECIMALS = levermann.DECIMALS
+
+
+class BatchInputs(object):
+    # Inputs of the Levermann criteria for n stocks, missing values are NaN
+    def __init__(self, n):
+        self.symbols = [None] * n
+        self.cap_type = np.zeros(n, dtype=np.int8)
+        self.quote = np.full(n, np.nan)
+
+        self.roe = np.full(n, np.nan)
+        self.equity_ratio = np.full(n, np.nan)
+        self.ebit_margin = np.full(n, np.nan)
+
+        # EPS of the years this year - 3 to this year + 1 (columns 0 - 4)
+        self.eps = np.full((n, 5), np.nan)
+        # previous EPS value of this year and next year (columns 0, 1),
+        # NaN if there is none
+        self.eps_prev = np.full((n, 2), np.nan)
+
+        # stock vs. reference index performance of the last 3 months,
+        # only set for large caps
+        self.three_month_reversal = np.full((n, 3), np.nan)
+        self.quote_chg_6month = np.full(n, np.nan)
+        self.quote_chg_1year = np.full(n, np.nan)
+        self.quarterly_figures_reaction = np.full(n, np.nan)
+
+        # number of buy, hold, sell ratings
+        self.analyst_ratings = np.full((n, 3), np.nan)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def take(self, idx):
+        # returns the inputs of the stocks with the passed indices
+        inputs = BatchInputs(0)
+        for k, v in self.__dict__.items():
+            if k == "symbols":
+                inputs.symbols = [self.symbols[i] for i in idx]
+            else:
+                setattr(inputs, k, v[idx])
+        return inputs
+
+
+class BatchResult(object):
+    def __init__(self, symbols, values, points):
+        self.symbols = symbols
+        self.values = values
+        self.points = points
+        self.score = sum(points[c] for c in CRITERIA)
+
+    def __len__(self):
+        return len(self.symbols)
+
+
+def _last_year_value(values, last_year):
+    # same year selection as Levermann.eval_roe(), eval_equity_ratio() and
+    # eval_ebit_margin()
+    if last_year not in values:
+        last_year -= 1
+    return values[last_year]
+
+
+def gather(inputs, i, l, as_of=None):
+    # sets the inputs of row i from the Levermann object l, quotes are
+    # retrieved like in the per-stock evaluation
+    s = l.stock
+    this_year = levermann._as_of(as_of).year
+
+    inputs.symbols[i] = s.symbol
+    inputs.cap_type[i] = s.cap_type.value
+    inputs.quote[i] = s.quote_value()
+
+    inputs.roe[i] = _last_year_value(s.roe, this_year - 1)
+    inputs.equity_ratio[i] = _last_year_value(s.equity_ratio, this_year - 1)
+    inputs.ebit_margin[i] = _last_year_value(s.ebit_margin, this_year - 1)
+
+    for j, year in enumerate(range(this_year - 3, this_year + 2)):
+        if year in s.eps:
+            inputs.eps[i, j] = s.eps[year][-1].amount
+    for j, year in enumerate((this_year, this_year + 1)):
+        if year in s.eps and len(s.eps[year]) >= 2:
+            inputs.eps_prev[i, j] = s.eps[year][-2].amount
+
+    if s.cap_type == Cap.LARGE:
+        inputs.three_month_reversal[i] = l.three_month_reversal_values(as_of)
+    inputs.quote_chg_6month[i] = l._eval_quote_chg_daydiff(182, as_of)[0]
+    inputs.quote_chg_1year[i] = l._eval_quote_chg_daydiff(365, as_of)[0]
+    inputs.quarterly_figures_reaction[i] = \
+        l.quarterly_figures_reaction_value(as_of)
+
+    if None not in s.analyst_ratings:
+        inputs.analyst_ratings[i] = s.analyst_ratings
+
+
+def inputs_from_levermann(levermann_objs, as_of=None):
+    inputs = BatchInputs(len(levermann_objs))
+    for i, l in enumerate(levermann_objs):
+        gather(inputs, i, l, as_of)
+
+    return inputs
+
+
+def _missing_to_zero(points, v):
+    # missing (NaN) values don't score, np.select() would assign them the
+    # default points
+    points[np.isnan(v)] = 0
+    return points
+
+
+def _range_points(v, low, high):
+    # -1 if v < low, 0 if low <= v <= high, 1 if v > high
+    return _missing_to_zero(
+        np.select([v < low, v <= high], [-1, 0], 1).astype(np.int8), v)
+
+
+def _chg_points(chg):
+    # 0 if -5 <= chg <= 5, 1 if chg > 5, -1 if chg < -5
+    return _missing_to_zero(
+        np.select([chg < -5, chg <= 5], [-1, 0], 1).astype(np.int8), chg)
+
+
+def _per_points(per):
+    return _missing_to_zero(
+        np.select([(per > 0) & (per < 12), (per >= 12) & (per <= 16)],
+                  [1, 0], -1).astype(np.int8), per)
+
+
+def _pct_chg(new, old):
+    return np.round(((new / old) - 1) * 100, DECIMALS)
+
+
+def evaluate(inputs):
+    values = {}
+    points = {}
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        values["roe"] = inputs.roe
+        points["roe"] = _range_points(inputs.roe, 10, 20)
+        values["equity_ratio"] = inputs.equity_ratio
+        points["equity_ratio"] = _range_points(inputs.equity_ratio, 15, 25)
+        values["ebit_margin"] = inputs.ebit_margin
+        points["ebit_margin"] = _range_points(inputs.ebit_margin, 6, 12)
+
+        eps_cur = inputs.eps[:, 3]
+        eps_next = inputs.eps[:, 4]
+        chg = _pct_chg(eps_next, eps_cur)
+        values["earning_growth"] = chg
+        points["earning_growth"] = _missing_to_zero(np.select(
+            [(chg >= -5) & (chg <= 5), eps_cur < eps_next], [0, 1],
+            -1).astype(np.int8), chg)
+
+        per = np.round(inputs.quote / eps_cur, DECIMALS)
+        values["price_earnings_ratio"] = per
+        points["price_earnings_ratio"] = _per_points(per)
+
+        per5 = np.round(inputs.quote / (inputs.eps.sum(axis=1) / 5),
+                        DECIMALS)
+        values["five_years_price_earnings_ratio"] = per5
+        points["five_years_price_earnings_ratio"] = _per_points(per5)
+
+        m = inputs.three_month_reversal
+        values["three_month_reversal"] = m
+        points["three_month_reversal"] = np.select(
+            [(m > 0).all(axis=1), (m < 0).all(axis=1)], [-1, 1],
+            0).astype(np.int8)
+
+        values["quote_chg_6month"] = inputs.quote_chg_6month
+        p6 = _chg_points(inputs.quote_chg_6month)
+        points["quote_chg_6month"] = p6
+        values["quote_chg_1year"] = inputs.quote_chg_1year
+        p1 = _chg_points(inputs.quote_chg_1year)
+        points["quote_chg_1year"] = p1
+
+        values["momentum"] = np.stack((p6, p1), axis=1)
+        points["momentum"] = np.select(
+            [(p6 == 1) & (p1 <= 0), (p6 == -1) & (p1 >= 0)], [1, -1],
+            0).astype(np.int8)
+
+        rev_chg = _pct_chg(inputs.eps[:, 3:5], inputs.eps_prev)
+        rev_points = _chg_points(rev_chg)
+        has_rev = ~np.isnan(inputs.eps_prev).any(axis=1)
+        rev_points[~has_rev] = 0
+        values["earning_revision"] = rev_points
+        points["earning_revision"] = np.sign(
+            rev_points.sum(axis=1)).astype(np.int8)
+
+        r = inputs.quarterly_figures_reaction
+        values["quarterly_figures_reaction"] = r
+        points["quarterly_figures_reaction"] = _missing_to_zero(np.select(
+            [(r >= -1) & (r < 1), r >= 1], [0, 1], -1).astype(np.int8), r)
+
+        ratings = inputs.analyst_ratings
+        n_ratings = ratings.sum(axis=1)
+        score = (ratings @ np.array([1.0, 2.0, 3.0])) / n_ratings
+        values["analyst_rating"] = score
+        rating_points = np.select([score <= 1.5, score < 2.5], [-1, 0],
+                                  1).astype(np.int8)
+        # for small caps with less than 5 ratings, the recommendations are
+        # followed, for other stocks they are inverted
+        follow = (inputs.cap_type == Cap.SMALL.value) & (n_ratings < 5)
+        rating_points[follow] *= -1
+        rating_points[np.isnan(score)] = 0
+        points["analyst_rating"] = rating_points
+
+    return BatchResult(inputs.symbols, values, points)
@@ -1,59 +1,72 @@
+import hashlib
 import logging
-import calendar
-import pickle
 from datetime import date, timedelta
 import datetime
-from stockanalyser.data_source import yahoo, alphavantage
 from stockanalyser.exceptions import NotSupportedError, InvalidValueError
 from stockanalyser.config import *
-from stockanalyser import fileutils
+from stockanalyser import store, profiling, metrics
 from stockanalyser.stock import Cap
+from stockanalyser.dateutils import (is_weekday, prev_weekday, closest_weekday,
+                                     last_weekday_of_month, prev_month)
+from stockanalyser.analysis.summary import Summary
 from enum import Enum, unique
 
-logger = logging.getLogger(__name__)
-
-THIS_YEAR = date.today().year
-LAST_YEAR = date.today().year - 1
+# the quote based criteria import the price history data sources when they
+# are evaluated, loading stored analyses doesn't require them
 
+logger = logging.getLogger(__name__)
 
-def is_weekday(adate):
-    if adate.weekday() in (5, 6):
-        return False
+def _as_of(as_of):
+    # criteria are evaluated as of today if no other date is passed
+    if as_of is None:
+        return date.today()
+    return as_of
 
-    return True
 
+# Ratios that are calculated from EPS values are rounded to DECIMALS decimal
+# places before they are compared with the thresholds. It prevents that
+# binary floating point errors (e.g. 2.1 / 2 - 1 = 0.050000000000000044)
+# result in other points than exact decimal arithmetic.
+DECIMALS = 9
 
-def prev_weekday(adate):
-        _offsets = (3, 1, 1, 1, 1, 1, 2)
-        return adate - timedelta(days=_offsets[adate.weekday()])
 
+def _round_ratio(v):
+    # same result as np.round(v, DECIMALS) in analysis.batch.evaluate(), it
+    # also scales, rounds half to even and scales back
+    return round(v * 10.0 ** DECIMALS) / 10.0 ** DECIMALS
 
-def closest_weekday(adate):
-    if adate.weekday() == 6:
-        return adate + timedelta(days=1)
-    elif adate.weekday() == 5:
-        return adate - timedelta(days=1)
-    return adate
 
+def _pct_chg(new, old):
+    return _round_ratio(((new / old) - 1) * 100)
 
-def last_weekday_of_month(adate):
-    last_day = calendar.monthrange(adate.year, adate.month)[1]
-    d = date(adate.year, adate.month, last_day)
 
-    if not is_weekday(d):
-        return prev_weekday(d)
-    return d
+def fingerprint(inputs):
+    # returns a short hash of the input values of a criterion
+    return hashlib.sha1(repr(inputs).encode("utf-8")).hexdigest()[:16]
 
 
-def prev_month(adate):
-    return date(adate.year, adate.month, 1) - timedelta(days=1)
+def _eps_values(eps, year, n=1):
+    return tuple((str(e.value.amount), e.value.currency) for e in
+                 eps.get(year, [])[-n:])
 
 
 class CriteriaRating(object):
+    __slots__ = ("value", "points")
+
     def __init__(self, value, points):
         self.value = value
         self.points = points
 
+    def __getstate__(self):
+        return (self.value, self.points)
+
+    def __setstate__(self, state):
+        # objects that were pickled before __slots__ were used have a dict
+        # as state
+        if isinstance(state, dict):
+            state = (state["value"], state["points"])
+        self.value, self.points = state
+
 
 @unique
 class Recommendation(Enum):
@@ -62,9 +75,36 @@ class Recommendation(Enum):
     NONE = 3
 
 
+# names of the rated criteria
+CRITERIA = ("roe", "equity_ratio", "ebit_margin", "earning_growth",
+            "three_month_reversal", "momentum", "quote_chg_6month",
+            "quote_chg_1year", "earning_revision",
+            "quarterly_figures_reaction", "analyst_rating",
+            "five_years_price_earnings_ratio", "price_earnings_ratio")
+
+# order of the attributes in the tuple state of LevermannResult pickles
+# that were created before the state was a dict
+_TUPLE_STATE_SLOTS = ("timestamp", "roe", "equity_ratio", "ebit_margin",
+                      "earning_growth", "three_month_reversal", "momentum",
+                      "quote_chg_6month", "quote_chg_1year",
+                      "earning_revision", "quarterly_figures_reaction",
+                      "analyst_rating", "five_years_price_earnings_ratio",
+                      "price_earnings_ratio", "fingerprints", "_score")
+
+
 class LevermannResult(object):
-    def __init__(self):
-        self.timestamp = datetime.datetime.now()
+    __slots__ = ("timestamp", "roe", "equity_ratio", "ebit_margin",
+                 "earning_growth", "three_month_reversal", "momentum",
+                 "quote_chg_6month", "quote_chg_1year", "earning_revision",
+                 "quarterly_figures_reaction", "analyst_rating",
+                 "five_years_price_earnings_ratio", "price_earnings_ratio",
+                 "fingerprints", "_score")
+    CRITERIA = CRITERIA
+
+    def __init__(self, timestamp=None):
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        self.timestamp = timestamp
 
         self.roe = None
         self.equity_ratio = None
@@ -79,8 +119,26 @@ class LevermannResult(object):
         self.analyst_rating = None
         self.five_years_price_earnings_ratio = None
         self.price_earnings_ratio = None
+        # fingerprints of the input values of each criterion
+        self.fingerprints = {}
         self._score = None
 
+    def __getstate__(self):
+        # the state is keyed by attribute name, it stays valid if slots are
+        # added, removed or reordered
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __setstate__(self, state):
+        # objects that were pickled before __slots__ were used have a dict
+        # as state too, attributes that were added later are missing in it.
+        # Objects pickled as tuple contain the values of _TUPLE_STATE_SLOTS.
+        self.__init__()
+        if not isinstance(state, dict):
+            state = dict(zip(_TUPLE_STATE_SLOTS, state))
+        for k, v in state.items():
+            if k in self.__slots__:
+                setattr(self, k, v)
+
     def __str__(self):
         s = "{:<35} {:<25}\n".format("Last Evaluation Date:", "%s" %
                                      self.timestamp)
@@ -95,7 +153,8 @@ class LevermannResult(object):
                                                   self.ebit_margin.value,
                                                   self.ebit_margin.points)
         s += "{:<35} {:<25} | {} Points\n".format("%s vs. %s Earning growth:" %
-                                                  (THIS_YEAR, THIS_YEAR + 1),
+                                                  (self.timestamp.year,
+                                                   self.timestamp.year + 1),
                                                   "%.2f%%" %
                                                   self.earning_growth.value,
                                                   self.earning_growth.points)
@@ -161,29 +220,70 @@ class LevermannResult(object):
         return self._score
 
 
-def levermann_pickle_path(symbol, dir=DATA_PATH):
-        filename = fileutils.to_pickle_filename(symbol + ".levermann")
-        path = os.path.join(dir, filename)
-        return path
+def load_levermann(symbol, st=None):
+    if st is None:
+        st = store.default_store()
+
+    stock, reference_index, results = st.load(symbol)
+    l = Levermann.__new__(Levermann)
+    l.stock = stock
+    l.reference_index = reference_index
+    l.evaluation_results = results
+    logger.debug("Loaded Levermann Analysis for Stock: %s from '%s'" %
+                 (symbol, st.path))
+    return l
+
+
+def load_levermann_objs(st=None):
+    if st is None:
+        st = store.default_store()
 
+    return [load_levermann(sym, st) for sym in st.symbols()]
 
-def unpickle_levermann_sym(symbol, dir=DATA_PATH):
-        path = levermann_pickle_path(symbol)
-        return unpickle_levermann(path)
 
+def update_summaries(st=None):
+    # stores the summary of stocks that were stored without one
+    if st is None:
+        st = store.default_store()
 
-def unpickle_levermann(path):
-        l = pickle.load(open(path, "rb"))
-        logger.debug("Unpickled Levermann Analysis for Stock: %s from '%s'" %
-                     (l.stock.symbol, path))
-        return l
+    for sym in st.symbols_without_summary():
+        load_levermann(sym, st).save(st)
 
 
 class EvaluationResult(object):
+    __slots__ = ("points", "date")
+
     def __init__(self, points, eval_date):
         self.points = points
         self.date = eval_date
 
+    def __getstate__(self):
+        return (self.points, self.date)
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            state = (state["points"], state["date"])
+        self.points, self.date = state
+
+
+def recommendation(cap_type, score, prev_score=None):
+    if prev_score is not None and (score - prev_score) <= -2:
+        return Recommendation.SELL
+
+    if cap_type == Cap.LARGE:
+        if score <= 2:
+            return Recommendation.SELL
+        if score >= 4:
+            return Recommendation.BUY
+        return Recommendation.NONE
+
+    if score <= 4:
+        return Recommendation.SELL
+    if score >= 7:
+        return Recommendation.BUY
+
+    return Recommendation.NONE
+
 
 class Levermann(object):
     def __init__(self, stock):
@@ -200,32 +300,96 @@ class Levermann(object):
             raise NotSupportedError("Only DAX Stocks are supported."
                                     " The stock symbol has to end in .de")
 
-    def evaluate(self):
+    def criteria_inputs(self, as_of=None):
+        # returns a list of (criterion, input values, evaluation function)
+        # tuples in evaluation order, the rating of a criterion only changes
+        # if its input values change. Quotes of past dates are considered to
+        # be constant.
+        s = self.stock
+        this_year = _as_of(as_of).year
+        quote = (str(s.quote.amount), s.quote.currency)
+        eps_5years = tuple(_eps_values(s.eps, y) for y in
+                           range(this_year - 3, this_year + 2))
+
+        return [
+            ("roe", (this_year, sorted(s.roe.items())),
+             lambda: self.eval_roe(as_of)),
+            ("ebit_margin", (this_year, sorted(s.ebit_margin.items())),
+             lambda: self.eval_ebit_margin(as_of)),
+            ("equity_ratio", (this_year, sorted(s.equity_ratio.items())),
+             lambda: self.eval_equity_ratio(as_of)),
+            ("price_earnings_ratio",
+             (quote, _eps_values(s.eps, this_year)),
+             lambda: self.eval_price_earnings_ratio(as_of)),
+            ("five_years_price_earnings_ratio", (quote, eps_5years),
+             lambda: self.eval_five_years_price_earnings_ratio(as_of)),
+            ("analyst_rating", (s.analyst_ratings, s.cap_type),
+             self.eval_analyst_rating),
+            ("quarterly_figures_reaction",
+             (s.last_quarterly_figures_release_date(as_of),
+              self.reference_index),
+             lambda: self.eval_quarterly_figures_reaction(as_of)),
+            ("quote_chg_6month",
+             (quote, closest_weekday(_as_of(as_of) - timedelta(days=182))),
+             lambda: self.eval_quote_chg_6month(as_of)),
+            ("quote_chg_1year",
+             (quote, closest_weekday(_as_of(as_of) - timedelta(days=365))),
+             lambda: self.eval_quote_chg_1year(as_of)),
+            ("three_month_reversal",
+             (s.cap_type, self.reference_index, prev_month(_as_of(as_of))),
+             lambda: self.eval_three_month_reversal(as_of)),
+            ("earning_growth",
+             (this_year, _eps_values(s.eps, this_year),
+              _eps_values(s.eps, this_year + 1)),
+             lambda: self.eval_earning_growth(as_of)),
+            ("earning_revision",
+             (this_year, _eps_values(s.eps, this_year, 2),
+              _eps_values(s.eps, this_year + 1, 2)),
+             lambda: self.eval_earning_revision(as_of)),
+        ]
+
+    def evaluate(self, as_of=None, incremental=False):
+        # evaluates the stock as of the passed date, the stock data
+        # (quote, fundamentals) must be the one that was known at that date.
+        # If incremental is set, the ratings of the previous evaluation are
+        # reused for criteria whose input values didn't change. The
+        # recomputed criteria are stored in self.recomputed.
         logger.info("Creating Levermann Analysis for %s" % self.stock.symbol)
-        result = LevermannResult()
-
-        result.roe = self.eval_roe()
-        result.ebit_margin = self.eval_ebit_margin()
-        result.equity_ratio = self.eval_equity_ratio()
-        result.price_earnings_ratio = self.eval_price_earnings_ratio()
-        result.five_years_price_earnings_ratio = \
-            self.eval_five_years_price_earnings_ratio()
-        result.analyst_rating = self.eval_analyst_rating()
-        result.quarterly_figures_reaction = \
-            self.eval_quarterly_figures_reaction()
-
-        result.quote_chg_6month = self.eval_quote_chg_6month()
-        result.quote_chg_1year = self.eval_quote_chg_1year()
-        result.momentum = self.eval_momentum(result.quote_chg_6month.points,
-                                             result.quote_chg_1year.points)
-
-        result.three_month_reversal = self.eval_three_month_reversal()
-        result.earning_growth = self.eval_earning_growth()
-        result.earning_revision = self.eval_earning_revision()
+        timestamp = None
+        if as_of is not None:
+            timestamp = datetime.datetime.combine(as_of, datetime.time())
+        result = LevermannResult(timestamp)
+
+        prev = None
+        if incremental and self.evaluation_results:
+            prev = self.evaluation_results[-1]
+        prev_fingerprints = getattr(prev, "fingerprints", {})
+
+        def rate(criterion, inputs, func):
+            fp = fingerprint(inputs)
+            result.fingerprints[criterion] = fp
+            rating = getattr(prev, criterion, None)
+            if rating is None or prev_fingerprints.get(criterion) != fp:
+                with profiling.span(criterion, "criterion"):
+                    rating = func()
+                recomputed.append(criterion)
+            setattr(result, criterion, rating)
+
+        recomputed = []
+        for criterion, inputs, func in self.criteria_inputs(as_of):
+            rate(criterion, inputs, func)
+        points = (result.quote_chg_6month.points, result.quote_chg_1year.points)
+        rate("momentum", points, lambda: self.eval_momentum(*points))
+
+        self.recomputed = recomputed
+        metrics.inc("stocks_evaluated")
+        metrics.inc("criteria_recomputed", len(recomputed))
+        logger.debug("Recomputed criteria of %s: %s" %
+                     (self.stock.symbol, ", ".join(recomputed)))
 
         if self.evaluation_results:
             last = self.evaluation_results[-1]
-            if ((last.timestamp > (datetime.datetime.now() -
+            if ((last.timestamp > (result.timestamp -
                  datetime.timedelta(days=7))) and last.score == result.score):
                 logger.debug("Old Levermann analysis:\n%s\n"
                              "New Levermann anylsis: \n%s" %
@@ -239,24 +403,37 @@ class Levermann(object):
 
         return True
 
-    def outdated(self):
-        if not self.evaluation_results:
-            return True
+    def next_refresh(self, since=None):
+        # returns when the analysis becomes outdated, since is the time it
+        # was last refreshed, by default the time of the last evaluation
+        if since is None:
+            if not self.evaluation_results:
+                return datetime.datetime.min
+            since = self.evaluation_results[-1].timestamp
+
+        due = since + datetime.timedelta(seconds=ANALYSIS_MAX_AGE)
+        # the reaction to quarterly figures is rated with the quotes of the
+        # release day
+        released = [d for d in self.stock.quarterly_figure_dates
+                    if d >= since.date()]
+        if released:
+            due = min(due, datetime.datetime.combine(
+                min(released) + timedelta(days=1), datetime.time()))
+        # the EPS and P/E criteria refer to the current year
+        return min(due, datetime.datetime(since.year + 1, 1, 1))
 
-        last = self.evaluation_results[-1]
-        if (last.timestamp < (datetime.datetime.now() -
-                              datetime.timedelta(days=3))):
-            return True
-        return False
+    def outdated(self):
+        return self.next_refresh() <= datetime.datetime.now()
 
-    def eval_earning_growth(self):
+    def eval_earning_growth(self, as_of=None):
         logger.debug("Evaluating earning growth")
         #TODO: ensure that eps is always sorted in stock
+        this_year = _as_of(as_of).year
 
-        eps_cur_year = self.stock.eps[THIS_YEAR][-1].value
-        eps_next_year = self.stock.eps[THIS_YEAR + 1][-1].value
+        eps_cur_year = self.stock.eps[this_year][-1].amount
+        eps_next_year = self.stock.eps[this_year + 1][-1].amount
 
-        chg = ((eps_next_year.amount / eps_cur_year.amount) - 1) * 100
+        chg = _pct_chg(eps_next_year, eps_cur_year)
         logger.debug("EPS current year: %s\n"
                      "EPS next year: %s\n"
                      "Change: %s%%" % (eps_cur_year, eps_next_year, chg))
@@ -281,29 +458,24 @@ class Levermann(object):
         d = last_weekday_of_month(date)
         prev_month_date = last_weekday_of_month(prev_month(date))
 
+        from stockanalyser.data_source import alphavantage, reference_index
         quote = alphavantage.stock_quote(self.stock.symbol, d)
         prev_quote = alphavantage.stock_quote(self.stock.symbol, prev_month_date)
         q_diff = ((quote / prev_quote) - 1) * 100
 
-        ref_quote = alphavantage.stock_quote(self.reference_index, d)
-        prev_ref_quote = alphavantage.stock_quote(self.reference_index,
-                                           prev_month_date)
-        ref_q_diff = ((ref_quote / prev_ref_quote) - 1) * 100
+        ref_q_diff = reference_index.get(self.reference_index,
+                                         d).monthly_change(d)
 
         logger.debug("Comparing Stock with reference index. "
                      "(%s vs %s) Stock: %s vs %s = %s%%,"
-                     "Ref. Index.: %s vs %s = %s%%" %
+                     "Ref. Index.: %s%%" %
                      (d, prev_month_date, quote, prev_quote, q_diff,
-                      ref_quote, prev_ref_quote, ref_q_diff))
+                      ref_q_diff))
 
         return q_diff - ref_q_diff
 
-    def eval_three_month_reversal(self):
-        logger.debug("Evaluating 3 month reversal")
-
-        if self.stock.cap_type != Cap.LARGE:
-            return CriteriaRating((None, None, None), 0)
-        d = prev_month(date.today())
+    def three_month_reversal_values(self, as_of=None):
+        d = prev_month(_as_of(as_of))
         m1_diff = self._calc_ref_index_comp(d)
 
         d = prev_month(d)
@@ -312,6 +484,15 @@ class Levermann(object):
         d = prev_month(d)
         m3_diff = self._calc_ref_index_comp(d)
 
+        return (m1_diff, m2_diff, m3_diff)
+
+    def eval_three_month_reversal(self, as_of=None):
+        logger.debug("Evaluating 3 month reversal")
+
+        if self.stock.cap_type != Cap.LARGE:
+            return CriteriaRating((None, None, None), 0)
+        m1_diff, m2_diff, m3_diff = self.three_month_reversal_values(as_of)
+
         if (m1_diff > 0 and m2_diff > 0 and m3_diff > 0):
             points = -1
         elif (m1_diff < 0 and m2_diff < 0 and m3_diff < 0):
@@ -339,20 +520,22 @@ class Levermann(object):
         elif chg > 5:
             return 1
 
-    def _eval_quote_chg_daydiff(self, days_diff):
-        before_date = closest_weekday(date.today() - timedelta(days=days_diff))
+    def _eval_quote_chg_daydiff(self, days_diff, as_of=None):
+        before_date = closest_weekday(_as_of(as_of) -
+                                      timedelta(days=days_diff))
+        from stockanalyser.data_source import alphavantage
         before_quote = alphavantage.stock_quote(self.stock.symbol, before_date)
 
-        chg = ((float(self.stock.quote.amount) / before_quote) - 1) * 100
+        chg = ((self.stock.quote_value() / before_quote) - 1) * 100
         return (chg, self._calc_quite_chg_points(chg))
 
-    def eval_quote_chg_6month(self):
-        chg, points = self._eval_quote_chg_daydiff(182)
+    def eval_quote_chg_6month(self, as_of=None):
+        chg, points = self._eval_quote_chg_daydiff(182, as_of)
 
         return CriteriaRating(chg, points)
 
-    def eval_quote_chg_1year(self):
-        chg, points = self._eval_quote_chg_daydiff(365)
+    def eval_quote_chg_1year(self, as_of=None):
+        chg, points = self._eval_quote_chg_daydiff(365, as_of)
 
         return CriteriaRating(chg, points)
 
@@ -362,7 +545,7 @@ class Levermann(object):
         other = eps_list[-2]
         logger.debug("EPS vals: latest: %s, other: %s" % (latest, other))
 
-        return ((latest.value.amount / other.value.amount) - 1) * 100
+        return _pct_chg(latest.amount, other.amount)
 
     def _calc_earning_rev_points(self, chg):
         if chg >= -5 and chg <= 5:
@@ -372,9 +555,10 @@ class Levermann(object):
         elif chg < -5:
             return -1
 
-    def eval_earning_revision(self):
-        cur_year_eps = self.stock.eps[THIS_YEAR]
-        next_year_eps = self.stock.eps[THIS_YEAR + 1]
+    def eval_earning_revision(self, as_of=None):
+        this_year = _as_of(as_of).year
+        cur_year_eps = self.stock.eps[this_year]
+        next_year_eps = self.stock.eps[this_year + 1]
 
         if len(cur_year_eps) < 2 or len(next_year_eps) < 2:
             return CriteriaRating((None, None), 0)
@@ -387,41 +571,45 @@ class Levermann(object):
 
         psum = cur_year_points + next_year_points
 
-        if cur_year_points == 0 and next_year_points == 0:
-            points = 0
-        elif psum >= 1:
+        if psum >= 1:
             points = 1
         elif psum <= -1:
             points = -1
+        else:
+            points = 0
 
         return CriteriaRating((cur_year_points, next_year_points), points)
 
-    def eval_quarterly_figures_reaction(self):
-        logger.debug("Evaluating stock reaction on"
-                     "quarterly figures")
-        qf_date = self.stock.last_quarterly_figures_release_date()
-        qf_prev_day = prev_weekday(self.stock.last_quarterly_figures_release_date())
+    def quarterly_figures_reaction_value(self, as_of=None):
+        # returns the quote change of the stock on the last quarterly figures
+        # release date relative to the change of the reference index
+        qf_date = self.stock.last_quarterly_figures_release_date(as_of)
+        qf_prev_day = prev_weekday(qf_date)
 
+        from stockanalyser.data_source import alphavantage, reference_index
         qf_previous_day_quote = alphavantage.stock_quote(self.stock.symbol,
                                                   qf_prev_day)
         qf_day_quote = alphavantage.stock_quote(self.stock.symbol, qf_date)
         qf_reaction = ((qf_day_quote / qf_previous_day_quote) - 1) * 100
 
-        ref_index_quote = alphavantage.stock_quote(self.reference_index, qf_date)
-        ref_previous_index_quote = alphavantage.stock_quote(self.reference_index,
-                                                     qf_prev_day)
-        ref_index_chg = (((ref_index_quote / ref_previous_index_quote) - 1) *
-                         100)
+        ref_index_chg = reference_index.get(self.reference_index,
+                                            qf_date).daily_change(qf_date)
 
         rel_qf_reaction = qf_reaction - ref_index_chg
 
         logger.debug("Quarterly figure reaction %s vs %s: "
-                     "%s: %s vs %s => %s, %s: %s vs %s => %s," %
+                     "%s: %s vs %s => %s, %s: %s," %
                      (qf_date, qf_prev_day, self.stock.symbol, qf_day_quote,
                       qf_previous_day_quote, qf_reaction, self.reference_index,
-                      ref_index_quote, ref_previous_index_quote,
                       ref_index_chg))
 
+        return rel_qf_reaction
+
+    def eval_quarterly_figures_reaction(self, as_of=None):
+        logger.debug("Evaluating stock reaction on"
+                     "quarterly figures")
+        rel_qf_reaction = self.quarterly_figures_reaction_value(as_of)
+
         if rel_qf_reaction >= -1 and rel_qf_reaction < 1:
             logger.debug("Relative Stock reaction to quarterly figure release"
                          " is %s%%" ", >= -1%%, <1%% => 0 Points" %
@@ -473,8 +661,8 @@ class Levermann(object):
 
         return CriteriaRating(score, points)
 
-    def eval_five_years_price_earnings_ratio(self):
-        per = self.stock.price_earnings_ratio_5year().amount
+    def eval_five_years_price_earnings_ratio(self, as_of=None):
+        per = _round_ratio(self.stock.price_earnings_ratio_5year_value(as_of))
         logger.debug("Evaluating 5year PER: %s" % (per))
 
         if per > 0 and per < 12:
@@ -489,8 +677,8 @@ class Levermann(object):
 
         return CriteriaRating(per, points)
 
-    def eval_price_earnings_ratio(self):
-        per = self.stock.price_earnings_ratio().amount
+    def eval_price_earnings_ratio(self, as_of=None):
+        per = _round_ratio(self.stock.price_earnings_ratio_value(as_of))
         logger.debug("Evaluating PER: %s" % (per))
 
         if per > 0 and per < 12:
@@ -505,13 +693,14 @@ class Levermann(object):
 
         return CriteriaRating(per, points)
 
-    def eval_roe(self):
-        year = LAST_YEAR
+    def eval_roe(self, as_of=None):
+        last_year = _as_of(as_of).year - 1
+        year = last_year
         if year not in self.stock.roe:
             year -= 1
             logger.debug("ROE for year year %s"
                          " not set. Evaluation RoE "
-                         " of year %s instead" % (LAST_YEAR, year))
+                         " of year %s instead" % (last_year, year))
         roe = self.stock.roe[year]
 
         logger.debug("Evaluating RoE (%s): %s%%" % (year, roe))
@@ -527,14 +716,14 @@ class Levermann(object):
 
         return CriteriaRating(roe, points)
 
-    def eval_equity_ratio(self):
-        last_year = LAST_YEAR
+    def eval_equity_ratio(self, as_of=None):
+        last_year = _as_of(as_of).year - 1
 
         if last_year not in self.stock.equity_ratio:
             last_year -= 1
             logger.debug("Equity ratio for year year %s"
                          " not set. Evaluation Equity Ratio"
-                         " of year %s instead" % (LAST_YEAR, last_year))
+                         " of year %s instead" % (last_year + 1, last_year))
 
         equity_ratio = self.stock.equity_ratio[last_year]
 
@@ -552,13 +741,13 @@ class Levermann(object):
 
         return CriteriaRating(equity_ratio, points)
 
-    def eval_ebit_margin(self):
-        last_year = LAST_YEAR
+    def eval_ebit_margin(self, as_of=None):
+        last_year = _as_of(as_of).year - 1
         if last_year not in self.stock.ebit_margin:
             last_year -= 1
             logger.debug("Ebit margin for year %s unknown."
                          " Evaluating margin of year %s"
-                         " instead" % (LAST_YEAR, last_year))
+                         " instead" % (last_year + 1, last_year))
 
         ebit_margin = self.stock.ebit_margin[last_year]
 
@@ -575,39 +764,42 @@ class Levermann(object):
 
         return CriteriaRating(ebit_margin, points)
 
-    def save(self, dir=DATA_PATH):
-        path = levermann_pickle_path(self.stock.symbol, dir)
-        with open(path, "wb") as f:
-            pickle.dump(self, f)
+    def save(self, st=None):
+        if st is None:
+            st = store.default_store()
+        return st.save(self.stock, self.reference_index,
+                       self.evaluation_results, self.summary())
 
-    def short_summary_header(self):
-        s = ("| {:<25} | {:<14} | {:<14} | {:<6} |".\
-                format("Name", "Prev Score (Date)", "Last Score (Date)",
-                       "Advise"))
-        s += "\n"
-        s += "-" * 78
-        return s
+    def summary(self):
+        s = Summary(self.stock.symbol, self.stock.name,
+                    self.stock.cap_type.value if self.stock.cap_type else None)
 
-    def short_summary_footer(self):
-        return "-" * 78
+        if self.stock.quarterly_figure_dates:
+            s.last_quarterly_figures_date = \
+                self.stock.last_quarterly_figures_release_date()
+            s.latest_quarterly_figures_date = \
+                self.stock.quarterly_figure_dates[-1]
 
-    def short_summary(self):
-        r = self.evaluation_results[-1]
-        r_prev = None
-        r_prev_ts = "N/A"
-        r_prev_score = "N/A"
+        if self.evaluation_results:
+            r = self.evaluation_results[-1]
+            s.score = r.score
+            s.timestamp = r.timestamp
+            s.recommendation = self.recommendation().name
         if len(self.evaluation_results) > 1:
             r_prev = self.evaluation_results[-2]
-            r_prev_ts = r_prev.timestamp.strftime("%x")
-            r_prev_score = r_prev.score
+            s.prev_score = r_prev.score
+            s.prev_timestamp = r_prev.timestamp
+
+        return s
 
-        r_ts = r.timestamp.strftime("%x")
+    def short_summary_header(self):
+        return Summary.header()
 
-        s = ("| {:<25} | {:<6} ({:<8}) | {:<6} ({:<8}) | {:<6} |".\
-                format(self.stock.name, r_prev_score,
-                       r_prev_ts, r.score, r_ts, self.recommendation().name))
+    def short_summary_footer(self):
+        return Summary.footer()
 
-        return s
+    def short_summary(self):
+        return str(self.summary())
 
     def __str__(self):
         if not self.evaluation_results:
@@ -620,24 +812,12 @@ class Levermann(object):
         return s
 
     def recommendation(self):
-        if (len(self.evaluation_results) >= 2 and
-            (self.evaluation_results[-1].score -
-             self.evaluation_results[-2].score) <= -2):
-            return Recommendation.SELL
-
-        if self.stock.cap_type == Cap.LARGE:
-            if self.evaluation_results[-1].score <= 2:
-                return Recommendation.SELL
-            if self.evaluation_results[-1].score >= 4:
-                return Recommendation.BUY
-            return Recommendation.NONE
+        prev_score = None
+        if len(self.evaluation_results) >= 2:
+            prev_score = self.evaluation_results[-2].score
 
-        if self.evaluation_results[-1].score <= 4:
-            return Recommendation.SELL
-        if self.evaluation_results[-1].score >= 7:
-            return Recommendation.BUY
-
-        return Recommendation.NONE
+        return recommendation(self.stock.cap_type,
+                              self.evaluation_results[-1].score, prev_score)
 
 
 if __name__ == "__main__":
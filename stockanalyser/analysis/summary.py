@@ -0,0 +1,47 @@
+class Summary(object):
+    # Last two scores and the recommendation of a stock, used to list stocks
+    # without loading their whole evaluation history
+    def __init__(self, symbol, name=None, cap_type=None, score=None,
+                 timestamp=None, prev_score=None, prev_timestamp=None,
+                 recommendation=None, last_quarterly_figures_date=None,
+                 latest_quarterly_figures_date=None):
+        self.symbol = symbol
+        self.name = name
+        self.cap_type = cap_type
+        self.score = score
+        self.timestamp = timestamp
+        self.prev_score = prev_score
+        self.prev_timestamp = prev_timestamp
+        self.recommendation = recommendation
+        # last quarterly figures release date that isn't in the future
+        self.last_quarterly_figures_date = last_quarterly_figures_date
+        # last element of Stock.quarterly_figure_dates
+        self.latest_quarterly_figures_date = latest_quarterly_figures_date
+
+    @staticmethod
+    def header():
+        s = ("| {:<25} | {:<14} | {:<14} | {:<6} |".\
+                format("Name", "Prev Score (Date)", "Last Score (Date)",
+                       "Advise"))
+        s += "\n"
+        s += "-" * 78
+        return s
+
+    @staticmethod
+    def footer():
+        return "-" * 78
+
+    def __str__(self):
+        r_prev_ts = "N/A"
+        r_prev_score = "N/A"
+        if self.prev_timestamp is not None:
+            r_prev_ts = self.prev_timestamp.strftime("%x")
+            r_prev_score = self.prev_score
+
+        r_ts = self.timestamp.strftime("%x")
+
+        s = ("| {:<25} | {:<6} ({:<8}) | {:<6} ({:<8}) | {:<6} |".\
+                format(self.name, r_prev_score,
+                       r_prev_ts, self.score, r_ts, self.recommendation))
+
+        return s
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import socketserver
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from stockanalyser import config, store
+from stockanalyser.stock import Cap
+from stockanalyser.analysis.levermann import Recommendation, recommendation
+
+logger = logging.getLogger(__name__)
+
+# Read-only HTTP/JSON API over the scores, criteria and evaluation history
+# in the store:
+#
+#   GET /stocks?cap_type=LARGE&recommendation=BUY&limit=100&offset=0
+#   GET /stocks/<symbol>
+#   GET /stocks/<symbol>/history?limit=100&offset=0
+#
+# Responses contain an ETag, requests with a matching If-None-Match header
+# are answered with 304. Rendered responses are reused until the store
+# changes.
+
+# maximum number of rendered responses that are kept
+RESPONSE_CACHE_SIZE = 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status, msg):
+        super().__init__(msg)
+        self.status = status
+
+
+def _ts(dt):
+    if dt is None:
+        return None
+    return dt.isoformat()
+
+
+def _param(params, name, convert=str, default=None):
+    if name not in params:
+        return default
+    try:
+        return convert(params[name][-1])
+    except (KeyError, ValueError):
+        raise ApiError(400, "Invalid value of parameter '%s': %s" %
+                       (name, params[name][-1]))
+
+
+def _non_negative_int(s):
+    v = int(s)
+    if v < 0:
+        raise ValueError()
+    return v
+
+
+def _page(params):
+    limit = _param(params, "limit", _non_negative_int, config.API_PAGE_SIZE)
+    offset = _param(params, "offset", _non_negative_int, 0)
+    return (min(limit, config.API_MAX_PAGE_SIZE), offset)
+
+
+def _summary_doc(s):
+    return {
+        "symbol": s.symbol,
+        "name": s.name,
+        "cap_type": Cap(s.cap_type).name if s.cap_type else None,
+        "score": s.score,
+        "timestamp": _ts(s.timestamp),
+        "prev_score": s.prev_score,
+        "prev_timestamp": _ts(s.prev_timestamp),
+        "recommendation": s.recommendation,
+        "last_quarterly_figures_date": _ts(s.last_quarterly_figures_date),
+        "latest_quarterly_figures_date": _ts(s.latest_quarterly_figures_date),
+    }
+
+
+def stocks(st, params):
+    cap = _param(params, "cap_type", lambda s: Cap[s.upper()].value)
+    rec = _param(params, "recommendation",
+                 lambda s: Recommendation[s.upper()].name)
+    limit, offset = _page(params)
+
+    return {"total": st.count_summaries(cap, rec),
+            "limit": limit, "offset": offset,
+            "stocks": [_summary_doc(s) for s in
+                       st.summaries(cap_type=cap, recommendation=rec,
+                                    limit=limit, offset=offset)]}
+
+
+def _summary(st, symbol):
+    try:
+        return st.summary(symbol)
+    except store.NotFoundError:
+        raise ApiError(404, "Unknown stock %s" % symbol)
+
+
+def stock(st, symbol):
+    doc = _summary_doc(_summary(st, symbol))
+    doc["criteria"] = {}
+    evaluations = st.evaluations(symbol, limit=1)
+    if evaluations:
+        doc["criteria"] = evaluations[0][2]
+    return doc
+
+
+def history(st, symbol, params):
+    s = _summary(st, symbol)
+    limit, offset = _page(params)
+
+    # the recommendation depends on the previous score, it's the score of
+    # the next older evaluation
+    evaluations = st.evaluations(symbol, limit + 1, offset)
+    items = []
+    for i, (ts, score, criteria) in enumerate(evaluations[:limit]):
+        rec = None
+        if s.cap_type:
+            prev_score = None
+            if i + 1 < len(evaluations):
+                prev_score = evaluations[i + 1][1]
+            rec = recommendation(Cap(s.cap_type), score, prev_score).name
+        items.append({"timestamp": _ts(ts), "score": score,
+                      "recommendation": rec, "criteria": criteria})
+
+    return {"symbol": symbol, "total": st.count_evaluations(symbol),
+            "limit": limit, "offset": offset, "evaluations": items}
+
+
+def route(st, path, params):
+    # returns the response document of the request
+    parts = [urllib.parse.unquote(p) for p in path.split("/") if p]
+    if parts == ["stocks"]:
+        return stocks(st, params)
+    if len(parts) == 2 and parts[0] == "stocks":
+        return stock(st, parts[1])
+    if len(parts) == 3 and parts[0] == "stocks" and parts[2] == "history":
+        return history(st, parts[1], params)
+    raise ApiError(404, "Unknown path %s" % path)
+
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "stockanalyser"
+
+    def _render(self):
+        url = urllib.parse.urlsplit(self.path)
+        try:
+            status = 200
+            doc = route(self.server.st, url.path,
+                        urllib.parse.parse_qs(url.query))
+        except ApiError as e:
+            status = e.status
+            doc = {"error": str(e)}
+        except Exception as e:
+            logger.exception("Handling '%s' failed: %s" % (self.path, e))
+            status = 500
+            doc = {"error": "Internal error"}
+        body = json.dumps(doc, sort_keys=True).encode("utf-8")
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        return (status, body, etag)
+
+    def do_GET(self):
+        version = self.server.st.version()
+        with self.server.lock:
+            cached = self.server.responses.get(self.path)
+        if cached is not None and cached[0] == version:
+            status, body, etag = cached[1:]
+        else:
+            status, body, etag = self._render()
+            # internal errors might be temporary, they aren't reused
+            with self.server.lock:
+                if len(self.server.responses) >= RESPONSE_CACHE_SIZE:
+                    self.server.responses.clear()
+                if status != 500:
+                    self.server.responses[self.path] = (version, status,
+                                                        body, etag)
+
+        if status == 200 and etag in self.headers.get("If-None-Match", ""):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s %s" % (self.address_string(), format % args))
+
+
+class ApiServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, st=None):
+        super().__init__(address, Handler)
+        if st is None:
+            st = store.default_store()
+        self.st = st
+        # rendered responses keyed by request path:
+        # (store version, status, body, etag)
+        self.responses = {}
+        self.lock = threading.Lock()
+
+
+def start(address=None, port=None, st=None):
+    # serves the API in a background thread, returns the server
+    if address is None:
+        address = config.API_ADDRESS
+    if port is None:
+        port = config.API_PORT
+
+    server = ApiServer((address, port), st)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info("Serving the API on http://%s:%s/" % server.server_address[:2])
+    return server
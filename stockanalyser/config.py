@@ -2,3 +2,88 @@ import os
 
 DATA_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)),
                          "..", "data/")
+
+# Maximum number of concurrent requests per data source host, hosts are
+# matched by their domain suffix
+HOST_CONCURRENCY = {
+    "yahoo.com": 4,
+    "onvista.de": 4,
+    "finanzen.net": 2,
+    "alphavantage.co": 1,
+}
+DEFAULT_HOST_CONCURRENCY = 2
+
+# Number of hosts whose connections are kept alive, the data sources use
+# several hosts per domain (e.g. finance.yahoo.com, de.finance.yahoo.com
+# and query1.finance.yahoo.com). Connections of the least recently used
+# host are closed if more hosts are contacted.
+HTTP_POOL_CONNECTIONS = 20
+
+# Number of threads that fetch pages in the background, e.g. to prefetch
+# the pages of many stocks at once
+FETCH_WORKERS = 8
+
+# Timeouts in seconds for HTTP requests: (connect timeout, read timeout)
+HTTP_TIMEOUT = (10, 60)
+
+HTTP_CACHE_PATH = os.path.join(DATA_PATH, "http_cache")
+
+# Time in seconds a cached HTTP response is used without revalidating it.
+# The first pattern that matches the URL is used, responses for URLs
+# that match no pattern are not cached.
+HTTP_CACHE_TTL = [
+    (r"onvista\.de/aktien/fundamental/", 7 * 24 * 3600),
+    (r"onvista\.de/onvista/boxes/assetSearch", 30 * 24 * 3600),
+    (r"onvista\.de/", 24 * 3600),
+    (r"finanzen\.net/mmsuggest/", 30 * 24 * 3600),
+    (r"finanzen\.net/", 24 * 3600),
+    (r"finance\.yahoo\.com/lookup", 30 * 24 * 3600),
+    (r"finance\.yahoo\.com/quote/", 6 * 3600),
+    (r"finance\.yahoo\.com/v7/finance/quote", 6 * 3600),
+    # daily quotes, the price histories are synced at most once a day
+    (r"alphavantage\.co/query", 12 * 3600),
+]
+
+# Time in seconds a value that was resolved from the ISIN of a stock is
+# used without looking it up again
+RESOLUTION_TTL = {
+    "yahoo_symbol": 365 * 24 * 3600,
+    "onvista_url": 90 * 24 * 3600,
+    "finanzen_net_url": 90 * 24 * 3600,
+    "termine_url": 90 * 24 * 3600,
+}
+
+# Request budget of the alphavantage API key, requests are delayed to stay
+# within it. Responses that report an exceeded rate are retried up to
+# ALPHAVANTAGE_MAX_RETRIES times.
+ALPHAVANTAGE_CALLS_PER_MINUTE = 5
+ALPHAVANTAGE_CALLS_PER_DAY = 500
+ALPHAVANTAGE_MAX_RETRIES = 3
+
+# Time in seconds after which the analysis of a stock is outdated. It's
+# outdated earlier if quarterly figures were released or a new year began
+# since the analysis was created.
+ANALYSIS_MAX_AGE = 3 * 24 * 3600
+
+# 'analyser serve': interval in seconds in which the store is checked for
+# added stocks and in which a failed refresh is retried
+SERVE_POLL_INTERVAL = 600
+SERVE_RETRY_INTERVAL = 3600
+
+# Address and port of the HTTP/JSON API ('analyser api'), number of items
+# per page if the client doesn't pass a limit and the maximum limit
+API_ADDRESS = "127.0.0.1"
+API_PORT = 8080
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
+PRICE_HISTORY_PATH = os.path.join(DATA_PATH, "prices")
+
+STORE_PATH = os.path.join(DATA_PATH, "stockanalyser.sqlite")
+
+# Metrics of the runs of the data fetching commands: one Prometheus text
+# format file per command in METRICS_PATH, it can be read by the
+# node-exporter textfile collector, and a JSON line per run appended to
+# METRICS_LOG_PATH
+METRICS_PATH = os.path.join(DATA_PATH, "metrics")
+METRICS_LOG_PATH = os.path.join(DATA_PATH, "metrics.log")
@@ -1,47 +1,204 @@
-import urllib.request
 import logging
-import json
 import datetime
-import time
+import re
+import threading
+from stockanalyser import config, profiling, store
 from stockanalyser.exceptions import InvalidValueError
 from stockanalyser.data_source import common
+from stockanalyser.data_source.ratelimit import RateLimiter, TokenBucket
+from stockanalyser.data_source.price_history import (PriceStore, merge,
+                                                     from_time_series)
 
 logger = logging.getLogger(__name__)
 
 API_KEY="<YOUR-API-KEY>" 
 BASE_URL="http://www.alphavantage.co/query"
-cache={}
+# a compact response contains the quotes of the last 100 trading days, if
+# the last stored quote is older than COMPACT_MAX_GAP days the full history
+# is requested
+COMPACT_MAX_GAP = 120
+# the quote of a day without trading (e.g. an exchange holiday) is the last
+# close before it, if it is at most QUOTE_MAX_AGE days older
+QUOTE_MAX_AGE = 7
+
+# price histories that were used in this process, keyed by symbol
+histories = {}
+# date of the last download of the price history of a symbol in this
+# process, a long running process downloads the new quotes once a day
+_refreshed = {}
+# one lock per symbol, concurrent requests for the same symbol wait for the
+# first one instead of downloading the history again
+_locks = {}
+_locks_lock = threading.Lock()
+_store = None
+
+# built by rate_limiter(), the number of calls of the current day is stored
+# and restored by following processes that use the same API key
+limiter = None
+_limiter_lock = threading.Lock()
+
 
 class EmptyStockDataResponse(Exception):
     pass
 
 
+class RateExceededError(EmptyStockDataResponse):
+    pass
+
+
+def price_store():
+    global _store
+
+    if _store is None:
+        _store = PriceStore(config.PRICE_HISTORY_PATH)
+    return _store
+
+
+def _today():
+    # the calls per day are counted per UTC day
+    return datetime.datetime.utcnow().date()
+
+
+def _record_call():
+    store.default_store().add_api_call("alphavantage", _today())
+
+
+def rate_limiter():
+    global limiter
+
+    with _limiter_lock:
+        if limiter is None:
+            daily = TokenBucket(config.ALPHAVANTAGE_CALLS_PER_DAY, 24 * 3600)
+            used = store.default_store().api_calls("alphavantage", _today())
+            daily.tokens = max(0.0, daily.capacity - used)
+            limiter = RateLimiter(
+                [TokenBucket(config.ALPHAVANTAGE_CALLS_PER_MINUTE, 60), daily],
+                _record_call)
+            if used:
+                logger.debug("%s alphavantage calls were made today" % used)
+    return limiter
+
+
+def _rate_exceeded_msg(r_json):
+    # alphavantage responds with a "Note" or "Information" message instead
+    # of the data if the request rate of the API key was exceeded
+    if "Time Series (Daily)" in r_json:
+        return None
+    return r_json.get("Note") or r_json.get("Information")
+
+
+def _retry_wait(msg):
+    # returns the seconds to wait before a request that was rejected because
+    # the rate was exceeded can be retried, None if it can't be retried
+    m = re.search(r"(\d+) seconds", msg)
+    if m:
+        return int(m.group(1))
+    if "per minute" in msg:
+        return 60
+    return None
+
+
+def _fetch_json(url):
+    # cached responses don't count against the request budget
+    if common.offline or common.cached(url):
+        return common.fetch_json(url)
+
+    limiter = rate_limiter()
+    for tries in range(config.ALPHAVANTAGE_MAX_RETRIES + 1):
+        if limiter.queue_depth:
+            logger.info("Waiting for alphavantage request budget: %s" %
+                        limiter)
+        limiter.acquire()
+        r_json = common.fetch_json(url)
+
+        msg = _rate_exceeded_msg(r_json)
+        if msg is None:
+            return r_json
+        common.invalidate(url)
+        wait = _retry_wait(msg)
+        if wait is None or tries == config.ALPHAVANTAGE_MAX_RETRIES:
+            break
+        logger.warning("alphavantage rate exceeded, retrying in %ss: %s" %
+                       (wait, msg))
+        limiter.block(wait)
+
+    raise RateExceededError("alphavantage rate exceeded: %s" % msg)
+
+
+def _fetch_time_series(symbol, outputsize):
+    url = (BASE_URL + "?function=TIME_SERIES_DAILY_ADJUSTED&apikey=" + API_KEY +
+           "&outputsize=" + outputsize +
+           "&symbol=" + symbol)
+    logger.debug("Retrieving stock quotes for '%s' (%s)" % (symbol, url))
+    r_json = _fetch_json(url)
+    if "Time Series (Daily)" not in r_json:
+        # error responses must not be served from the cache until it expires
+        if not common.offline:
+            common.invalidate(url)
+        raise EmptyStockDataResponse("alphavantage response for '%s' doesn't"
+                                     " contain stock quotes: %s" %
+                                     (symbol, r_json))
+    return r_json["Time Series (Daily)"]
+
+
+def sync(symbol, h):
+    # updates the price history h with the quotes since its last stored
+    # trading day, the full history is only downloaded if h is None or its
+    # last quote is too old to be covered by a compact response
+    if (h is not None and
+            (datetime.date.today() - h.last_date()).days <= COMPACT_MAX_GAP):
+        new = from_time_series(symbol, _fetch_time_series(symbol, "compact"))
+        if len(new) and new.first_date() <= h.last_date():
+            logger.debug("Merging %s compact quotes of '%s' into stored"
+                         " history" % (len(new), symbol))
+            return merge(h, new)
+        logger.debug("Compact quotes of '%s' don't cover the gap since %s" %
+                     (symbol, h.last_date()))
+
+    new = from_time_series(symbol, _fetch_time_series(symbol, "full"))
+    if h is not None:
+        return merge(h, new)
+    return new
+
+
+def _symbol_lock(symbol):
+    with _locks_lock:
+        lock = _locks.get(symbol)
+        if lock is None:
+            lock = threading.Lock()
+            _locks[symbol] = lock
+    return lock
+
+
+def price_history(symbol, date):
+    # returns the price history of symbol, it is synced if it isn't stored
+    # locally or doesn't contain quotes up to date
+    with _symbol_lock(symbol):
+        h = histories.get(symbol)
+        if h is None:
+            h = price_store().load(symbol)
+
+        if (h is None or
+                (date > h.last_date() and
+                 _refreshed.get(symbol) != datetime.date.today())):
+            with profiling.span("alphavantage.sync", "source",
+                                symbol=symbol):
+                h = sync(symbol, h)
+                price_store().save(h)
+            _refreshed[symbol] = datetime.date.today()
+
+        histories[symbol] = h
+        return h
+
+
 def stock_quote(symbol, date):
     assert date.weekday() not in (6, 7)
-    str_date = date.strftime("%Y/%m/%d")
-    if symbol not in cache:
-        url = (BASE_URL + "?function=TIME_SERIES_DAILY_ADJUSTED&apikey=" + API_KEY +
-               "&outputsize=full" +
-               "&symbol=" + symbol)
-        logger.debug("Retrieving stock quote for '%s' on %s (%s)" % (symbol, date,
-                                                                     url))
-        # TODO: only use outputsize=full if older than the last 100day quotes are
-        # requested
-        r = urllib.request.urlopen(url).read()
-        r_json = json.loads(r.decode("utf-8"))
-        cache[symbol]=r_json
-    else:
-        logger.debug("Retrieving stock quote for '%s' on %s from cache" %
-                     (symbol, date))
-        r_json = cache[symbol]
-
-    f = float(r_json["Time Series (Daily)"][str(date)]["4. close"])
+
+    f = price_history(symbol, date).close_before(date, QUOTE_MAX_AGE)
     logger.debug("stock quote for '%s' on %s: %s" % (symbol, date, f))
     if f == 0.0:
         raise InvalidValueError("Stock Quote from alphavantage is invalid (0) "
-                                "data: %s" % 
-                                r_json["Time Series (Daily)"][str(date)]
-                                ["4.  close"])
+                                "data: %s" % f)
                                 
     return f
 
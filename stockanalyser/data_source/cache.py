@@ -0,0 +1,111 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _atomic_write(path, data):
+    d = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=d, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class CacheEntry(object):
+    def __init__(self, body_path, meta):
+        self.body_path = body_path
+        self.url = meta["url"]
+        self.fetched = meta["fetched"]
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+
+    def age(self):
+        return time.time() - self.fetched
+
+    def body(self):
+        with open(self.body_path, "rb") as f:
+            return f.read()
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ResponseCache(object):
+    # Stores HTTP response bodies on disk, keyed by their URL.
+    # Every entry consists of a file containing the body and a JSON file
+    # containing the URL, fetch time and validators (ETag, Last-Modified).
+    def __init__(self, path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        h = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        d = os.path.join(self.path, h[:2])
+        return (os.path.join(d, h + ".body"), os.path.join(d, h + ".json"))
+
+    def _count(self, attr):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def get(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, "r") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        if meta.get("url") != url or not os.path.isfile(body_path):
+            return None
+        return CacheEntry(body_path, meta)
+
+    def put(self, url, body, etag=None, last_modified=None):
+        body_path, meta_path = self._paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+
+        meta = {"url": url, "fetched": time.time(), "etag": etag,
+                "last_modified": last_modified}
+        _atomic_write(body_path, body)
+        _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+        logger.debug("Stored response for '%s' in cache" % url)
+
+    def touch(self, entry):
+        # marks a cache entry as fresh after it was revalidated successfully
+        _, meta_path = self._paths(entry.url)
+        meta = {"url": entry.url, "fetched": time.time(), "etag": entry.etag,
+                "last_modified": entry.last_modified}
+        _atomic_write(meta_path, json.dumps(meta).encode("utf-8"))
+
+    def delete(self, url):
+        for p in self._paths(url):
+            try:
+                os.unlink(p)
+            except FileNotFoundError:
+                pass
+
+    def hit(self):
+        self._count("hits")
+
+    def miss(self):
+        self._count("misses")
+
+    def revalidate(self):
+        self._count("revalidated")
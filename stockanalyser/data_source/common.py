@@ -1,16 +1,244 @@
-import urllib.request
+import urllib.parse
+import threading
+import json
+import re
+import time
 import lxml.etree
 import logging
 import lxml.html
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from stockanalyser import config, profiling
+from stockanalyser.data_source.cache import ResponseCache
 
 logger = logging.getLogger(__name__)
 
+# Default User-Agent is rejected from the onvista webserver with 404
+USER_AGENT = "Bla"
+
+_host_semaphores = {}
+_host_semaphores_lock = threading.Lock()
+
+_session = None
+_session_lock = threading.Lock()
+
+stats = {}
+_stats_lock = threading.Lock()
+
+_cache = None
+_cache_lock = threading.Lock()
+_cache_ttls = [(re.compile(p), ttl) for p, ttl in config.HTTP_CACHE_TTL]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# if set, responses are only served from the cache
+offline = False
+
+
+class OfflineError(Exception):
+    pass
+
+
+class HostStats(object):
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.latencies = []
+
+    @property
+    def latency(self):
+        return sum(self.latencies)
+
+    def __str__(self):
+        return ("%s requests, %s bytes, %.2fs" %
+                (self.requests, self.bytes, self.latency))
+
+
+def host_key(url):
+    host = urllib.parse.urlsplit(url).hostname or ""
+    for k in config.HOST_CONCURRENCY:
+        if host == k or host.endswith("." + k):
+            return k
+    return host
+
+
+def host_slot(url):
+    # returns a semaphore that limits the number of concurrent requests to
+    # the host of url, use it as context manager around the request
+    key = host_key(url)
+    with _host_semaphores_lock:
+        sem = _host_semaphores.get(key)
+        if sem is None:
+            limit = config.HOST_CONCURRENCY.get(
+                key, config.DEFAULT_HOST_CONCURRENCY)
+            sem = threading.BoundedSemaphore(limit)
+            _host_semaphores[key] = sem
+    return sem
+
+
+def session():
+    # the session is shared by all data sources, it keeps the connections to
+    # a host alive and reuses them for following requests
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            pool_size = max([config.DEFAULT_HOST_CONCURRENCY] +
+                            list(config.HOST_CONCURRENCY.values()))
+            adapter = HTTPAdapter(
+                pool_connections=config.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=pool_size)
+            s = requests.Session()
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["User-Agent"] = USER_AGENT
+            s.headers["Accept-Encoding"] = "gzip, deflate"
+            _session = s
+    return _session
+
+
+def _record(url, nbytes, latency):
+    key = host_key(url)
+    with _stats_lock:
+        st = stats.get(key)
+        if st is None:
+            st = HostStats()
+            stats[key] = st
+        st.requests += 1
+        st.bytes += nbytes
+        st.latencies.append(latency)
+
+
+def get(url, headers=None, timeout=None):
+    if timeout is None:
+        timeout = config.HTTP_TIMEOUT
+
+    key = host_key(url)
+    with host_slot(url), profiling.span(key, "http", host=key, url=url):
+        start = time.monotonic()
+        resp = session().get(url, headers=headers, timeout=timeout)
+        content = resp.content
+        latency = time.monotonic() - start
+
+    # raw.tell() returns the number of bytes that were transferred, for
+    # compressed responses it is smaller then len(content)
+    nbytes = resp.raw.tell() or len(content)
+    _record(url, nbytes, latency)
+    logger.debug("Fetched '%s': HTTP %s, %s bytes in %.3fs" %
+                 (url, resp.status_code, nbytes, latency))
+    resp.raise_for_status()
+
+    return resp
+
+
+def response_cache():
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(config.HTTP_CACHE_PATH)
+    return _cache
+
+
+def reset_stats():
+    # resets the request statistics and the cache counters, e.g. at the
+    # start of a refresh cycle of a long running process
+    with _stats_lock:
+        stats.clear()
+    with _cache_lock:
+        if _cache is not None:
+            _cache.hits = _cache.misses = _cache.revalidated = 0
+
+
+def cache_counters():
+    # returns the (hits, misses, revalidated) counters of the response cache
+    with _cache_lock:
+        if _cache is None:
+            return (0, 0, 0)
+        return (_cache.hits, _cache.misses, _cache.revalidated)
+
+
+def cache_ttl(url):
+    for pattern, ttl in _cache_ttls:
+        if pattern.search(url):
+            return ttl
+    return None
+
+
+def cached(url):
+    # returns if fetch(url) is served from the cache without a request
+    ttl = cache_ttl(url)
+    if ttl is None and not offline:
+        return False
+    entry = response_cache().get(url)
+    return entry is not None and (offline or entry.age() < ttl)
+
+
+def invalidate(url):
+    # removes the cached response, e.g. if it contains an error message
+    response_cache().delete(url)
+
+
+def fetch(url):
+    ttl = cache_ttl(url)
+    if ttl is None and not offline:
+        return get(url).content
+
+    cache = response_cache()
+    entry = cache.get(url)
+    if offline:
+        if entry is None:
+            raise OfflineError("Response for '%s' is not cached" % url)
+        logger.debug("Using cached response for '%s' (offline)" % url)
+        cache.hit()
+        return entry.body()
+
+    headers = None
+    if entry is not None:
+        if entry.age() < ttl:
+            logger.debug("Using cached response for '%s'" % url)
+            cache.hit()
+            return entry.body()
+        headers = entry.conditional_headers()
+
+    resp = get(url, headers)
+    if resp.status_code == 304 and entry is not None:
+        logger.debug("Cached response for '%s' is still valid" % url)
+        cache.revalidate()
+        cache.touch(entry)
+        return entry.body()
+
+    cache.miss()
+    cache.put(url, resp.content, resp.headers.get("ETag"),
+              resp.headers.get("Last-Modified"))
+    return resp.content
+
+
+def executor():
+    # thread pool for background fetches, the number of concurrent requests
+    # per host is still limited by host_slot()
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=config.FETCH_WORKERS)
+    return _executor
+
+
+def fetch_async(url):
+    # returns a Future of fetch(url)
+    return executor().submit(fetch, url)
+
+
+def fetch_json(url):
+    return json.loads(fetch(url).decode("utf-8"))
+
 
 def url_to_etree(url):
-        req = urllib.request.Request(url)
-        # Default User-Agent is rejected from the onvista webserver with 404
-        req.add_header('User-Agent', "Bla")
         logger.debug("Fetching webpage '%s'" % url)
-        resp = urllib.request.urlopen(req).read()
+        resp = fetch(url)
 
-        return lxml.html.fromstring(resp)
+        with profiling.span("lxml.html.fromstring", "parse", url=url):
+            return lxml.html.fromstring(resp)
@@ -1,4 +1,4 @@
-from stockanalyser.data_source import common
+from stockanalyser.data_source import common, resolution
 from datetime import datetime
 import logging
 import requests
@@ -15,29 +15,40 @@ class FinanzenNetScraper(object):
 
     def _lookup_url(self):
         url = "http://www.finanzen.net/mmsuggest/smartsugg.asp?max_results=1&Keywords_mode=APPROX&Keywords=%(isin)s&query=%(isin)s&bias=100&target_id=0&mmFormat=json" % {'isin': self.isin}
-        json_response = requests.get(url).json()
+        json_response = common.fetch_json(url)
         assert len(json_response['it']) == 1
         target_url = json_response['it'][0]['il'][0]['u']
         logger.debug("Fetched target url: %s" % target_url)
 
         return target_url
 
-    def _get_termine_url(self):
-        element = common.url_to_etree(self.url)
+    def _get_termine_url(self, url):
+        self.url = url
+        element = common.url_to_etree(url)
         path = element.xpath('//a[@title][contains(., "Termine")]')[0].attrib['href']
         logger.debug("fetched termine path: %s" % path)
 
         return requests.compat.urljoin("http://www.finanzen.net/", path)
 
+    def _resolve_termine_url(self):
+        return resolution.call_resolved(self.isin, "finanzen_net_url",
+                                        self._lookup_url,
+                                        self._get_termine_url)
+
     def fetch_recent_quarterly_figures_release_date(self):
         # returns a sorted list of all "Quartalszahlen" dates
         if self.isin:
-            self.url = self._lookup_url()
+            return resolution.call_resolved(self.isin, "termine_url",
+                                            self._resolve_termine_url,
+                                            self._release_dates)
 
         if self.url is None:
             raise ValueError("Stock's finanzen.net URL is not set ")
 
-        termine_url = self._get_termine_url()
+        return self._release_dates(self._get_termine_url(self.url))
+
+    def _release_dates(self, termine_url):
+        self.termine_url = termine_url
         etree = common.url_to_etree(termine_url)
         rows = etree.xpath("//table[@class='table']//tr")
         release_dates = []
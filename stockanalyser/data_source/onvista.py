@@ -1,13 +1,27 @@
+import lxml.etree
 import lxml.html
 import re
+import threading
+from concurrent.futures import Future
 from decimal import Decimal
 from stockanalyser.mymoney import Money
+from stockanalyser import profiling
 import logging
 from stockanalyser.data_source import common
 
 
 logger = logging.getLogger(__name__)
 
+_FUNDAMENTAL_TABLES = lxml.etree.XPath(
+    './/*[@id="ONVISTA"]/div[1]/div[1]/div[1]/article/article/div/table')
+_TABLE_HEADER = lxml.etree.XPath("thead/tr/*")
+_TABLE_ROWS = lxml.etree.XPath("tbody/tr")
+_ROW_CELLS = lxml.etree.XPath("*")
+
+_ANALYST_RATINGS = [lxml.etree.XPath(
+    './/*[@id="AggregatedAnalysesTabAction"]/div/article/div/table/tbody/'
+    'tr[%d]/td[2]/text()' % i) for i in (1, 2, 3)]
+
 
 class ParsingError(Exception):
     pass
@@ -21,44 +35,99 @@ def is_number(txt):
         return False
 
 
+def prefetch(scrapers):
+    # starts fetching the pages of all scrapers in the background
+    for s in scrapers:
+        s.prefetch()
+
+
 class OnvistaScraper(object):
     def __init__(self, url):
         self.overview_url = url
         self.fundamental_url = self._build_fundamental_url(url)
-        self.fundamental_etree = None
-
-        self.fetch_fundamental_webpage()
-        self.fetch_overview_webpage()
+        # pages are fetched and parsed on first access, the futures contain
+        # the raw pages
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._fundamental_etree = None
+        self._overview_etree = None
+        self._fundamentals = None
 
     def _build_fundamental_url(self, url):
         spl = url.split("/")
         spl.insert(4, "fundamental")
         return "/".join(spl)
 
+    def prefetch(self, fundamental=True, overview=True):
+        # starts fetching the pages in the background, pages that are already
+        # fetched or being fetched are not requested again
+        urls = []
+        if fundamental:
+            urls.append(self.fundamental_url)
+        if overview:
+            urls.append(self.overview_url)
+
+        with self._lock:
+            for url in urls:
+                if url not in self._pages:
+                    self._pages[url] = common.fetch_async(url)
+        return self
+
+    def _page(self, url):
+        with self._lock:
+            f = self._pages.get(url)
+            fetch = f is None
+            if fetch:
+                f = Future()
+                self._pages[url] = f
+
+        if fetch:
+            try:
+                f.set_result(common.fetch(url))
+            except Exception as e:
+                f.set_exception(e)
+        return f.result()
+
+    def _refetch(self, url):
+        with self._lock:
+            self._pages.pop(url, None)
+        self._page(url)
+
     def fetch_fundamental_webpage(self):
-        self.fundamental_etree = common.url_to_etree(self.fundamental_url)
+        self._refetch(self.fundamental_url)
+        self._fundamental_etree = None
+        self._fundamentals = None
 
     def fetch_overview_webpage(self):
-        self.overview_etree = common.url_to_etree(self.overview_url)
+        self._refetch(self.overview_url)
+        self._overview_etree = None
+
+    @property
+    def fundamental_etree(self):
+        if self._fundamental_etree is None:
+            page = self._page(self.fundamental_url)
+            with profiling.span("onvista.fundamental_page", "parse"):
+                self._fundamental_etree = lxml.html.fromstring(page)
+        return self._fundamental_etree
+
+    @property
+    def overview_etree(self):
+        if self._overview_etree is None:
+            page = self._page(self.overview_url)
+            with profiling.span("onvista.overview_page", "parse"):
+                self._overview_etree = lxml.html.fromstring(page)
+        return self._overview_etree
 
     def _get_analyst_rating(self, xpath):
-        res = self.overview_etree.xpath(xpath)
+        res = xpath(self.overview_etree)
         if not res:
             return None
         v = int(res[0].strip())
         return v
 
     def analyst_ratings(self):
-        buy_xpath = ('.//*[@id="AggregatedAnalysesTabAction"]/div/article/'
-                     'div/table/tbody/tr[1]/td[2]/text()')
-        hold_xpath = ('.//*[@id="AggregatedAnalysesTabAction"]/div/article/'
-                      'div/table/tbody/tr[2]/td[2]/text()')
-        sell_xpath = ('.//*[@id="AggregatedAnalysesTabAction"]/div/article/'
-                      'div/table/tbody/tr[3]/td[2]/text()')
-
-        buy = self._get_analyst_rating(buy_xpath)
-        hold = self._get_analyst_rating(hold_xpath)
-        sell = self._get_analyst_rating(sell_xpath)
+        buy, hold, sell = [self._get_analyst_rating(x) for x in
+                           _ANALYST_RATINGS]
 
         return (buy, hold, sell)
 
@@ -79,7 +148,7 @@ class OnvistaScraper(object):
                 v = "20" + v.split("/")[1]
 
             # remove the "e" for estimated from year endings
-            if re.match("\d+e", v):
+            if re.match(r"\d+e", v):
                 v = int(v[:-1])
             elif is_number(v):
                 v = int(v)
@@ -96,79 +165,79 @@ class OnvistaScraper(object):
         v = v.replace("%", "")
         return v
 
-    def _extract_from_table(self, table_xpath, table_header, row_xpath,
-                            row_header, is_money=False):
-        res = self.fundamental_etree.findall(table_xpath)
-        theader = self._get_table_header(res)
-        if theader[0] != table_header:
-            raise ParsingError("Unexpected table header: '%s'" % theader[0])
-
-        res = self.fundamental_etree.findall(row_xpath)
-        rows = []
-        for r in res:
-            v = self._normalize_number(r.text)
-            if v is not None and not len(v):
+    def fundamentals(self):
+        # parses all tables of the fundamental page in one pass, returns a
+        # dict {table header: {row header: (table header row, row cells)}}
+        # that contains the normalized cell strings
+        if self._fundamentals is not None:
+            return self._fundamentals
+
+        etree = self.fundamental_etree
+        with profiling.span("onvista.fundamental_tables", "parse"):
+            self._fundamentals = self._parse_tables(etree)
+        return self._fundamentals
+
+    def _parse_tables(self, etree):
+        tables = {}
+        for t in _FUNDAMENTAL_TABLES(etree):
+            theader = self._get_table_header(_TABLE_HEADER(t))
+            if not theader:
                 continue
-            elif is_number(v):
-                if is_money:
-                    v = Money(Decimal(v), "EUR")
-                else:
-                    v = float(v)
-            rows.append(v)
-
-        if rows[0] != row_header:
-            raise ParsingError("Unexpected 1. row header: '%s' != '%s'" %
-                               (rows[0], row_header))
-
-        if len(theader) != len(rows):
+            rows = tables.setdefault(theader[0], {})
+
+            for tr in _TABLE_ROWS(t):
+                cells = []
+                for c in _ROW_CELLS(tr):
+                    v = self._normalize_number(c.text or "")
+                    if v is not None and not len(v):
+                        continue
+                    cells.append(v)
+                if cells and cells[0] not in rows:
+                    rows[cells[0]] = (theader, cells)
+
+        return tables
+
+    def _extract_from_table(self, table_header, row_header, is_money=False):
+        rows = self.fundamentals().get(table_header)
+        if rows is None:
+            raise ParsingError("Table with header '%s' not found" %
+                               table_header)
+        if row_header not in rows:
+            raise ParsingError("Row '%s' not found in table '%s'" %
+                               (row_header, table_header))
+        theader, cells = rows[row_header]
+
+        if len(theader) != len(cells):
             raise ParsingError("Parsing error, table header contains more"
                                " elements than rows:"
-                               "'%s' vs '%s'" % (theader, rows))
+                               "'%s' vs '%s'" % (theader, cells))
 
         result = {}
-        for i in range(len(rows)):
-            if theader[i] == table_header:
+        for h, v in zip(theader, cells):
+            if h == table_header:
                 continue
-            result[theader[i]] = rows[i]
+            if is_number(v):
+                if is_money:
+                    v = Money(Decimal(v), "EUR")
+                else:
+                    v = float(v)
+            result[h] = v
         logger.debug("Extracted '%s' from onvista: %s" % (row_header, result))
 
         return result
 
     def eps(self):
-        table_xpath = ('.//*[@id="ONVISTA"]/div[1]/div[1]/div[1]/'
-                       'article/article/div/table[1]/thead/tr/')
-        row_xpath = ('.//*[@id="ONVISTA"]/div[1]/div[1]/div[1]/'
-                     'article/article/div/table[1]/tbody/tr[1]/')
-
-        return self._extract_from_table(table_xpath, "gewinn", row_xpath,
-                                        "gewinn pro aktie in eur", True)
+        return self._extract_from_table("gewinn", "gewinn pro aktie in eur",
+                                        True)
 
     def ebit_margin(self):
-        table_xpath = ('.//*[@id="ONVISTA"]/div[1]/div[1]/div[1]/'
-                       'article/article/div/table[8]/thead/tr/')
-        row_xpath = ('.//*[@id="ONVISTA"]/div[1]/div[1]/div[1]/'
-                     'article/article/div/table[8]/tbody/tr[2]/')
-
-        return self._extract_from_table(table_xpath, "rentabilität", row_xpath,
-                                        "ebit-marge")
+        return self._extract_from_table("rentabilität", "ebit-marge")
 
     def equity_ratio(self):
-        table_xpath = ('.//*[@id="ONVISTA"]/div[1]/div[1]/div[1]/'
-                       'article/article/div/table[6]/thead/tr/')
-        row_xpath = ('.//*[@id="ONVISTA"]/div[1]/div[1]/div[1]/'
-                     'article/article/div/table[6]/tbody/tr[2]/')
-
-        return self._extract_from_table(table_xpath, "bilanz", row_xpath,
-                                        "eigenkapitalquote")
+        return self._extract_from_table("bilanz", "eigenkapitalquote")
 
     def roe(self):
-        table_xpath = ('.//*[@id="ONVISTA"]/div[1]/div[1]/div[1]/'
-                       'article/article/div/table[8]/thead/tr/')
-        row_xpath = ('.//*[@id="ONVISTA"]/div[1]/div[1]/div[1]/'
-                     'article/article/div/table[8]/tbody/tr[4]/')
-
-        return self._extract_from_table(table_xpath, "rentabilität", row_xpath,
-                                        "eigenkapitalrendite")
+        return self._extract_from_table("rentabilität", "eigenkapitalrendite")
 
 
 if __name__ == "__main__":
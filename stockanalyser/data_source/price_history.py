@@ -0,0 +1,116 @@
+import datetime
+import logging
+import os
+import tempfile
+import numpy as np
+from stockanalyser import fileutils
+
+logger = logging.getLogger(__name__)
+
+# dates are stored as proleptic Gregorian ordinals (date.toordinal())
+DTYPE = np.dtype([("date", "<i4"), ("close", "<f8")])
+
+
+class PriceHistory(object):
+    # Daily closing quotes of a symbol, sorted by date
+    def __init__(self, symbol, data):
+        self.symbol = symbol
+        self.data = data
+        self.dates = data["date"]
+        self.closes = data["close"]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def first_date(self):
+        return datetime.date.fromordinal(int(self.dates[0]))
+
+    def last_date(self):
+        return datetime.date.fromordinal(int(self.dates[-1]))
+
+    def close(self, adate):
+        d = adate.toordinal()
+        i = np.searchsorted(self.dates, d)
+        if i == len(self.dates) or self.dates[i] != d:
+            raise KeyError(adate)
+        return float(self.closes[i])
+
+    def close_before(self, adate, max_age=None):
+        # returns the last close on or before adate, if max_age is set the
+        # close must be at most max_age days older than adate
+        d = adate.toordinal()
+        i = np.searchsorted(self.dates, d, side="right")
+        if i == 0 or (max_age is not None and d - self.dates[i - 1] > max_age):
+            raise KeyError(adate)
+        return float(self.closes[i - 1])
+
+    def month_ends(self, start, end):
+        # returns the last trading day of each month between start and end
+        ords = self.dates[(self.dates >= start.toordinal()) &
+                          (self.dates <= end.toordinal())]
+        days = [datetime.date.fromordinal(int(d)) for d in ords]
+
+        ends = []
+        for d in days:
+            if ends and (ends[-1].year, ends[-1].month) == (d.year, d.month):
+                ends[-1] = d
+            else:
+                ends.append(d)
+        return ends
+
+
+def from_time_series(symbol, series):
+    # converts the "Time Series (Daily)" dict of an alphavantage response
+    data = np.empty(len(series), dtype=DTYPE)
+    for i, (k, v) in enumerate(series.items()):
+        d = datetime.datetime.strptime(k, "%Y-%m-%d").date()
+        data[i] = (d.toordinal(), float(v["4. close"]))
+    data.sort(order="date")
+
+    return PriceHistory(symbol, data)
+
+
+def merge(history, other):
+    # merges the quotes of both histories, for dates that are contained in
+    # both the quote of other is used
+    data = np.concatenate((np.asarray(other.data, dtype=DTYPE),
+                           np.asarray(history.data, dtype=DTYPE)))
+    # unique() returns the index of the first occurrence of each date in
+    # ascending date order
+    _, idx = np.unique(data["date"], return_index=True)
+
+    return PriceHistory(history.symbol, data[idx])
+
+
+class PriceStore(object):
+    # Stores one .npy file per symbol, files are memory-mapped when loaded
+    def __init__(self, path):
+        self.path = path
+
+    def _path(self, symbol):
+        return os.path.join(self.path, fileutils.to_filename(symbol, ".npy"))
+
+    def load(self, symbol):
+        path = self._path(symbol)
+        if not os.path.isfile(path):
+            return None
+
+        data = np.load(path, mmap_mode="r")
+        logger.debug("Loaded price history of '%s' from '%s' (%s quotes)" %
+                     (symbol, path, len(data)))
+        return PriceHistory(symbol, data)
+
+    def save(self, history):
+        os.makedirs(self.path, exist_ok=True)
+        path = self._path(history.symbol)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(history.data, dtype=DTYPE))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.debug("Stored price history of '%s' in '%s'" %
+                     (history.symbol, path))
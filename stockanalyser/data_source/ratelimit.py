@@ -0,0 +1,98 @@
+import collections
+import threading
+import time
+
+
+class TokenBucket(object):
+    # allows calls calls per period seconds on average and bursts of up to
+    # capacity calls
+    def __init__(self, calls, period, capacity=None):
+        self.rate = calls / period
+        self.capacity = capacity or calls
+        self.tokens = float(self.capacity)
+        self._last = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def wait_time(self, n=1):
+        # returns the seconds until n tokens are available
+        self._refill()
+        return max(0.0, (n - self.tokens) / self.rate)
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+    def drain(self):
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class RateLimiter(object):
+    # schedules calls so that none of the token buckets is exceeded, waiting
+    # calls are served in FIFO order. on_acquire is called after each
+    # acquired call, e.g. to persist the number of calls.
+    def __init__(self, buckets, on_acquire=None):
+        self.buckets = buckets
+        self.on_acquire = on_acquire
+        self.calls = 0
+        # number of times the calls were blocked by block()
+        self.blocked = 0
+        self._cond = threading.Condition()
+        self._queue = collections.deque()
+        self._blocked_until = 0.0
+
+    def _wait_time(self, n=1):
+        blocked = self._blocked_until - time.monotonic()
+        return max([blocked] + [b.wait_time(n) for b in self.buckets])
+
+    def acquire(self):
+        # blocks until the call can be made
+        ticket = object()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] is ticket:
+                        wait = self._wait_time()
+                        if wait <= 0:
+                            for b in self.buckets:
+                                b.take()
+                            self.calls += 1
+                            break
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+        if self.on_acquire is not None:
+            self.on_acquire()
+
+    def block(self, seconds):
+        # delays all following calls by seconds, e.g. after the server
+        # rejected a call because the rate was exceeded
+        with self._cond:
+            self._blocked_until = max(self._blocked_until,
+                                      time.monotonic() + seconds)
+            self.blocked += 1
+            for b in self.buckets:
+                b.drain()
+            self._cond.notify_all()
+
+    @property
+    def queue_depth(self):
+        return len(self._queue)
+
+    def eta(self):
+        # returns the estimated seconds until all waiting calls are made
+        with self._cond:
+            return self._wait_time(len(self._queue))
+
+    def __str__(self):
+        return ("%s calls, %s queued, ETA %.0fs" %
+                (self.calls, self.queue_depth, self.eta()))
@@ -0,0 +1,103 @@
+import datetime
+import logging
+import threading
+import numpy as np
+from stockanalyser.dateutils import last_weekday_of_month
+from stockanalyser.exceptions import InvalidValueError
+from stockanalyser.data_source import alphavantage
+
+logger = logging.getLogger(__name__)
+
+# days between a weekday and its previous weekday, see
+# dateutils.prev_weekday(), indexed by date.weekday()
+_PREV_WEEKDAY_OFFSETS = np.array([3, 1, 1, 1, 1, 1, 2])
+
+# reference indices that were used in this process, keyed by symbol
+_indices = {}
+_lock = threading.Lock()
+
+
+def _pct_chg(new, old):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return ((new / old) - 1) * 100
+
+
+class ReferenceIndex(object):
+    # Quotes of a reference index with precomputed daily and monthly
+    # changes, they are shared by all stocks that are compared with it
+    def __init__(self, history):
+        self.symbol = history.symbol
+        self.history = history
+        dates = np.asarray(history.dates)
+        closes = np.asarray(history.closes)
+
+        # change from the previous weekday to each trading day, NaN if
+        # there is no quote for the previous weekday
+        # (date.fromordinal(1) is a monday)
+        prev = dates - _PREV_WEEKDAY_OFFSETS[(dates - 1) % 7]
+        j = np.minimum(np.searchsorted(dates, prev), len(dates) - 1)
+        found = dates[j] == prev
+        self._daily_invalid = found & ((closes == 0) | (closes[j] == 0))
+        self.daily_changes = np.where(found, _pct_chg(closes, closes[j]),
+                                      np.nan)
+
+        # change from the last weekday of the previous month to the last
+        # weekday of the month, keyed by (year, month)
+        self.monthly_changes = {}
+        if not len(dates):
+            return
+        first = history.first_date()
+        last = history.last_date()
+        months = [(y, m) for y in range(first.year, last.year + 1)
+                  for m in range(1, 13)
+                  if (first.year, first.month) <= (y, m) <=
+                  (last.year, last.month)]
+        ends = np.array([last_weekday_of_month(datetime.date(y, m, 1))
+                         .toordinal() for y, m in months])
+        i = np.minimum(np.searchsorted(dates, ends), len(dates) - 1)
+        month_closes = np.where(dates[i] == ends, closes[i], np.nan)
+        chg = _pct_chg(month_closes[1:], month_closes[:-1])
+        for k in range(1, len(months)):
+            pair = month_closes[k - 1:k + 1]
+            if np.isnan(pair).any():
+                continue
+            # NaN marks changes that are based on an invalid quote
+            self.monthly_changes[months[k]] = (float(chg[k - 1]) if
+                                               pair.all() else float("nan"))
+
+    def daily_change(self, adate):
+        # returns the change in percent from the previous weekday to adate
+        d = adate.toordinal()
+        i = np.searchsorted(self.history.dates, d)
+        if (i == len(self.history.dates) or self.history.dates[i] != d or
+                np.isnan(self.daily_changes[i])):
+            raise KeyError(adate)
+        if self._daily_invalid[i]:
+            raise InvalidValueError("Quote of %s is invalid (0) on %s or the"
+                                    " previous weekday" % (self.symbol, adate))
+        return float(self.daily_changes[i])
+
+    def monthly_change(self, adate):
+        # returns the change in percent from the last weekday of the
+        # previous month to the last weekday of the month of adate
+        chg = self.monthly_changes.get((adate.year, adate.month))
+        if chg is None:
+            raise KeyError(adate)
+        if np.isnan(chg):
+            raise InvalidValueError("Quote of %s is invalid (0) at the end of"
+                                    " %s or the previous month" %
+                                    (self.symbol, adate.strftime("%m/%Y")))
+        return chg
+
+
+def get(symbol, date):
+    # returns the reference index containing the quotes up to date. The
+    # changes are only computed again if its price history was synced.
+    h = alphavantage.price_history(symbol, date)
+    with _lock:
+        idx = _indices.get(symbol)
+        if idx is None or idx.history is not h:
+            logger.debug("Computing changes of reference index %s" % symbol)
+            idx = ReferenceIndex(h)
+            _indices[symbol] = idx
+    return idx
@@ -0,0 +1,69 @@
+import datetime
+import logging
+from stockanalyser import config, store, metrics
+from stockanalyser.data_source import common
+
+logger = logging.getLogger(__name__)
+
+
+def _store(st):
+    if st is None:
+        return store.default_store()
+    return st
+
+
+def _cached(isin, kind, st):
+    res = st.resolution(isin, kind)
+    if res is None:
+        metrics.inc("resolution_misses")
+        return None
+    value, timestamp = res
+    age = (datetime.datetime.now() - timestamp).total_seconds()
+    # expired values are still used in offline mode
+    if age >= config.RESOLUTION_TTL[kind] and not common.offline:
+        metrics.inc("resolution_misses")
+        return None
+    metrics.inc("resolution_hits")
+    return value
+
+
+def _lookup(isin, kind, lookup, st):
+    value = lookup()
+    logger.debug("Resolved %s of %s: %s" % (kind, isin, value))
+    st.save_resolution(isin, kind, value)
+    return value
+
+
+def resolve(isin, kind, lookup, st=None):
+    # returns the stored value of kind (e.g. "onvista_url") for the ISIN,
+    # if it isn't stored or expired it's retrieved with lookup() and stored
+    st = _store(st)
+    value = _cached(isin, kind, st)
+    if value is not None:
+        return value
+    return _lookup(isin, kind, lookup, st)
+
+
+def invalidate(isin, kind=None, st=None):
+    logger.debug("Invalidating resolved %s of %s" % (kind or "values", isin))
+    _store(st).delete_resolution(isin, kind)
+
+
+def call_resolved(isin, kind, lookup, func, st=None):
+    # returns func(value) with the resolved value of kind for the ISIN. If
+    # func fails with a stored value, the value might be outdated, it's
+    # looked up again and func is retried once.
+    st = _store(st)
+    value = _cached(isin, kind, st)
+    if value is None:
+        return func(_lookup(isin, kind, lookup, st))
+
+    try:
+        return func(value)
+    except Exception as e:
+        if common.offline:
+            raise
+        logger.info("Using resolved %s of %s failed, looking it up again: %s"
+                    % (kind, isin, e))
+        invalidate(isin, kind, st)
+        return func(_lookup(isin, kind, lookup, st))
@@ -1,9 +1,11 @@
-import urllib.request
 import urllib.parse
+import requests
 import logging
 import json
 import datetime
+import threading
 import time
+from stockanalyser import profiling
 from stockanalyser.data_source import common
 
 logger = logging.getLogger(__name__)
@@ -14,6 +16,20 @@ class EmptyStockDataResponse(Exception):
 
 
 YQL_BASE_URL = "http://query.yahooapis.com/v1/public/yql?"
+QUOTE_API_URL = "https://query1.finance.yahoo.com/v7/finance/quote?"
+# maximum number of symbols that are requested with one quote API request
+QUOTE_BATCH_SIZE = 50
+
+# initial number of bytes that are decoded when extracting a JSON object
+# from a page, the window is doubled until the object is complete
+EXTRACT_WINDOW = 16 * 1024
+
+_decoder = json.JSONDecoder()
+
+# stock infos retrieved by prefetch_stock_infos(), they are used by the next
+# get_stock_info() call for the symbol
+_prefetched = {}
+_prefetched_lock = threading.Lock()
 
 
 def get_yql_result(params):
@@ -25,10 +41,9 @@ def get_yql_result(params):
     resp = None
 
     while resp is None:
-        req = urllib.request.Request(url)
         try:
             logger.debug("Fetching Yahoo stock data from '%s'" % url)
-            resp = urllib.request.urlopen(req).read()
+            resp = common.fetch(url)
             tries += 1
 
             logger.debug("Got Yahoo stock data response: '%s'" % resp)
@@ -44,7 +59,7 @@ def get_yql_result(params):
                                              " Response: '%s'" % res)
             return res["query"]["results"]["quote"]
 
-        except (urllib.error.HTTPError, EmptyStockDataResponse) as e:
+        except (requests.HTTPError, EmptyStockDataResponse) as e:
             resp = None
             if tries < 1:
                 logger.error("Fetching yahoo YQL Stock Data failed, retrying"
@@ -54,26 +69,58 @@ def get_yql_result(params):
                 raise e
 
 
+def extract_json_object(page, key, start=0):
+    # returns the JSON object that follows the first '"key":' in the raw
+    # page after the offset start. Only the bytes of the object are decoded
+    # and parsed, not the whole document that contains it.
+    marker = b'"' + key.encode("utf-8") + b'":'
+    i = page.find(marker, start)
+    if i == -1:
+        raise EmptyStockDataResponse("'%s' not found in response" % key)
+    i = page.find(b"{", i + len(marker))
+    if i == -1:
+        raise EmptyStockDataResponse("'%s' isn't a JSON object" % key)
+
+    window = EXTRACT_WINDOW
+    while True:
+        chunk = page[i:i + window]
+        # an incomplete multibyte character at the end of a truncated chunk
+        # is dropped, the object can't be complete in that case anyway
+        try:
+            obj, _ = _decoder.raw_decode(chunk.decode("utf-8", "ignore"))
+            return obj
+        except ValueError:
+            if i + window >= len(page):
+                raise
+        window *= 2
+
+
+def extract_quote_summary(page):
+    # returns the QuoteSummaryStore of the root.App.main state of a raw
+    # Yahoo quote page
+    start = page.find(b"root.App.main")
+    if start == -1:
+        raise EmptyStockDataResponse("root.App.main not found in response")
+    return extract_json_object(page, "QuoteSummaryStore", start)
+
+
 def get_stock_info(symbol):
+    with _prefetched_lock:
+        res = _prefetched.pop(symbol, None)
+    if res is not None:
+        logger.debug("Using prefetched stock info for %s" % symbol)
+        return res
+
     # from https://stackoverflow.com/a/47148296/537958
     url = 'https://finance.yahoo.com/quote/' + symbol
-    req = urllib.request.Request(url)
-    resp = urllib.request.urlopen(req).read()
-
-    r=resp.decode("utf-8")
-    i1=0
-    i1=r.find('root.App.main', i1)
-    i1=r.find('{', i1)
-    i2=r.find("\n", i1)
-    i2=r.rfind(';', i1, i2)
-    jsonstr=r[i1:i2]
-
-    data = json.loads(jsonstr)
-    market_cap=data['context']['dispatcher']['stores']['QuoteSummaryStore']['summaryDetail']['marketCap']['raw']
-    prev_close=data['context']['dispatcher']['stores']['QuoteSummaryStore']['summaryDetail']['previousClose']['raw']
-    currency=data['context']['dispatcher']['stores']['QuoteSummaryStore']['summaryDetail']['currency']
-    name=data['context']['dispatcher']['stores']['QuoteSummaryStore']['price']['shortName']
+    resp = common.fetch(url)
 
+    with profiling.span("yahoo.quote_summary", "parse"):
+        summary = extract_quote_summary(resp)
+    market_cap = summary['summaryDetail']['marketCap']['raw']
+    prev_close = summary['summaryDetail']['previousClose']['raw']
+    currency = summary['summaryDetail']['currency']
+    name = summary['price']['shortName']
 
     res = {}
     res["Name"] = name
@@ -84,6 +131,72 @@ def get_stock_info(symbol):
     return res
 
 
+def _quote_api_info(quote):
+    res = {}
+    res["Name"] = quote["shortName"]
+    res["PreviousClose"] = quote["regularMarketPreviousClose"]
+    res["Currency"] = quote["currency"]
+    res["MarketCapitalization"] = int(quote["marketCap"])
+    return res
+
+
+def _get_quote_api_infos(symbols):
+    url = QUOTE_API_URL + urllib.parse.urlencode(
+        {"symbols": ",".join(symbols)})
+    logger.debug("Fetching Yahoo quotes from '%s'" % url)
+    data = common.fetch_json(url)
+
+    res = {}
+    for quote in data["quoteResponse"]["result"] or []:
+        try:
+            res[quote["symbol"]] = _quote_api_info(quote)
+        except KeyError as e:
+            logger.debug("Quote of %s is missing %s" % (quote.get("symbol"),
+                                                         e))
+    return res
+
+
+def get_stock_infos(symbols):
+    # returns a dict {symbol: stock info} in the format of get_stock_info().
+    # The infos are requested in batches from the quote API, stocks that
+    # can't be retrieved that way are fetched concurrently from their quote
+    # pages. Symbols whose info couldn't be retrieved are missing in the
+    # result.
+    symbols = sorted(set(symbols))
+    res = {}
+    for i in range(0, len(symbols), QUOTE_BATCH_SIZE):
+        batch = symbols[i:i + QUOTE_BATCH_SIZE]
+        try:
+            res.update(_get_quote_api_infos(batch))
+        except (requests.RequestException, common.OfflineError, ValueError,
+                KeyError, TypeError) as e:
+            logger.warning("Fetching Yahoo quotes of %s stocks failed: %s" %
+                           (len(batch), e))
+
+    missing = [s for s in symbols if s not in res]
+    if missing:
+        logger.debug("Fetching quote pages of %s" % ", ".join(missing))
+    futures = [(s, common.executor().submit(get_stock_info, s))
+               for s in missing]
+    for s, f in futures:
+        try:
+            res[s] = f.result()
+        except Exception as e:
+            logger.warning("Fetching Yahoo stock info of %s failed: %s" %
+                           (s, e))
+
+    return res
+
+
+def prefetch_stock_infos(symbols):
+    # retrieves the stock infos of all symbols with as few requests as
+    # possible, they are used by the following get_stock_info() calls
+    infos = get_stock_infos(symbols)
+    with _prefetched_lock:
+        _prefetched.update(infos)
+    return infos
+
+
 def lookupSymbol(isin):
         lookup_url = "https://de.finance.yahoo.com/lookup?s=%s" % isin
         etree = common.url_to_etree(lookup_url)
@@ -0,0 +1,35 @@
+import calendar
+from datetime import date, timedelta
+
+
+def is_weekday(adate):
+    if adate.weekday() in (5, 6):
+        return False
+
+    return True
+
+
+def prev_weekday(adate):
+        _offsets = (3, 1, 1, 1, 1, 1, 2)
+        return adate - timedelta(days=_offsets[adate.weekday()])
+
+
+def closest_weekday(adate):
+    if adate.weekday() == 6:
+        return adate + timedelta(days=1)
+    elif adate.weekday() == 5:
+        return adate - timedelta(days=1)
+    return adate
+
+
+def last_weekday_of_month(adate):
+    last_day = calendar.monthrange(adate.year, adate.month)[1]
+    d = date(adate.year, adate.month, last_day)
+
+    if not is_weekday(d):
+        return prev_weekday(d)
+    return d
+
+
+def prev_month(adate):
+    return date(adate.year, adate.month, 1) - timedelta(days=1)
@@ -1,7 +1,7 @@
 import re
 
 
-def to_pickle_filename(name):
-    filename = re.sub("\s+", "_", name).lower()
-    filename += ".pickle"
+def to_filename(name, ext):
+    filename = re.sub(r"\s+", "_", name).lower()
+    filename += ext
     return filename
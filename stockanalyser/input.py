@@ -1,5 +1,4 @@
 from enum import Enum, unique
-from stockanalyser.mymoney import Money
 import time
 from datetime import datetime
 from stockanalyser.exceptions import InvalidValueError
@@ -16,6 +15,9 @@ class QueryType(Enum):
 
 
 def query_input(value_name, val_type):
+    # money is slow to import, it's only needed for currency values
+    from stockanalyser.mymoney import Money
+
     while True:
         try:
             if val_type == QueryType.PERCENT:
@@ -0,0 +1,205 @@
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from stockanalyser import config
+
+# Run-level metrics of a command, they are written at the end of the run as
+# Prometheus text format file (e.g. for the node-exporter textfile
+# collector) and appended as JSON line to the metrics log. The data sources
+# are only imported when the metrics are collected, counting doesn't
+# require them.
+
+PREFIX = "stockanalyser_"
+
+_counters = {}
+_lock = threading.Lock()
+
+
+def inc(name, n=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def reset():
+    # starts a new measurement period, e.g. a refresh cycle of the daemon
+    from stockanalyser.data_source import common, alphavantage
+
+    with _lock:
+        _counters.clear()
+    common.reset_stats()
+    # the limiter is built by the first alphavantage request
+    if alphavantage.limiter is not None:
+        alphavantage.limiter.calls = 0
+        alphavantage.limiter.blocked = 0
+
+
+def percentile(values, p):
+    # nearest-rank percentile, None if there are no values
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _ratio(n, total):
+    if not total:
+        return None
+    return n / total
+
+
+def collect(command, duration, ok=True):
+    # returns the metrics of the run as dict
+    from stockanalyser.data_source import common, alphavantage
+
+    hosts = {}
+    for host, st in sorted(common.stats.items()):
+        hosts[host] = {"requests": st.requests, "bytes": st.bytes,
+                       "latency_p50": percentile(st.latencies, 50),
+                       "latency_p95": percentile(st.latencies, 95)}
+
+    hits, misses, revalidated = common.cache_counters()
+    cnt = counters()
+    res_hits = cnt.pop("resolution_hits", 0)
+    res_misses = cnt.pop("resolution_misses", 0)
+    evaluated = cnt.get("stocks_evaluated", 0)
+    av_calls = av_blocked = 0
+    if alphavantage.limiter is not None:
+        av_calls = alphavantage.limiter.calls
+        av_blocked = alphavantage.limiter.blocked
+
+    return {
+        # seconds since the epoch
+        "timestamp": time.time(),
+        "command": command,
+        "ok": ok,
+        "duration": duration,
+        "hosts": hosts,
+        "http_cache": {"hits": hits, "misses": misses,
+                       "revalidated": revalidated,
+                       "hit_ratio": _ratio(hits, hits + misses + revalidated)},
+        "resolution_cache": {"hits": res_hits, "misses": res_misses,
+                             "hit_ratio": _ratio(res_hits,
+                                                 res_hits + res_misses)},
+        "alphavantage": {"calls": av_calls,
+                         "rate_exceeded": av_blocked,
+                         "quota_used": _ratio(
+                             av_calls, config.ALPHAVANTAGE_CALLS_PER_DAY)},
+        "counters": cnt,
+        "stocks_per_second": _ratio(evaluated, duration),
+    }
+
+
+def _label_value(v):
+    return (str(v).replace("\\", "\\\\").replace("\"", "\\\"")
+            .replace("\n", "\\n"))
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{%s}" % ",".join("%s=\"%s\"" % (k, _label_value(v)) for k, v in
+                             sorted(labels.items()))
+
+
+def prometheus(m):
+    # returns the metrics in the Prometheus text format, all values are of
+    # the last run, metrics without value are omitted
+    families = []
+
+    def add(name, help, samples):
+        samples = [(labels, v) for labels, v in samples if v is not None]
+        if samples:
+            families.append((PREFIX + name, help, samples))
+
+    cmd = {"command": m["command"]}
+
+    def host_samples(key):
+        return [(dict(cmd, host=h), st[key]) for h, st in
+                m["hosts"].items()]
+
+    add("last_run_timestamp_seconds", "End time of the run",
+        [(cmd, m["timestamp"])])
+    add("last_run_success", "1 if the run succeeded", [(cmd, int(m["ok"]))])
+    add("last_run_duration_seconds", "Duration of the run",
+        [(cmd, m["duration"])])
+    add("http_requests", "HTTP requests per data source host",
+        host_samples("requests"))
+    add("http_bytes", "Downloaded bytes per data source host",
+        host_samples("bytes"))
+    add("http_latency_seconds", "HTTP request latency per data source host",
+        [(dict(cmd, host=h, quantile=q), st[key])
+         for h, st in m["hosts"].items()
+         for q, key in (("0.5", "latency_p50"), ("0.95", "latency_p95"))])
+    for cache in ("http_cache", "resolution_cache"):
+        c = m[cache]
+        add(cache + "_requests", "Lookups per result",
+            [(dict(cmd, result=r), c[r]) for r in
+             ("hits", "misses", "revalidated") if r in c])
+        add(cache + "_hit_ratio", "Share of lookups that were hits",
+            [(cmd, c["hit_ratio"])])
+    add("alphavantage_calls", "alphavantage API calls",
+        [(cmd, m["alphavantage"]["calls"])])
+    add("alphavantage_rate_exceeded", "alphavantage API calls that were"
+        " rejected because the rate was exceeded",
+        [(cmd, m["alphavantage"]["rate_exceeded"])])
+    add("alphavantage_quota_used_ratio", "alphavantage API calls per daily"
+        " request budget", [(cmd, m["alphavantage"]["quota_used"])])
+    for name, v in sorted(m["counters"].items()):
+        add(name, name.replace("_", " ").capitalize(), [(cmd, v)])
+    add("stocks_evaluated_per_second", "Evaluated stocks per second of the"
+        " run", [(cmd, m["stocks_per_second"])])
+
+    s = ""
+    for name, help, samples in families:
+        s += "# HELP %s %s\n# TYPE %s gauge\n" % (name, help, name)
+        for labels, v in samples:
+            s += "%s%s %s\n" % (name, _labels(labels), repr(float(v)))
+    return s
+
+
+def _atomic_write(path, data):
+    # the textfile collector must not read partially written files
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                    prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write(m):
+    os.makedirs(config.METRICS_PATH, exist_ok=True)
+    os.makedirs(os.path.dirname(config.METRICS_LOG_PATH), exist_ok=True)
+    _atomic_write(os.path.join(config.METRICS_PATH, "stockanalyser_%s.prom" %
+                               m["command"]), prometheus(m))
+    with open(config.METRICS_LOG_PATH, "a") as f:
+        f.write(json.dumps(m, sort_keys=True) + "\n")
+
+
+class Run(object):
+    # context manager that writes the metrics of a command at its end
+    def __init__(self, command):
+        self.command = command
+        # if unset, the metrics of a successful run aren't written
+        self.record = True
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.record or exc_type is not None:
+            write(collect(self.command, time.monotonic() - self.start,
+                          exc_type is None))
+        return False
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+
+# Timed spans of the processing stages. They are only recorded after
+# enable() was called, otherwise span() returns a no-op context manager.
+
+enabled = False
+
+_events = []
+_lock = threading.Lock()
+_start = 0.0
+
+
+class _NoSpan(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span(object):
+    __slots__ = ("name", "cat", "args", "start")
+
+    def __init__(self, name, cat, args):
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        # Chrome trace "complete" event, times are in microseconds
+        event = {"name": self.name, "cat": self.cat, "ph": "X",
+                 "ts": (self.start - _start) * 10**6,
+                 "dur": (end - self.start) * 10**6,
+                 "pid": os.getpid(), "tid": threading.get_ident()}
+        if self.args:
+            event["args"] = self.args
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def span(name, cat="stage", **args):
+    # returns a context manager that records the time spent in it
+    if not enabled:
+        return _NO_SPAN
+    return Span(name, cat, args)
+
+
+def enable():
+    global enabled, _start
+
+    with _lock:
+        del _events[:]
+    _start = time.perf_counter()
+    enabled = True
+
+
+def disable():
+    global enabled
+
+    enabled = False
+
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def write_trace(path):
+    # writes the spans in the Chrome trace event format, it can be loaded
+    # into chrome://tracing or Perfetto
+    evs = events()
+    names = {}
+    for e in evs:
+        if e["cat"] == "stock":
+            names.setdefault(e["tid"], "worker %s" % (len(names) + 1))
+    meta = [{"name": "thread_name", "ph": "M", "pid": os.getpid(),
+             "tid": tid, "args": {"name": name}}
+            for tid, name in names.items()]
+
+    with open(path, "w") as f:
+        json.dump({"traceEvents": meta + evs, "displayTimeUnit": "ms"}, f)
+
+
+def _aggregate(evs, key):
+    stats = {}
+    for e in evs:
+        k = key(e)
+        count, total, longest = stats.get(k, (0, 0.0, 0.0))
+        stats[k] = (count + 1, total + e["dur"], max(longest, e["dur"]))
+    return sorted(stats.items(), key=lambda i: i[1][1], reverse=True)
+
+
+def _table(title, rows, limit):
+    s = "{:<50} {:>7} {:>11} {:>11} {:>11}\n".format(title, "Count",
+                                                     "Total [ms]",
+                                                     "Mean [ms]",
+                                                     "Max [ms]")
+    for k, (count, total, longest) in rows[:limit]:
+        s += "{:<50} {:>7} {:>11.1f} {:>11.1f} {:>11.1f}\n".format(
+            k, count, total / 1000, total / count / 1000, longest / 1000)
+    return s
+
+
+def summary(limit=15):
+    # returns tables of the stages and hosts that took the most time
+    evs = events()
+    stages = _aggregate([e for e in evs if e["cat"] not in ("http",
+                                                            "stock")],
+                        lambda e: "%s: %s" % (e["cat"], e["name"]))
+    hosts = _aggregate([e for e in evs if e["cat"] == "http"],
+                       lambda e: e["args"]["host"])
+
+    return (_table("Stage", stages, limit) + "\n" +
+            _table("Host", hosts, limit))
@@ -0,0 +1,162 @@
+import datetime
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from stockanalyser import config, store, metrics
+from stockanalyser.analysis import levermann
+from stockanalyser.data_source import yahoo
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler(object):
+    # Keeps the Levermann objects of all stored stocks in memory and
+    # refreshes each of them when its analysis becomes outdated. The price
+    # histories, reference indices and the HTTP session stay loaded between
+    # the refreshes.
+    def __init__(self, st=None, jobs=1):
+        if st is None:
+            st = store.default_store()
+        self.st = st
+        self.jobs = jobs
+        self.levermann_objs = {}
+        # store revisions of the loaded stocks, keyed by symbol
+        self._revisions = {}
+        # heap of (due datetime, symbol) tuples, entries whose due datetime
+        # differs from the one in _due are outdated and skipped
+        self._queue = []
+        self._due = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def schedule(self, l, since=None):
+        self._push(l.next_refresh(since), l.stock.symbol)
+
+    def _push(self, due, sym):
+        self._due[sym] = due
+        heapq.heappush(self._queue, (due, sym))
+        logger.debug("Next refresh of %s: %s" % (sym, due))
+
+    def _load(self, sym, revision):
+        l = levermann.load_levermann(sym, self.st)
+        with self._lock:
+            self.levermann_objs[sym] = l
+            self._revisions[sym] = revision
+        return l
+
+    def sync(self):
+        # loads the stocks that were added to the store and reloads the ones
+        # that were changed by other processes, e.g. by 'analyser add', 'set'
+        # or 'update' while the scheduler is running
+        revisions = self.st.revisions()
+        for sym in list(self.levermann_objs):
+            if sym not in revisions:
+                logger.info("%s was removed from the store" % sym)
+                del self.levermann_objs[sym]
+                del self._revisions[sym]
+                self._due.pop(sym, None)
+
+        for sym, revision in sorted(revisions.items()):
+            if self._revisions.get(sym) == revision:
+                continue
+            if sym in self.levermann_objs:
+                logger.info("%s was changed in the store, reloading it" % sym)
+            self.schedule(self._load(sym, revision))
+
+    def next_due(self):
+        while self._queue:
+            due, sym = self._queue[0]
+            if self._due.get(sym) == due:
+                return due
+            heapq.heappop(self._queue)
+        return None
+
+    def _pop_due(self, now):
+        due = []
+        while self._queue and self._queue[0][0] <= now:
+            d, sym = heapq.heappop(self._queue)
+            if self._due.get(sym) == d:
+                del self._due[sym]
+                due.append(self.levermann_objs[sym])
+        return due
+
+    def refresh(self, l):
+        # fetches the data of the stock, evaluates and stores it, returns if
+        # the refresh succeeded
+        sym = l.stock.symbol
+        try:
+            # the stock might have been changed since the last sync, the
+            # changes must not be overwritten
+            revision = self.st.revision(sym)
+            if revision != self._revisions[sym]:
+                l = self._load(sym, revision)
+            l.stock.update_stock_info()
+            # ratings of criteria whose inputs didn't change are reused
+            if l.evaluate(incremental=True):
+                metrics.inc("stocks_updated")
+            revision = l.save(self.st)
+            with self._lock:
+                self._revisions[sym] = revision
+        except Exception as e:
+            metrics.inc("stocks_failed")
+            logger.exception("Refreshing %s failed: %s" % (sym, e))
+            return False
+
+        logger.info("Refreshed %s, recomputed criteria: %s" %
+                    (sym, ", ".join(l.recomputed) or "none"))
+        return True
+
+    def run_once(self, now=None):
+        # refreshes the stocks that are due, returns their symbols
+        if now is None:
+            now = datetime.datetime.now()
+        self.sync()
+        due = self._pop_due(now)
+        if not due:
+            return []
+
+        logger.info("Refreshing %s stocks" % len(due))
+        try:
+            yahoo.prefetch_stock_infos([l.stock.symbol for l in due])
+        except Exception as e:
+            # the quotes are retrieved separately for each stock
+            logger.warning("Prefetching quotes failed: %s" % e)
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(self.refresh, due))
+
+        for l, ok in zip(due, results):
+            sym = l.stock.symbol
+            if sym not in self.levermann_objs:
+                continue
+            if ok:
+                # refresh() might have reloaded the stock
+                self.schedule(self.levermann_objs[sym], now)
+            else:
+                self._push(now + datetime.timedelta(
+                    seconds=config.SERVE_RETRY_INTERVAL), sym)
+        return [l.stock.symbol for l in due]
+
+    def run(self):
+        # refreshes the stocks until stop() is called, the metrics of every
+        # cycle that refreshed stocks are written
+        while not self._stop.is_set():
+            metrics.reset()
+            try:
+                with metrics.Run("serve") as run:
+                    refreshed = self.run_once()
+                    # cycles without refreshes don't overwrite the metrics
+                    # of the last one
+                    run.record = bool(refreshed)
+            except Exception as e:
+                logger.exception("Refresh cycle failed: %s" % e)
+
+            wait = config.SERVE_POLL_INTERVAL
+            due = self.next_due()
+            if due is not None:
+                wait = min(wait, (due - datetime.datetime.now())
+                           .total_seconds())
+            self._stop.wait(max(wait, 0))
+
+    def stop(self):
+        self._stop.set()
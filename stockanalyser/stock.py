@@ -1,20 +1,17 @@
 from stockanalyser import input
-import os
-import pickle
 import logging
 import datetime
-import requests
 import json
-from stockanalyser.data_source import yahoo
 from stockanalyser.mymoney import Money
+from money.exceptions import CurrencyMismatch
 from stockanalyser.exceptions import InvalidValueError
 from stockanalyser.config import *
-from stockanalyser import fileutils
-from stockanalyser.data_source.onvista import OnvistaScraper
-from stockanalyser.data_source.finanzen_net import FinanzenNetScraper
+from stockanalyser import store, profiling
 from enum import Enum, unique
 
-logging.basicConfig(level=logging.DEBUG)
+# the data sources are imported by the methods that fetch the stock data,
+# loading stored stocks doesn't require them
+
 logger = logging.getLogger(__name__)
 
 
@@ -27,23 +24,37 @@ class MissingDataError(Exception):
 
 
 class EPS(object):
+    # amount is the value as float, it's used for calculations instead of
+    # the Money object
+    __slots__ = ("value", "update_date", "amount")
+
     def __init__(self, value, date):
         self.value = value
         self.update_date = date
+        self.amount = float(value.amount)
 
-    def __str__(self):
-        return str(self.value)
+    @property
+    def currency(self):
+        return self.value.currency
 
+    def __getstate__(self):
+        return (self.value, self.update_date)
 
-def stock_pickle_path(symbol, dir=DATA_PATH):
-    filename = fileutils.to_pickle_filename(symbol)
-    path = os.path.join(dir, filename)
-    return path
+    def __setstate__(self, state):
+        # objects that were pickled before __slots__ were used have a dict
+        # as state
+        if isinstance(state, dict):
+            state = (state["value"], state["update_date"])
+        self.__init__(*state)
 
+    def __str__(self):
+        return str(self.value)
 
-def unpickle_stock(symbol, dir=DATA_PATH):
-        path = stock_pickle_path(symbol)
-        return pickle.load(open(path, "rb"))
+
+def load_stock(symbol, st=None):
+    if st is None:
+        st = store.default_store()
+    return st.load(symbol)[0]
 
 
 @unique
@@ -53,10 +64,20 @@ class Cap(Enum):
     LARGE = 3
 
 
+def cap_type(market_cap):
+    if market_cap >= (5 * 10**9):
+        return Cap.LARGE
+    elif market_cap >= (2 * 10**9):
+        return Cap.MID
+    return Cap.SMALL
+
+
 class Stock(object):
     def __init__(self, symbol=None, onvista_fundamental_url=None, finanzen_net_url=None, isin=None):
         if symbol == None:
-            symbol = yahoo.lookupSymbol(isin)
+            from stockanalyser.data_source import resolution, yahoo
+            symbol = resolution.resolve(isin, "yahoo_symbol",
+                                        lambda: yahoo.lookupSymbol(isin))
 
         self.symbol = symbol
         self.name = None
@@ -72,15 +93,23 @@ class Stock(object):
         self.finanzen_net_url = finanzen_net_url
         self.isin = isin
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # stocks that were stored before the quote amount was stored as float
+        if "quote" in state and "quote_amount" not in state:
+            self.quote_amount = float(state["quote"].amount)
 
     def _fetch_finanzen_net_data(self):
+        from stockanalyser.data_source.finanzen_net import FinanzenNetScraper
         scrp = FinanzenNetScraper(self.finanzen_net_url, isin=self.isin)
-        self.quarterly_figure_dates = scrp.fetch_recent_quarterly_figures_release_date()
-        self.quarterly_figure_dates
+        with profiling.span("finanzen.net", "source", symbol=self.symbol):
+            self.quarterly_figure_dates = \
+                scrp.fetch_recent_quarterly_figures_release_date()
 
     def _lookupFundamentalUrl(self):
         lookup_url = "http://www.onvista.de/onvista/boxes/assetSearch.json?doSubmit=Suchen&portfolioName=&searchValue=%s" % self.isin
-        json_response = requests.get(lookup_url).json()
+        from stockanalyser.data_source import common
+        json_response = common.fetch_json(lookup_url)
         assets = json_response['onvista']['results']['asset']
         assert len(assets) == 1
         target_url = assets[0]['snapshotlink']
@@ -88,13 +117,26 @@ class Stock(object):
         return target_url
 
     def _fetch_onvista_data(self):
+        with profiling.span("onvista", "source", symbol=self.symbol):
+            self._fetch_onvista()
+
+    def _fetch_onvista(self):
         if self.isin:
-            self.onvista_fundamental_url = self._lookupFundamentalUrl()
+            from stockanalyser.data_source import resolution
+            resolution.call_resolved(self.isin, "onvista_url",
+                                     self._lookupFundamentalUrl,
+                                     self._scrape_onvista)
+            return
 
         if not self.onvista_fundamental_url:
             raise MissingDataError("onvista_fundamental_url isn't set")
+        self._scrape_onvista(self.onvista_fundamental_url)
 
-        scr = OnvistaScraper(self.onvista_fundamental_url)
+    def _scrape_onvista(self, url):
+        self.onvista_fundamental_url = url
+        from stockanalyser.data_source.onvista import OnvistaScraper
+        # both pages are needed, fetch them in parallel
+        scr = OnvistaScraper(url).prefetch()
         eps = scr.eps()
         for k, v in eps.items():
             if v is not None:
@@ -117,10 +159,11 @@ class Stock(object):
 
         self.analyst_ratings = scr.analyst_ratings()
 
-    def last_quarterly_figures_release_date(self):
-        today = datetime.date.today()
+    def last_quarterly_figures_release_date(self, as_of=None):
+        if as_of is None:
+            as_of = datetime.date.today()
         for d in reversed(self.quarterly_figure_dates):
-            if d <= today:
+            if d <= as_of:
                 return d
 
 
@@ -131,19 +174,20 @@ class Stock(object):
         return False
 
 
-    def update_stock_info(self):
-        data = yahoo.get_stock_info(self.symbol)
+    def update_quote(self):
+        from stockanalyser.data_source import yahoo
+        with profiling.span("yahoo", "source", symbol=self.symbol):
+            data = yahoo.get_stock_info(self.symbol)
         self.name = data["Name"]
-        self.quote = Money(float(data["PreviousClose"]), data["Currency"])
+        quote = Money(float(data["PreviousClose"]), data["Currency"])
+        for vals in self.eps.values():
+            self._check_currency(quote, vals[-1].value)
+        self.set_quote(quote)
         self.market_cap = float(data["MarketCapitalization"])
+        self.cap_type = cap_type(self.market_cap)
 
-        if self.market_cap >= (5 * 10**9):
-            self.cap_type = Cap.LARGE
-        elif self.market_cap >= (2 * 10**9):
-            self.cap_type = Cap.MID
-        else:
-            self.cap_type = Cap.SMALL
-
+    def update_stock_info(self):
+        self.update_quote()
         self._fetch_onvista_data()
         self._fetch_finanzen_net_data()
 
@@ -151,6 +195,8 @@ class Stock(object):
         if not isinstance(val, Money):
             raise input.InvalidValueError("Expected value to be from type"
                                           " Money not %s" % type(val))
+        if getattr(self, "quote", None) is not None:
+            self._check_currency(self.quote, val)
         eps = EPS(val, datetime.date.today())
 
         if year in self.eps:
@@ -167,6 +213,17 @@ class Stock(object):
         else:
             self.eps[year] = [eps]
 
+    def set_quote(self, val):
+        self.quote = val
+        # the amount is used for calculations instead of the Money object
+        self.quote_amount = float(val.amount)
+
+    def _check_currency(self, quote, eps):
+        # the price earnings ratios require that the quote and EPS values
+        # have the same currency
+        if eps.currency != quote.currency:
+            raise CurrencyMismatch(quote.currency, eps.currency, "/")
+
     def set_equity_ratio(self, year, val):
         self.equity_ratio[year] = val
 
@@ -177,18 +234,35 @@ class Stock(object):
         input.validate_percent_value(val)
         self.roe[year] = val
 
-    def save(self, dir=DATA_PATH):
-        path = stock_pickle_path(self.symbol)
-        with open(path, "wb") as f:
-            pickle.dump(self, f)
+    def quote_value(self):
+        return self.quote_amount
+
+    def _eps_amounts(self, years):
+        # returns the latest EPS values of the years as floats
+        return [self.eps[year][-1].amount for year in years]
+
+    def price_earnings_ratio_value(self, as_of=None):
+        # price_earnings_ratio() as float
+        cur_year = (as_of or datetime.date.today()).year
+        eps, = self._eps_amounts([cur_year])
+
+        return self.quote_value() / eps
+
+    def price_earnings_ratio_5year_value(self, as_of=None):
+        # price_earnings_ratio_5year() as float, the EPS values are summed in
+        # the same order as in analysis.batch.evaluate()
+        cur_year = (as_of or datetime.date.today()).year
+        eps = self._eps_amounts(range(cur_year - 3, cur_year + 2))
+
+        return self.quote_value() / (sum(eps) / 5)
 
-    def price_earnings_ratio(self):
-        cur_year = datetime.date.today().year
+    def price_earnings_ratio(self, as_of=None):
+        cur_year = (as_of or datetime.date.today()).year
 
         return self.quote / self.eps[cur_year][-1].value
 
-    def price_earnings_ratio_5year(self):
-        cur_year = datetime.date.today().year
+    def price_earnings_ratio_5year(self, as_of=None):
+        cur_year = (as_of or datetime.date.today()).year
         avg_per = (self.eps[cur_year + 1][-1].value +
                    self.eps[cur_year][-1].value +
                    self.eps[cur_year-1][-1].value +
@@ -0,0 +1,495 @@
+import datetime
+import json
+import logging
+import math
+import os
+import pickle
+import sqlite3
+import threading
+from stockanalyser import config, profiling
+from stockanalyser.analysis.summary import Summary
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    symbol TEXT PRIMARY KEY,
+    isin TEXT,
+    name TEXT,
+    cap_type INTEGER,
+    reference_index TEXT,
+    data BLOB NOT NULL,
+    revision INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS stock_isin ON stock(isin);
+
+CREATE TABLE IF NOT EXISTS fundamentals (
+    symbol TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (symbol, timestamp)
+);
+
+CREATE TABLE IF NOT EXISTS evaluation (
+    symbol TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    criteria TEXT,
+    PRIMARY KEY (symbol, timestamp)
+);
+CREATE INDEX IF NOT EXISTS evaluation_timestamp ON evaluation(timestamp);
+
+CREATE TABLE IF NOT EXISTS summary (
+    symbol TEXT PRIMARY KEY,
+    name TEXT,
+    cap_type INTEGER,
+    score INTEGER,
+    timestamp TEXT,
+    prev_score INTEGER,
+    prev_timestamp TEXT,
+    recommendation TEXT,
+    last_quarterly_figures_date TEXT,
+    latest_quarterly_figures_date TEXT
+);
+CREATE INDEX IF NOT EXISTS summary_score ON summary(score);
+
+CREATE TABLE IF NOT EXISTS resolution (
+    isin TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    PRIMARY KEY (isin, kind)
+);
+
+CREATE TABLE IF NOT EXISTS api_calls (
+    api TEXT NOT NULL,
+    day TEXT NOT NULL,
+    calls INTEGER NOT NULL,
+    PRIMARY KEY (api, day)
+);
+"""
+
+SUMMARY_COLUMNS = ("symbol", "name", "cap_type", "score", "timestamp",
+                   "prev_score", "prev_timestamp", "recommendation",
+                   "last_quarterly_figures_date",
+                   "latest_quarterly_figures_date")
+
+_default = None
+_default_lock = threading.Lock()
+
+
+class NotFoundError(Exception):
+    pass
+
+
+def _ts(dt):
+    if dt is None:
+        return None
+    return dt.isoformat()
+
+
+def _parse_ts(s):
+    if s is None:
+        return None
+    # isoformat() omits the microseconds if they are 0
+    try:
+        return datetime.datetime.strptime(s, "%Y-%m-%dT%H:%M:%S.%f")
+    except ValueError:
+        return datetime.datetime.strptime(s, "%Y-%m-%dT%H:%M:%S")
+
+
+def _parse_date(s):
+    if s is None:
+        return None
+    return datetime.datetime.strptime(s, "%Y-%m-%d").date()
+
+
+def _summary_row(s):
+    return (s.symbol, s.name, s.cap_type, s.score, _ts(s.timestamp),
+            s.prev_score, _ts(s.prev_timestamp), s.recommendation,
+            _ts(s.last_quarterly_figures_date),
+            _ts(s.latest_quarterly_figures_date))
+
+
+def _summary(row):
+    (symbol, name, cap_type, score, ts, prev_score, prev_ts, recommendation,
+     last_qf_date, latest_qf_date) = row
+    return Summary(symbol, name, cap_type, score, _parse_ts(ts), prev_score,
+                   _parse_ts(prev_ts), recommendation,
+                   _parse_date(last_qf_date), _parse_date(latest_qf_date))
+
+
+def _fundamentals(stock):
+    # returns the scraped fundamental data of a stock as JSON document
+    quote = getattr(stock, "quote", None)
+    eps = {}
+    for year, vals in stock.eps.items():
+        eps[str(year)] = [[str(e.value.amount), e.value.currency,
+                           e.update_date.isoformat()] for e in vals]
+
+    data = {
+        "roe": {str(k): v for k, v in stock.roe.items()},
+        "ebit_margin": {str(k): v for k, v in stock.ebit_margin.items()},
+        "equity_ratio": {str(k): v for k, v in stock.equity_ratio.items()},
+        "eps": eps,
+        "analyst_ratings": stock.analyst_ratings,
+        "quarterly_figure_dates": [d.isoformat() for d in
+                                   stock.quarterly_figure_dates],
+        "market_cap": stock.market_cap,
+        "quote": ([str(quote.amount), quote.currency] if quote is not None
+                  else None),
+    }
+    return json.dumps(data, sort_keys=True)
+
+
+def _json_value(v):
+    # converts a criterion value to a JSON compatible value, NaN and infinite
+    # values become None
+    if isinstance(v, (tuple, list)):
+        return [_json_value(x) for x in v]
+    if v is None or isinstance(v, (bool, int, str)):
+        return v
+    v = float(v)
+    if math.isnan(v) or math.isinf(v):
+        return None
+    return v
+
+
+def _criteria(result):
+    # returns the ratings of a LevermannResult as JSON document, they are
+    # stored next to the pickled result to read them without unpickling
+    data = {}
+    for c in result.CRITERIA:
+        r = getattr(result, c)
+        if r is not None:
+            data[c] = {"value": _json_value(r.value), "points": int(r.points)}
+    return json.dumps(data, sort_keys=True)
+
+
+def _summary_filter(outdated_before=None, cap_type=None,
+                    recommendation=None):
+    conds = []
+    params = ()
+    if outdated_before is not None:
+        conds.append("latest_quarterly_figures_date <= ?")
+        params += (outdated_before.isoformat(),)
+    if cap_type is not None:
+        conds.append("cap_type = ?")
+        params += (cap_type,)
+    if recommendation is not None:
+        conds.append("recommendation = ?")
+        params += (recommendation,)
+    if not conds:
+        return ("", params)
+    return (" WHERE " + " AND ".join(conds), params)
+
+
+class Store(object):
+    # SQLite database containing the stocks, snapshots of their fundamental
+    # data and their evaluation history
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        # adds the columns that were added after the store was created
+        c = self._conn
+        columns = [r[1] for r in c.execute("PRAGMA table_info(stock)")]
+        if "revision" not in columns:
+            c.execute("ALTER TABLE stock ADD COLUMN revision INTEGER NOT NULL"
+                      " DEFAULT 0")
+
+        columns = [r[1] for r in c.execute("PRAGMA table_info(evaluation)")]
+        if "criteria" not in columns:
+            c.execute("ALTER TABLE evaluation ADD COLUMN criteria TEXT")
+            rows = c.execute("SELECT symbol, timestamp, data FROM"
+                             " evaluation").fetchall()
+            c.executemany("UPDATE evaluation SET criteria = ? WHERE"
+                          " symbol = ? AND timestamp = ?",
+                          [(_criteria(pickle.loads(data)), sym, ts)
+                           for sym, ts, data in rows])
+            logger.info("Added criteria of %s evaluations to '%s'" %
+                        (len(rows), self.path))
+
+    def close(self):
+        self._conn.close()
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def contains(self, symbol):
+        return bool(self._query("SELECT 1 FROM stock WHERE symbol = ?",
+                                (symbol,)))
+
+    def symbols(self):
+        return [r[0] for r in
+                self._query("SELECT symbol FROM stock ORDER BY symbol")]
+
+    def revisions(self):
+        # returns a dict of the revisions of all stocks, keyed by symbol
+        return dict(self._query("SELECT symbol, revision FROM stock"))
+
+    def revision(self, symbol):
+        rows = self._query("SELECT revision FROM stock WHERE symbol = ?",
+                           (symbol,))
+        if not rows:
+            raise NotFoundError("Stock %s isn't stored" % symbol)
+        return rows[0][0]
+
+    def symbol_by_isin(self, isin):
+        rows = self._query("SELECT symbol FROM stock WHERE isin = ?",
+                           (isin,))
+        if not rows:
+            raise NotFoundError("No stock with ISIN %s stored" % isin)
+        return rows[0][0]
+
+    def save(self, stock, reference_index=None, evaluation_results=(),
+             summary=None):
+        # returns the revision of the stored stock, it's incremented on
+        # every save
+        with profiling.span("store.save", "store", symbol=stock.symbol):
+            return self._save(stock, reference_index, evaluation_results,
+                              summary)
+
+    def _save(self, stock, reference_index, evaluation_results, summary):
+        with self._lock, self._conn:
+            c = self._conn
+            row = c.execute("SELECT revision FROM stock WHERE symbol = ?",
+                            (stock.symbol,)).fetchone()
+            revision = row[0] + 1 if row else 1
+            c.execute("INSERT OR REPLACE INTO stock (symbol, isin, name,"
+                      " cap_type, reference_index, data, revision)"
+                      " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                      (stock.symbol, stock.isin, stock.name,
+                       stock.cap_type.value if stock.cap_type else None,
+                       reference_index, pickle.dumps(stock), revision))
+
+            self._save_fundamentals(stock)
+
+            # results are only appended, the ones up to the latest stored
+            # result are already persisted
+            latest = _parse_ts(c.execute(
+                "SELECT MAX(timestamp) FROM evaluation WHERE symbol = ?",
+                (stock.symbol,)).fetchone()[0])
+            c.executemany("INSERT OR IGNORE INTO evaluation (symbol,"
+                          " timestamp, score, data, criteria)"
+                          " VALUES (?, ?, ?, ?, ?)",
+                          [(stock.symbol, _ts(r.timestamp), r.score,
+                            pickle.dumps(r), _criteria(r))
+                           for r in evaluation_results
+                           if latest is None or r.timestamp > latest])
+
+            if summary is not None:
+                c.execute("INSERT OR REPLACE INTO summary (%s) VALUES (%s)" %
+                          (", ".join(SUMMARY_COLUMNS),
+                           ", ".join("?" * len(SUMMARY_COLUMNS))),
+                          _summary_row(summary))
+        logger.debug("Stored %s in '%s'" % (stock.symbol, self.path))
+        return revision
+
+    def _save_fundamentals(self, stock, timestamp=None):
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+
+        c = self._conn
+        fundamentals = _fundamentals(stock)
+        row = c.execute("SELECT data FROM fundamentals WHERE symbol = ?"
+                        " AND timestamp <= ? ORDER BY timestamp DESC LIMIT 1",
+                        (stock.symbol, _ts(timestamp))).fetchone()
+        if row is None or row[0] != fundamentals:
+            c.execute("INSERT OR REPLACE INTO fundamentals (symbol, timestamp,"
+                      " data) VALUES (?, ?, ?)",
+                      (stock.symbol, _ts(timestamp), fundamentals))
+
+    def save_fundamentals(self, stock, timestamp):
+        # stores a snapshot of the fundamental data that was known at
+        # timestamp, e.g. to import historical data for backtests
+        with self._lock, self._conn:
+            self._save_fundamentals(stock, timestamp)
+
+    def load(self, symbol):
+        # returns the stock, its reference index and its evaluation results
+        rows = self._query("SELECT reference_index, data FROM stock"
+                           " WHERE symbol = ?", (symbol,))
+        if not rows:
+            raise NotFoundError("Stock %s isn't stored" % symbol)
+        reference_index, data = rows[0]
+
+        results = [pickle.loads(r[0]) for r in
+                   self._query("SELECT data FROM evaluation WHERE symbol = ?"
+                               " ORDER BY timestamp", (symbol,))]
+        return (pickle.loads(data), reference_index, results)
+
+    def fundamentals_history(self, symbol):
+        # returns a list of (timestamp, fundamental data dict) tuples
+        return [(_parse_ts(ts), json.loads(data)) for ts, data in
+                self._query("SELECT timestamp, data FROM fundamentals"
+                            " WHERE symbol = ? ORDER BY timestamp",
+                            (symbol,))]
+
+    def history(self, symbol):
+        # returns a list of (evaluation timestamp, score) tuples
+        return [(_parse_ts(ts), score) for ts, score in
+                self._query("SELECT timestamp, score FROM evaluation"
+                            " WHERE symbol = ? ORDER BY timestamp",
+                            (symbol,))]
+
+    def latest_scores(self):
+        # returns a list of (symbol, name, evaluation timestamp, score)
+        # tuples of the last evaluation of each stock
+        return [(sym, name, _parse_ts(ts), score)
+                for sym, name, ts, score in
+                self._query("SELECT s.symbol, s.name, e.timestamp, e.score"
+                            " FROM stock s JOIN evaluation e"
+                            " ON e.symbol = s.symbol AND e.timestamp ="
+                            " (SELECT MAX(timestamp) FROM evaluation"
+                            "  WHERE symbol = s.symbol)"
+                            " ORDER BY s.symbol")]
+
+    def version(self):
+        # returns a value that changes whenever the store is modified by
+        # this or another connection
+        with self._lock:
+            data_version = self._conn.execute(
+                "PRAGMA data_version").fetchone()[0]
+            return (data_version, self._conn.total_changes)
+
+    def evaluations(self, symbol, limit=None, offset=0):
+        # returns a list of (timestamp, score, criteria dict) tuples of the
+        # evaluations of the stock, newest first
+        return [(_parse_ts(ts), score, json.loads(criteria or "{}"))
+                for ts, score, criteria in
+                self._query("SELECT timestamp, score, criteria FROM"
+                            " evaluation WHERE symbol = ?"
+                            " ORDER BY timestamp DESC LIMIT ? OFFSET ?",
+                            (symbol, -1 if limit is None else limit,
+                             offset))]
+
+    def count_evaluations(self, symbol):
+        return self._query("SELECT COUNT(*) FROM evaluation WHERE"
+                           " symbol = ?", (symbol,))[0][0]
+
+    def summary(self, symbol):
+        rows = self._query("SELECT %s FROM summary WHERE symbol = ?" %
+                           ", ".join(SUMMARY_COLUMNS), (symbol,))
+        if not rows:
+            raise NotFoundError("No summary of %s stored" % symbol)
+        return _summary(rows[0])
+
+    def count_summaries(self, cap_type=None, recommendation=None):
+        where, params = _summary_filter(cap_type=cap_type,
+                                        recommendation=recommendation)
+        return self._query("SELECT COUNT(*) FROM summary" + where,
+                           params)[0][0]
+
+    def summaries(self, outdated_before=None, cap_type=None,
+                  recommendation=None, limit=None, offset=0):
+        # yields the summaries of all stocks, ordered by their score.
+        # If outdated_before is passed, only summaries whose latest
+        # quarterly figures release date is <= outdated_before are returned.
+        # cap_type (Cap value) and recommendation (Recommendation name)
+        # filter the summaries by their values.
+        where, params = _summary_filter(outdated_before, cap_type,
+                                        recommendation)
+        sql = "SELECT %s FROM summary" % ", ".join(SUMMARY_COLUMNS) + where
+        sql += " ORDER BY score IS NULL, score DESC, symbol LIMIT ? OFFSET ?"
+        params += (-1 if limit is None else limit, offset)
+
+        with self._lock:
+            cur = self._conn.execute(sql, params)
+        while True:
+            with self._lock:
+                rows = cur.fetchmany(100)
+            if not rows:
+                break
+            for r in rows:
+                yield _summary(r)
+
+    def symbols_without_summary(self):
+        return [r[0] for r in
+                self._query("SELECT symbol FROM stock WHERE symbol NOT IN"
+                            " (SELECT symbol FROM summary) ORDER BY symbol")]
+
+    def resolution(self, isin, kind):
+        # returns a (value, timestamp) tuple of a value that was resolved
+        # from the ISIN, e.g. the onvista URL, None if it isn't stored
+        rows = self._query("SELECT value, timestamp FROM resolution"
+                           " WHERE isin = ? AND kind = ?", (isin, kind))
+        if not rows:
+            return None
+        return (rows[0][0], _parse_ts(rows[0][1]))
+
+    def save_resolution(self, isin, kind, value, timestamp=None):
+        if timestamp is None:
+            timestamp = datetime.datetime.now()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO resolution (isin, kind,"
+                               " value, timestamp) VALUES (?, ?, ?, ?)",
+                               (isin, kind, value, _ts(timestamp)))
+
+    def delete_resolution(self, isin, kind=None):
+        sql = "DELETE FROM resolution WHERE isin = ?"
+        params = (isin,)
+        if kind is not None:
+            sql += " AND kind = ?"
+            params += (kind,)
+        with self._lock, self._conn:
+            self._conn.execute(sql, params)
+
+    def api_calls(self, api, day):
+        # returns the number of requests that were made to the API on day
+        rows = self._query("SELECT calls FROM api_calls WHERE api = ? AND"
+                           " day = ?", (api, day.isoformat()))
+        if not rows:
+            return 0
+        return rows[0][0]
+
+    def add_api_call(self, api, day):
+        # counts a request to the API, the counts of previous days are
+        # removed
+        with self._lock, self._conn:
+            c = self._conn
+            c.execute("DELETE FROM api_calls WHERE api = ? AND day < ?",
+                      (api, day.isoformat()))
+            c.execute("INSERT OR IGNORE INTO api_calls (api, day, calls)"
+                      " VALUES (?, ?, 0)", (api, day.isoformat()))
+            c.execute("UPDATE api_calls SET calls = calls + 1 WHERE api = ?"
+                      " AND day = ?", (api, day.isoformat()))
+
+    def migrate_pickles(self, directory):
+        # imports the Levermann and Stock pickle files that were used before
+        # the store existed, returns the list of imported symbols
+        imported = []
+        for f in sorted(os.listdir(directory)):
+            if not f.endswith(".pickle"):
+                continue
+            path = os.path.join(directory, f)
+            with open(path, "rb") as fd:
+                o = pickle.load(fd)
+
+            if "levermann" in f:
+                self.save(o.stock, o.reference_index, o.evaluation_results)
+                imported.append(o.stock.symbol)
+            elif not self.contains(o.symbol):
+                self.save(o)
+                imported.append(o.symbol)
+            logger.info("Imported '%s'" % path)
+
+        return imported
+
+
+def default_store():
+    global _default
+
+    with _default_lock:
+        if _default is None:
+            os.makedirs(os.path.dirname(config.STORE_PATH), exist_ok=True)
+            _default = Store(config.STORE_PATH)
+    return _default
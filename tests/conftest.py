@@ -0,0 +1,33 @@
+from stockanalyser.stock import Stock, Cap
+from stockanalyser.analysis.levermann import (Levermann, LevermannResult,
+                                              CriteriaRating)
+from stockanalyser.mymoney import Money
+import datetime
+import pytest
+
+
+def _levermann_obj(symbol, scores):
+    s = Stock(symbol, isin="DE%s" % symbol)
+    s.name = symbol
+    s.cap_type = Cap.LARGE
+    s.set_quote(Money(10, "EUR"))
+    s.set_eps(2017, Money(1, "EUR"))
+    s.set_roe(2016, 12.5)
+    s.quarterly_figure_dates = [datetime.date(2017, 1, 17)]
+    s.analyst_ratings = (1, 2, 3)
+    l = Levermann(s)
+
+    for i, score in enumerate(scores):
+        r = LevermannResult()
+        r.timestamp = datetime.datetime(2017, 1, 1 + i, 12)
+        r._score = score
+        r.roe = CriteriaRating(12.5, 0)
+        l.evaluation_results.append(r)
+    return l
+
+
+@pytest.fixture
+def levermann_obj():
+    # returns a function that creates a Levermann object of a stock with
+    # evaluation results of the passed scores
+    return _levermann_obj
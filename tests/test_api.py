@@ -0,0 +1,90 @@
+from stockanalyser import api
+from stockanalyser.stock import Cap
+from stockanalyser.store import Store
+import json
+import pytest
+import urllib.error
+import urllib.request
+
+
+@pytest.fixture
+def server(tmpdir, levermann_obj):
+    st = Store(str(tmpdir.join("store.sqlite")))
+    levermann_obj("VOW.DE", [3, 5]).save(st)
+    levermann_obj("BAS.DE", [1]).save(st)
+    l = levermann_obj("SIE.DE", [8, 2])
+    l.stock.cap_type = Cap.MID
+    l.save(st)
+
+    server = api.start("127.0.0.1", 0, st)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path, headers={}):
+    url = "http://127.0.0.1:%s%s" % (server.server_address[1], path)
+    try:
+        resp = urllib.request.urlopen(urllib.request.Request(url,
+                                                             headers=headers))
+    except urllib.error.HTTPError as e:
+        resp = e
+    body = resp.read()
+    return (resp.status, resp.headers, json.loads(body.decode("utf-8")) if body else None)
+
+
+def test_stocks(server):
+    status, _, doc = get(server, "/stocks")
+    assert status == 200
+    assert doc["total"] == 3
+    assert [s["symbol"] for s in doc["stocks"]] == ["VOW.DE", "SIE.DE",
+                                                   "BAS.DE"]
+    assert doc["stocks"][0]["cap_type"] == "LARGE"
+    assert doc["stocks"][0]["recommendation"] == "BUY"
+
+    _, _, doc = get(server, "/stocks?limit=1&offset=1")
+    assert doc["total"] == 3
+    assert [s["symbol"] for s in doc["stocks"]] == ["SIE.DE"]
+
+    _, _, doc = get(server, "/stocks?cap_type=large&recommendation=SELL")
+    assert doc["total"] == 1
+    assert [s["symbol"] for s in doc["stocks"]] == ["BAS.DE"]
+
+    assert get(server, "/stocks?cap_type=huge")[0] == 400
+    assert get(server, "/stocks?limit=-1")[0] == 400
+    assert get(server, "/unknown")[0] == 404
+
+
+def test_stock(server):
+    status, _, doc = get(server, "/stocks/VOW.DE")
+    assert status == 200
+    assert doc["score"] == 5
+    assert doc["prev_score"] == 3
+    assert doc["criteria"] == {"roe": {"value": 12.5, "points": 0}}
+    assert get(server, "/stocks/XYZ.DE")[0] == 404
+
+
+def test_history(server):
+    _, _, doc = get(server, "/stocks/SIE.DE/history")
+    assert doc["total"] == 2
+    assert [(e["score"], e["recommendation"]) for e in
+            doc["evaluations"]] == [(2, "SELL"), (8, "BUY")]
+    assert doc["evaluations"][0]["timestamp"] == "2017-01-02T12:00:00"
+
+    _, _, doc = get(server, "/stocks/SIE.DE/history?limit=1")
+    assert [(e["score"], e["recommendation"]) for e in
+            doc["evaluations"]] == [(2, "SELL")]
+
+
+def test_etag(server, levermann_obj):
+    _, headers, _ = get(server, "/stocks")
+    etag = headers["ETag"]
+    status, _, doc = get(server, "/stocks", {"If-None-Match": etag})
+    assert status == 304
+    assert doc is None
+
+    levermann_obj("ALV.DE", [4]).save(server.st)
+    status, headers, doc = get(server, "/stocks", {"If-None-Match": etag})
+    assert status == 200
+    assert headers["ETag"] != etag
+    assert doc["total"] == 4
@@ -0,0 +1,127 @@
+from stockanalyser.stock import Stock, Cap, EPS
+from stockanalyser import metrics
+from stockanalyser.store import Store
+from stockanalyser.analysis import backtest
+from stockanalyser.analysis.levermann import Levermann, Recommendation
+from stockanalyser.data_source import alphavantage
+from stockanalyser.data_source.price_history import from_time_series
+from stockanalyser.mymoney import Money
+from decimal import Decimal
+import datetime
+import random
+
+START = datetime.date(2014, 1, 1)
+END = datetime.date(2016, 12, 31)
+
+
+def series(symbol, holidays=()):
+    rnd = random.Random(symbol)
+    d = START - datetime.timedelta(days=500)
+    quote = 100.0
+    s = {}
+    while d <= END:
+        if d.weekday() < 5 and d not in holidays:
+            quote *= rnd.uniform(0.97, 1.03)
+            s[d.isoformat()] = {"4. close": str(quote)}
+        d += datetime.timedelta(days=1)
+    return from_time_series(symbol, s)
+
+
+def make_stock(symbol, rnd):
+    s = Stock(symbol)
+    s.name = symbol
+    s.market_cap = rnd.choice([1e9, 3e9, 10e9])
+    s.set_quote(Money(10, "EUR"))
+    s.analyst_ratings = (rnd.randint(0, 5), rnd.randint(0, 5), 1)
+    s.quarterly_figure_dates = [datetime.date(y, m, 15) for y in
+                                range(2012, 2017) for m in (2, 5, 8, 11)]
+    for year in range(2010, 2019):
+        s.roe[year] = rnd.uniform(0, 30)
+        s.ebit_margin[year] = rnd.uniform(0, 20)
+        s.equity_ratio[year] = rnd.uniform(0, 40)
+        s.eps[year] = [EPS(Money(Decimal("%.2f" % rnd.uniform(0.5, 5)),
+                                 "EUR"), datetime.date(year - 2, 6, 1)),
+                       EPS(Money(Decimal("%.2f" % rnd.uniform(0.5, 5)),
+                                 "EUR"), datetime.date(year - 1, 6, 1))]
+    s.cap_type = Cap.LARGE
+    return s
+
+
+def test_backtest(tmpdir, monkeypatch):
+    histories = {sym: series(sym) for sym in
+                 ("^GDAXI", "^MDAXI", "^SDAXI", "A.DE", "B.DE", "C.DE")}
+    monkeypatch.setattr(alphavantage, "price_history",
+                        lambda sym, d: histories[sym])
+    monkeypatch.setattr(alphavantage, "stock_quote", lambda sym, d:
+                        histories[sym].close_before(d, 7))
+
+    st = Store(str(tmpdir.join("store.sqlite")))
+    rnd = random.Random(1)
+    objs = []
+    for sym in ("A.DE", "B.DE", "C.DE"):
+        s = make_stock(sym, rnd)
+        st.save_fundamentals(s, datetime.datetime(2013, 12, 1))
+        objs.append(Levermann(s))
+
+    dates = histories["^GDAXI"].month_ends(START, END)
+    res = backtest.run(objs, dates, st)
+
+    assert res.scores.shape == (36, 3)
+    n = 0
+    for j, l in enumerate(objs):
+        fundamentals = backtest.FundamentalsHistory(
+            st.fundamentals_history(l.stock.symbol))
+        for i, d in enumerate(dates):
+            if res.signals[i, j] == 0:
+                continue
+            s = backtest.stock_as_of(l.stock, fundamentals.as_of(d), d,
+                                     histories[l.stock.symbol].close_before(
+                                         d, 7))
+            per_stock = Levermann(s)
+            per_stock.evaluate(d)
+            assert res.scores[i, j] == per_stock.evaluation_results[-1].score
+            n += 1
+    assert n > 50
+
+    assert [s for _, s in res.score_series("A.DE")] == [
+        int(s) for s in res.scores[:, 0] if s == s]
+    assert all(isinstance(s, Recommendation) for _, s in
+               res.signal_series("A.DE"))
+    assert -1 < res.total_return() < 10
+    assert -1 < res.total_benchmark_return() < 10
+
+
+def test_backtest_quote_gaps(tmpdir, monkeypatch):
+    dates = series("^GDAXI").month_ends(START, datetime.date(2014, 6, 30))
+    # A.DE wasn't traded on a backtest date, C.DE has no quotes since March
+    delisted = [datetime.date(2014, 4, 1) + datetime.timedelta(days=i)
+                for i in range(1000)]
+    histories = {"A.DE": series("A.DE", holidays=[dates[1]]),
+                 "C.DE": series("C.DE", holidays=delisted)}
+    for sym in ("^GDAXI", "^MDAXI", "^SDAXI"):
+        histories[sym] = series(sym)
+    monkeypatch.setattr(alphavantage, "price_history",
+                        lambda sym, d: histories[sym])
+    monkeypatch.setattr(alphavantage, "stock_quote", lambda sym, d:
+                        histories[sym].close_before(d, 7))
+    counters = {}
+    monkeypatch.setattr(metrics, "inc", lambda name, n=1: counters.update(
+        {name: counters.get(name, 0) + n}))
+
+    st = Store(str(tmpdir.join("store.sqlite")))
+    rnd = random.Random(1)
+    objs = []
+    for sym in ("A.DE", "C.DE"):
+        s = make_stock(sym, rnd)
+        s.quarterly_figure_dates = [datetime.date(2013, 11, 14),
+                                    datetime.date(2014, 2, 14),
+                                    datetime.date(2014, 5, 15)]
+        st.save_fundamentals(s, datetime.datetime(2013, 12, 1))
+        objs.append(Levermann(s))
+
+    res = backtest.run(objs, dates, st)
+    # the last close before the holiday is used
+    assert res.closes[1, 0] == histories["A.DE"].close(
+        dates[1] - datetime.timedelta(days=1))
+    assert all(res.signals[:, 0] != 0)
+    assert counters["backtest_stocks_skipped"] == 3
@@ -0,0 +1,139 @@
+from stockanalyser.stock import Stock, Cap, EPS
+from stockanalyser.analysis import batch
+from stockanalyser.analysis.levermann import Levermann
+from stockanalyser.data_source import alphavantage
+from stockanalyser.data_source.price_history import PriceHistory, DTYPE
+from stockanalyser.mymoney import Money
+from decimal import Decimal
+import datetime
+import numpy as np
+import pytest
+import random
+
+
+def fake_stock_quote(symbol, date):
+    return random.Random("%s-%s" % (symbol, date)).uniform(50, 150)
+
+
+def fake_price_history(symbol):
+    start = datetime.date(2016, 1, 1)
+    days = [start + datetime.timedelta(days=i) for i in
+            range((datetime.date.today() - start).days + 1)]
+    data = np.array([(d.toordinal(), fake_stock_quote(symbol, d))
+                     for d in days if d.weekday() < 5], dtype=DTYPE)
+    return PriceHistory(symbol, data)
+
+
+THIS_YEAR = datetime.date.today().year
+LAST_YEAR = THIS_YEAR - 1
+
+
+def random_levermann(rnd, i):
+    s = Stock("S%s.DE" % i)
+    s.cap_type = rnd.choice(list(Cap))
+    s.set_quote(Money(rnd.uniform(1, 300), "EUR"))
+
+    s.roe[LAST_YEAR] = rnd.choice([10, 20, rnd.uniform(-10, 40)])
+    s.equity_ratio[LAST_YEAR - 1] = rnd.choice([15, 25, rnd.uniform(0, 60)])
+    s.ebit_margin[LAST_YEAR] = rnd.choice([6, 12, rnd.uniform(-5, 30)])
+
+    for year in range(THIS_YEAR - 3, THIS_YEAR + 2):
+        for _ in range(rnd.randint(1, 2)):
+            v = Decimal("%.2f" % rnd.choice([2, 2.1, rnd.uniform(-2, 10)]))
+            if v == 0:
+                v = Decimal("0.01")
+            s.eps.setdefault(year, []).append(
+                EPS(Money(v, "EUR"), datetime.date.today()))
+
+    if rnd.random() < 0.8:
+        s.analyst_ratings = (rnd.randint(0, 5), rnd.randint(0, 5),
+                             rnd.randint(1, 5))
+    else:
+        s.analyst_ratings = (None, None, None)
+    s.quarterly_figure_dates = [datetime.date(2017, 1, 17)]
+
+    return Levermann(s)
+
+
+@pytest.fixture
+def fake_quotes(monkeypatch):
+    histories = {}
+
+    def price_history(symbol, date):
+        if symbol not in histories:
+            histories[symbol] = fake_price_history(symbol)
+        return histories[symbol]
+
+    monkeypatch.setattr(alphavantage, "stock_quote", fake_stock_quote)
+    monkeypatch.setattr(alphavantage, "price_history", price_history)
+
+
+def test_batch_matches_levermann(fake_quotes):
+    rnd = random.Random(1)
+
+    objs = [random_levermann(rnd, i) for i in range(300)]
+    for l in objs:
+        l.evaluate()
+
+    res = batch.evaluate(batch.inputs_from_levermann(objs))
+    assert len(res) == len(objs)
+    for i, l in enumerate(objs):
+        r = l.evaluation_results[-1]
+        for c in batch.CRITERIA:
+            assert res.points[c][i] == getattr(r, c).points, (c, i)
+        assert res.score[i] == r.score
+        # both use the same float arithmetic for EPS ratios
+        for c in ("earning_growth", "price_earnings_ratio",
+                  "five_years_price_earnings_ratio"):
+            assert res.values[c][i] == getattr(r, c).value, (c, i)
+
+
+def test_incremental_evaluation(fake_quotes):
+    rnd = random.Random(2)
+    l = random_levermann(rnd, 0)
+
+    def evaluate(incremental=True):
+        # results with the same score are only stored after a week
+        if l.evaluation_results:
+            l.evaluation_results[-1].timestamp -= datetime.timedelta(days=8)
+        assert l.evaluate(incremental=incremental)
+
+    evaluate()
+    assert len(l.recomputed) == 13
+
+    # nothing changed, all ratings are reused
+    evaluate()
+    assert l.recomputed == []
+
+    # a new quote only affects the quote dependent criteria
+    l.stock.set_quote(Money(l.stock.quote.amount * 2, "EUR"))
+    evaluate()
+    assert set(l.recomputed) <= {"price_earnings_ratio",
+                                 "five_years_price_earnings_ratio",
+                                 "quote_chg_6month", "quote_chg_1year",
+                                 "momentum"}
+    assert "price_earnings_ratio" in l.recomputed
+
+    l.stock.roe[LAST_YEAR] += 1
+    evaluate()
+    assert l.recomputed == ["roe"]
+
+    # the reused ratings are the same as recomputed ones
+    evaluate(incremental=False)
+    inc, full = l.evaluation_results[-2:]
+    for c in batch.CRITERIA:
+        assert getattr(inc, c).points == getattr(full, c).points
+        assert inc.fingerprints[c] == full.fingerprints[c]
+
+
+def test_missing_values():
+    inputs = batch.BatchInputs(2)
+    inputs.symbols = ["A.DE", "B.DE"]
+    inputs.cap_type[:] = Cap.LARGE.value
+    # the second stock has a quote, the EPS based ratios are still missing
+    inputs.quote[1] = 100.0
+
+    res = batch.evaluate(inputs)
+    for c in batch.CRITERIA:
+        assert list(res.points[c]) == [0, 0], c
+    assert list(res.score) == [0, 0]
@@ -0,0 +1,23 @@
+import json
+import os
+import subprocess
+import sys
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..",
+                         "benchmarks", "run.py")
+
+
+def test_benchmarks_run_offline(tmpdir):
+    output = str(tmpdir.join("results.json"))
+    subprocess.run([sys.executable, BENCHMARK, "--repeat", "1", "--sizes",
+                    "10", "--output", output], check=True,
+                   stdout=subprocess.DEVNULL)
+
+    with open(output) as f:
+        results = json.load(f)["benchmarks"]
+    for name in ("onvista.eps", "onvista.analyst_ratings",
+                 "finanzen_net.quarterly_figures_release_dates",
+                 "yahoo.get_stock_info", "alphavantage.compact_time_series",
+                 "alphavantage.from_time_series_full", "levermann.evaluate_10",
+                 "batch.evaluate_10", "store.save_10", "store.load_10"):
+        assert results[name]["min"] > 0
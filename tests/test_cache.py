@@ -0,0 +1,139 @@
+from stockanalyser.data_source import common
+from stockanalyser.data_source.cache import ResponseCache
+import json
+import time
+import pytest
+
+
+def test_put_get(tmpdir):
+    c = ResponseCache(str(tmpdir))
+    url = "http://www.onvista.de/aktien/Bayer-Aktie-DE000BAY0017"
+
+    assert c.get(url) is None
+
+    c.put(url, b"<html></html>", etag='"abc"')
+    e = c.get(url)
+    assert e.body() == b"<html></html>"
+    assert e.age() < 60
+    assert e.conditional_headers() == {"If-None-Match": '"abc"'}
+
+    assert c.get(url + "/other") is None
+
+
+def test_touch(tmpdir):
+    c = ResponseCache(str(tmpdir))
+    url = "http://www.finanzen.net/termine/Allianz"
+
+    c.put(url, b"x", last_modified="Wed, 21 Oct 2015 07:28:00 GMT")
+    e = c.get(url)
+    e.fetched -= 3600
+    c.touch(e)
+
+    e = c.get(url)
+    assert e.age() < 60
+    assert e.body() == b"x"
+    assert (e.conditional_headers()["If-Modified-Since"] ==
+            "Wed, 21 Oct 2015 07:28:00 GMT")
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.raw = self
+
+    def tell(self):
+        return len(self.content)
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession(object):
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def fake_session(tmpdir, monkeypatch):
+    s = FakeSession([])
+    monkeypatch.setattr(common, "_session", s)
+    monkeypatch.setattr(common, "_cache", ResponseCache(str(tmpdir)))
+    monkeypatch.setattr(common, "offline", False)
+    return s
+
+
+def test_cache_ttl():
+    assert common.cache_ttl("http://www.alphavantage.co/query?function="
+                            "TIME_SERIES_DAILY_ADJUSTED&symbol=VOW.DE") > 0
+    assert common.cache_ttl("http://example.com/") is None
+
+
+def test_fetch_ttl(fake_session):
+    url = "http://www.finanzen.net/termine/Allianz"
+    fake_session.responses = [FakeResponse(200, b"x", {"ETag": '"abc"'})]
+
+    assert common.fetch(url) == b"x"
+    assert common.cached(url)
+    assert common.fetch(url) == b"x"
+    assert fake_session.requests == [(url, None)]
+    assert common.cache_counters() == (1, 1, 0)
+
+
+def test_fetch_revalidate(fake_session):
+    url = "http://www.finanzen.net/termine/Allianz"
+    c = common.response_cache()
+    c.put(url, b"x", etag='"abc"')
+    # outdates the entry
+    meta_path = c._paths(url)[1]
+    with open(meta_path) as f:
+        meta = json.load(f)
+    meta["fetched"] -= 2 * 24 * 3600
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    assert not common.cached(url)
+
+    fake_session.responses = [FakeResponse(304)]
+    assert common.fetch(url) == b"x"
+    assert fake_session.requests == [(url, {"If-None-Match": '"abc"'})]
+    assert common.cache_counters() == (0, 0, 1)
+    assert common.cached(url)
+
+
+def test_fetch_offline(fake_session, monkeypatch):
+    monkeypatch.setattr(common, "offline", True)
+    url = "http://www.alphavantage.co/query?function=TIME_SERIES_DAILY"
+    with pytest.raises(common.OfflineError):
+        common.fetch(url)
+
+    common.response_cache().put(url, b"{}")
+    assert common.fetch(url) == b"{}"
+    assert fake_session.requests == []
+
+
+def test_delete(tmpdir):
+    c = ResponseCache(str(tmpdir))
+    url = "http://www.alphavantage.co/query"
+    c.put(url, b"x")
+    c.delete(url)
+    assert c.get(url) is None
+    c.delete(url)
+
+
+def test_session_keeps_host_pools(monkeypatch):
+    monkeypatch.setattr(common, "_session", None)
+    adapter = common.session().get_adapter("https://finance.yahoo.com")
+    hosts = ["finance.yahoo.com", "de.finance.yahoo.com",
+             "query1.finance.yahoo.com", "www.onvista.de", "www.finanzen.net",
+             "www.alphavantage.co"]
+    pools = [adapter.poolmanager.connection_from_host(h, 443, "https")
+             for h in hosts]
+    # no pool was evicted
+    assert [adapter.poolmanager.connection_from_host(h, 443, "https")
+            for h in hosts] == pools
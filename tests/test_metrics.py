@@ -0,0 +1,62 @@
+from stockanalyser import config, metrics
+from stockanalyser.data_source import common
+import json
+import os
+import time
+
+
+def test_percentile():
+    assert metrics.percentile([], 50) is None
+    assert metrics.percentile([3, 1, 2], 50) == 2
+    vals = list(range(1, 101))
+    assert metrics.percentile(vals, 50) == 50
+    assert metrics.percentile(vals, 95) == 95
+    assert metrics.percentile(vals, 100) == 100
+
+
+def test_run(tmpdir, monkeypatch):
+    monkeypatch.setattr(config, "METRICS_PATH", str(tmpdir.join("metrics")))
+    monkeypatch.setattr(config, "METRICS_LOG_PATH",
+                        str(tmpdir.join("metrics.log")))
+    monkeypatch.setattr(common, "stats", {})
+    monkeypatch.setattr(metrics, "_counters", {})
+
+    for i in range(20):
+        common._record("https://finance.yahoo.com/quote/VOW.DE", 1000,
+                       (i + 1) / 100)
+    metrics.inc("stocks_evaluated", 3)
+    metrics.inc("resolution_hits", 3)
+    metrics.inc("resolution_misses")
+
+    for _ in range(2):
+        with metrics.Run("update"):
+            pass
+
+    with open(str(tmpdir.join("metrics.log"))) as f:
+        lines = [json.loads(l) for l in f]
+    assert len(lines) == 2
+    m = lines[-1]
+    assert m["command"] == "update"
+    assert m["ok"]
+    assert abs(m["timestamp"] - time.time()) < 60
+    assert m["hosts"]["yahoo.com"] == {"requests": 20, "bytes": 20000,
+                                       "latency_p50": 0.1,
+                                       "latency_p95": 0.19}
+    assert m["resolution_cache"] == {"hits": 3, "misses": 1,
+                                     "hit_ratio": 0.75}
+    assert m["counters"] == {"stocks_evaluated": 3}
+    assert m["stocks_per_second"] > 0
+
+    with open(os.path.join(config.METRICS_PATH,
+                           "stockanalyser_update.prom")) as f:
+        prom = f.read()
+    assert "# TYPE stockanalyser_http_requests gauge\n" in prom
+    assert ('stockanalyser_http_requests{command="update",host="yahoo.com"}'
+            " 20.0\n") in prom
+    assert ('stockanalyser_http_latency_seconds{command="update",'
+            'host="yahoo.com",quantile="0.95"} 0.19\n') in prom
+    assert ('stockanalyser_resolution_cache_hit_ratio{command="update"}'
+            " 0.75\n") in prom
+    assert 'stockanalyser_last_run_success{command="update"} 1.0\n' in prom
+    assert ('stockanalyser_last_run_timestamp_seconds{command="update"} %r\n'
+            % m["timestamp"]) in prom
@@ -0,0 +1,96 @@
+from stockanalyser.data_source import common, onvista
+from stockanalyser.mymoney import Money
+import pytest
+
+URL = "http://www.onvista.de/aktien/Bayer-Aktie-DE000BAY0017"
+
+
+def table(header, rows):
+    ths = "".join("<th>%s</th>" % h for h in header)
+    trs = "".join("<tr>%s</tr>" % "".join("<td>%s</td>" % c for c in r)
+                  for r in rows)
+    return "<table><thead><tr>%s</tr></thead><tbody>%s</tbody></table>" % (
+        ths, trs)
+
+
+FUNDAMENTAL_PAGE = ("<html><head><meta charset=\"utf-8\"></head>"
+                    "<body><div id=\"ONVISTA\"><div><div><div>"
+                    "<article><article><div>%s%s%s</div></article></article>"
+                    "</div></div></div></div></body></html>" % (
+                        table(["Gewinn", "18/19e", "2018", "2017"],
+                              [["Gewinn pro Aktie in EUR", "7,10", "6,64",
+                                "-"],
+                               ["KGV", "13,2", "14,1", "12,0"]]),
+                        table(["Bilanz", "2018e", "2017", "2016"],
+                              [["Buchwert", "1", "2", "3"],
+                               ["Eigenkapitalquote", "", "38,5%", "40,1%",
+                                "41,0%"]]),
+                        table(["Rentabilität", "2018e", "2017", "2016"],
+                              [["Umsatzrendite", "1", "2", "3"],
+                               ["EBIT-Marge", "20,1", "19,5", "18,0"],
+                               ["Eigenkapitalrendite", "16,0", "17,2",
+                                "15,1"]])))
+
+OVERVIEW_PAGE = ("<html><body><div id=\"AggregatedAnalysesTabAction\"><div>"
+                 "<article><div><table><tbody>"
+                 "<tr><td>Kaufen</td><td>12</td></tr>"
+                 "<tr><td>Halten</td><td>5</td></tr>"
+                 "<tr><td>Verkaufen</td><td>2</td></tr>"
+                 "</tbody></table></div></article></div></div>"
+                 "</body></html>")
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    pages = {URL: OVERVIEW_PAGE.encode(),
+             onvista.OnvistaScraper._build_fundamental_url(None, URL):
+             FUNDAMENTAL_PAGE.encode()}
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return pages[url]
+    monkeypatch.setattr(common, "fetch", fetch)
+    return fetched
+
+
+@pytest.fixture
+def scraper(fetched):
+    return onvista.OnvistaScraper(URL)
+
+
+def test_metrics(scraper):
+    assert scraper.eps() == {2019: Money("7.10", "EUR"),
+                             2018: Money("6.64", "EUR"), 2017: None}
+    assert scraper.equity_ratio() == {2018: 38.5, 2017: 40.1, 2016: 41.0}
+    assert scraper.ebit_margin() == {2018: 20.1, 2017: 19.5, 2016: 18.0}
+    assert scraper.roe() == {2018: 16.0, 2017: 17.2, 2016: 15.1}
+
+
+def test_lazy_parsing(scraper, fetched):
+    assert fetched == []
+    assert scraper.analyst_ratings() == (12, 5, 2)
+    assert fetched == [URL]
+    assert scraper._fundamental_etree is None
+
+    scraper.roe()
+    tables = scraper._fundamentals
+    scraper.eps()
+    assert scraper._fundamentals is tables
+
+
+def test_missing_row(scraper):
+    with pytest.raises(onvista.ParsingError):
+        scraper._extract_from_table("gewinn", "dividende pro aktie")
+    with pytest.raises(onvista.ParsingError):
+        scraper._extract_from_table("cashflow", "cashflow pro aktie")
+
+
+def test_prefetch(fetched):
+    scrapers = [onvista.OnvistaScraper(URL), onvista.OnvistaScraper(URL)]
+    onvista.prefetch(scrapers)
+    for s in scrapers:
+        assert s.roe() == {2018: 16.0, 2017: 17.2, 2016: 15.1}
+        assert s.analyst_ratings() == (12, 5, 2)
+        s.prefetch()
+    assert len(fetched) == 4
@@ -0,0 +1,82 @@
+from stockanalyser.data_source.price_history import (PriceStore, merge,
+                                                     from_time_series)
+import datetime
+import pytest
+
+SERIES = {
+    "2017-01-16": {"1. open": "10.0", "4. close": "10.5"},
+    "2017-01-13": {"1. open": "9.0", "4. close": "9.5"},
+    "2017-01-17": {"1. open": "11.0", "4. close": "11.5"},
+}
+
+
+def test_from_time_series():
+    h = from_time_series("VOW.DE", SERIES)
+
+    assert len(h) == 3
+    assert h.first_date() == datetime.date(2017, 1, 13)
+    assert h.last_date() == datetime.date(2017, 1, 17)
+    assert h.close(datetime.date(2017, 1, 13)) == 9.5
+    assert h.close(datetime.date(2017, 1, 16)) == 10.5
+
+    with pytest.raises(KeyError):
+        h.close(datetime.date(2017, 1, 14))
+    with pytest.raises(KeyError):
+        h.close(datetime.date(2017, 1, 18))
+    with pytest.raises(KeyError):
+        h.close(datetime.date(2016, 1, 18))
+
+
+def test_store(tmpdir):
+    store = PriceStore(str(tmpdir))
+    assert store.load("^GDAXI") is None
+
+    store.save(from_time_series("^GDAXI", SERIES))
+    h = store.load("^GDAXI")
+    assert len(h) == 3
+    assert h.close(datetime.date(2017, 1, 17)) == 11.5
+
+
+def test_merge():
+    h = from_time_series("VOW.DE", SERIES)
+    new = from_time_series("VOW.DE", {
+        "2017-01-17": {"4. close": "12.0"},
+        "2017-01-18": {"4. close": "13.0"},
+    })
+
+    m = merge(h, new)
+    assert len(m) == 4
+    assert m.first_date() == datetime.date(2017, 1, 13)
+    assert m.last_date() == datetime.date(2017, 1, 18)
+    assert m.close(datetime.date(2017, 1, 16)) == 10.5
+    assert m.close(datetime.date(2017, 1, 17)) == 12.0
+
+
+def test_close_before():
+    h = from_time_series("VOW.DE", SERIES)
+
+    assert h.close_before(datetime.date(2017, 1, 13)) == 9.5
+    assert h.close_before(datetime.date(2017, 1, 15)) == 9.5
+    assert h.close_before(datetime.date(2017, 2, 1)) == 11.5
+    with pytest.raises(KeyError):
+        h.close_before(datetime.date(2017, 1, 12))
+
+
+def test_month_ends():
+    h = from_time_series("VOW.DE", dict(SERIES, **{
+        "2017-02-27": {"4. close": "1"},
+        "2017-02-28": {"4. close": "1"},
+        "2017-03-01": {"4. close": "1"},
+    }))
+
+    assert h.month_ends(datetime.date(2017, 1, 1),
+                        datetime.date(2017, 3, 31)) == [
+        datetime.date(2017, 1, 17), datetime.date(2017, 2, 28),
+        datetime.date(2017, 3, 1)]
+    assert h.month_ends(datetime.date(2017, 1, 14),
+                        datetime.date(2017, 2, 27)) == [
+        datetime.date(2017, 1, 17), datetime.date(2017, 2, 27)]
+
+    assert h.close_before(datetime.date(2017, 1, 15), max_age=2) == 9.5
+    with pytest.raises(KeyError):
+        h.close_before(datetime.date(2017, 2, 1), max_age=7)
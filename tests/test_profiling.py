@@ -0,0 +1,51 @@
+from stockanalyser import profiling
+import json
+import pytest
+
+
+@pytest.fixture
+def enabled():
+    profiling.enable()
+    yield
+    profiling.disable()
+
+
+def test_disabled():
+    profiling.disable()
+    with profiling.span("evaluate", "stage"):
+        pass
+    assert profiling.span("a") is profiling.span("b")
+    assert not [e for e in profiling.events() if e["name"] == "evaluate"]
+
+
+def test_spans(enabled, tmpdir):
+    with profiling.span("VOW.DE", "stock"):
+        with profiling.span("onvista", "source", symbol="VOW.DE"):
+            with profiling.span("finance.yahoo.com", "http",
+                                host="yahoo.com"):
+                pass
+        with profiling.span("roe", "criterion"):
+            pass
+
+    evs = profiling.events()
+    assert [e["name"] for e in evs] == ["finance.yahoo.com", "onvista", "roe",
+                                        "VOW.DE"]
+    outer = evs[-1]
+    for e in evs[:-1]:
+        assert e["ph"] == "X"
+        assert outer["ts"] <= e["ts"]
+        assert e["ts"] + e["dur"] <= outer["ts"] + outer["dur"]
+    assert evs[1]["args"] == {"symbol": "VOW.DE"}
+
+    path = str(tmpdir.join("trace.json"))
+    profiling.write_trace(path)
+    with open(path) as f:
+        trace = json.load(f)
+    assert [e["ph"] for e in trace["traceEvents"]] == ["M", "X", "X", "X",
+                                                       "X"]
+
+    s = profiling.summary()
+    assert "source: onvista" in s
+    assert "criterion: roe" in s
+    assert "yahoo.com" in s
+    assert "VOW.DE" not in s
@@ -0,0 +1,111 @@
+from stockanalyser import config, store
+from stockanalyser.data_source import alphavantage, common
+from stockanalyser.data_source.ratelimit import RateLimiter, TokenBucket
+import datetime
+import threading
+import time
+import pytest
+
+
+def test_token_bucket():
+    b = TokenBucket(10, 1)
+    for _ in range(10):
+        assert b.wait_time() == 0
+        b.take()
+    assert 0 < b.wait_time() <= 0.1
+    assert b.wait_time(3) > b.wait_time()
+
+
+def test_rate_limiter():
+    limiter = RateLimiter([TokenBucket(20, 1, capacity=2)])
+    order = []
+
+    def call(i):
+        limiter.acquire()
+        order.append(i)
+
+    start = time.monotonic()
+    threads = []
+    for i in range(6):
+        t = threading.Thread(target=call, args=(i,))
+        t.start()
+        threads.append(t)
+        # wait until the thread is queued to check the FIFO order
+        while limiter.calls + limiter.queue_depth < i + 1:
+            time.sleep(0.001)
+    for t in threads:
+        t.join()
+
+    # 2 calls are made immediately, the others at 20 calls/s
+    assert time.monotonic() - start >= 0.19
+    assert order == list(range(6))
+    assert limiter.calls == 6
+    assert limiter.queue_depth == 0
+
+
+def test_block():
+    limiter = RateLimiter([TokenBucket(100, 1)])
+    limiter.block(0.1)
+    assert limiter.eta() > 0
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.09
+
+
+def test_retry_rate_exceeded(monkeypatch):
+    responses = [{"Note": "Our standard API call frequency is 5 calls per"
+                          " minute and 500 calls per day."},
+                 {"Time Series (Daily)": {}}]
+    blocked = []
+    monkeypatch.setattr(common, "fetch_json", lambda url: responses.pop(0))
+    monkeypatch.setattr(alphavantage, "limiter",
+                        RateLimiter([TokenBucket(100, 1)]))
+    monkeypatch.setattr(alphavantage.limiter, "block", blocked.append)
+    invalidated = []
+    monkeypatch.setattr(common, "invalidate", invalidated.append)
+
+    assert alphavantage._fetch_json("url") == {"Time Series (Daily)": {}}
+    assert blocked == [60]
+    # the error response isn't served from the cache when retrying
+    assert invalidated == ["url"]
+
+    responses = [{"Information": "The daily request limit is reached."}]
+    with pytest.raises(alphavantage.RateExceededError):
+        alphavantage._fetch_json("url")
+
+
+def test_persist_daily_calls(tmpdir, monkeypatch):
+    st = store.Store(str(tmpdir.join("store.sqlite")))
+    monkeypatch.setattr(store, "default_store", lambda: st)
+    monkeypatch.setattr(alphavantage, "_today",
+                        lambda: datetime.date(2017, 1, 2))
+    monkeypatch.setattr(alphavantage, "limiter", None)
+
+    limiter = alphavantage.rate_limiter()
+    assert alphavantage.rate_limiter() is limiter
+    limiter.acquire()
+    limiter.acquire()
+    assert st.api_calls("alphavantage", datetime.date(2017, 1, 2)) == 2
+
+    # a following process continues with the remaining calls of the day
+    monkeypatch.setattr(alphavantage, "limiter", None)
+    daily = alphavantage.rate_limiter().buckets[1]
+    assert daily.tokens == config.ALPHAVANTAGE_CALLS_PER_DAY - 2
+
+    # the calls of previous days aren't counted
+    st.add_api_call("alphavantage", datetime.date(2017, 1, 3))
+    assert st.api_calls("alphavantage", datetime.date(2017, 1, 2)) == 0
+    assert st.api_calls("alphavantage", datetime.date(2017, 1, 3)) == 1
+
+
+def test_invalidate_error_response(monkeypatch):
+    monkeypatch.setattr(common, "offline", False)
+    monkeypatch.setattr(alphavantage, "_fetch_json", lambda url: {
+        "Error Message": "Invalid API call."})
+    invalidated = []
+    monkeypatch.setattr(common, "invalidate", invalidated.append)
+
+    with pytest.raises(alphavantage.EmptyStockDataResponse):
+        alphavantage._fetch_time_series("VOW.DE", "compact")
+    assert len(invalidated) == 1
+    assert "symbol=VOW.DE" in invalidated[0]
@@ -0,0 +1,72 @@
+from stockanalyser.dateutils import (prev_weekday, last_weekday_of_month,
+                                     prev_month)
+from stockanalyser.exceptions import InvalidValueError
+from stockanalyser.data_source import alphavantage, reference_index
+from stockanalyser.data_source.price_history import PriceHistory, DTYPE
+import datetime
+import numpy as np
+import pytest
+import random
+
+
+def history(days, skip=()):
+    rnd = random.Random(1)
+    start = datetime.date(2017, 1, 1)
+    data = []
+    for i in range(days):
+        d = start + datetime.timedelta(days=i)
+        if d.weekday() < 5 and d not in skip:
+            data.append((d.toordinal(), rnd.uniform(9000, 13000)))
+    return PriceHistory("^GDAXI", np.array(data, dtype=DTYPE))
+
+
+def test_changes():
+    holiday = datetime.date(2017, 4, 14)
+    h = history(400, skip=(holiday,))
+    idx = reference_index.ReferenceIndex(h)
+
+    for d in (datetime.date(2017, 1, 17), datetime.date(2017, 3, 6),
+              datetime.date(2018, 1, 31)):
+        prev = prev_weekday(d)
+        assert idx.daily_change(d) == ((h.close(d) / h.close(prev)) - 1) * 100
+
+        end = last_weekday_of_month(d)
+        prev_end = last_weekday_of_month(prev_month(d))
+        if d.month != 1 or d.year != 2017:
+            assert idx.monthly_change(d) == \
+                ((h.close(end) / h.close(prev_end)) - 1) * 100
+
+    # no quote for the previous weekday or month end
+    with pytest.raises(KeyError):
+        idx.daily_change(datetime.date(2017, 4, 17))
+    with pytest.raises(KeyError):
+        idx.daily_change(holiday)
+    with pytest.raises(KeyError):
+        idx.monthly_change(datetime.date(2017, 1, 17))
+    with pytest.raises(KeyError):
+        idx.monthly_change(datetime.date(2019, 1, 17))
+
+
+def test_invalid_quote():
+    h = history(100)
+    h.closes[h.dates == datetime.date(2017, 1, 31).toordinal()] = 0
+    idx = reference_index.ReferenceIndex(h)
+
+    with pytest.raises(InvalidValueError):
+        idx.monthly_change(datetime.date(2017, 2, 10))
+    with pytest.raises(InvalidValueError):
+        idx.daily_change(datetime.date(2017, 2, 1))
+
+
+def test_get_shares_index(monkeypatch):
+    histories = [history(100)]
+    monkeypatch.setattr(alphavantage, "price_history",
+                        lambda sym, d: histories[-1])
+
+    d = datetime.date(2017, 2, 1)
+    idx = reference_index.get("^GDAXI", d)
+    assert reference_index.get("^GDAXI", d) is idx
+
+    # the changes are computed again for a synced history
+    histories.append(history(200))
+    assert reference_index.get("^GDAXI", d) is not idx
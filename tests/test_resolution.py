@@ -0,0 +1,54 @@
+from stockanalyser import config
+from stockanalyser.store import Store
+from stockanalyser.data_source import resolution
+import datetime
+import pytest
+
+
+@pytest.fixture
+def st(tmpdir):
+    return Store(str(tmpdir.join("store.sqlite")))
+
+
+def test_resolve(st):
+    lookups = []
+
+    def lookup():
+        lookups.append(1)
+        return "http://www.onvista.de/aktien/Bayer-Aktie-DE000BAY0017"
+
+    v = resolution.resolve("DE000BAY0017", "onvista_url", lookup, st)
+    assert v == resolution.resolve("DE000BAY0017", "onvista_url", lookup, st)
+    assert len(lookups) == 1
+
+    # expired values are looked up again
+    ttl = config.RESOLUTION_TTL["onvista_url"]
+    st.save_resolution("DE000BAY0017", "onvista_url", v,
+                       datetime.datetime.now() -
+                       datetime.timedelta(seconds=ttl + 1))
+    resolution.resolve("DE000BAY0017", "onvista_url", lookup, st)
+    assert len(lookups) == 2
+
+    resolution.invalidate("DE000BAY0017", st=st)
+    assert st.resolution("DE000BAY0017", "onvista_url") is None
+
+
+def test_call_resolved_invalidates(st):
+    st.save_resolution("DE000BAY0017", "termine_url", "old")
+    used = []
+
+    def func(url):
+        used.append(url)
+        if url == "old":
+            raise IndexError("Termine link not found")
+        return url.upper()
+
+    assert resolution.call_resolved("DE000BAY0017", "termine_url",
+                                    lambda: "new", func, st) == "NEW"
+    assert used == ["old", "new"]
+    assert st.resolution("DE000BAY0017", "termine_url")[0] == "new"
+
+    # failures with a freshly looked up value are raised
+    with pytest.raises(IndexError):
+        resolution.call_resolved("DE0007664005", "termine_url",
+                                 lambda: "old", func, st)
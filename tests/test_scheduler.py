@@ -0,0 +1,98 @@
+from stockanalyser.store import Store
+from stockanalyser.scheduler import Scheduler
+from stockanalyser.data_source import yahoo
+import datetime
+
+
+def test_next_refresh(levermann_obj):
+    l = levermann_obj("VOW.DE", [3])
+    l.stock.quarterly_figure_dates = [datetime.date(2016, 10, 20),
+                                      datetime.date(2017, 1, 17)]
+    assert l.next_refresh() == datetime.datetime(2017, 1, 4, 12)
+    # day after the release of quarterly figures
+    assert (l.next_refresh(datetime.datetime(2017, 1, 16)) ==
+            datetime.datetime(2017, 1, 18))
+    assert (l.next_refresh(datetime.datetime(2017, 1, 17, 20)) ==
+            datetime.datetime(2017, 1, 18))
+    # year rollover
+    assert (l.next_refresh(datetime.datetime(2017, 12, 30)) ==
+            datetime.datetime(2018, 1, 1))
+
+    l.evaluation_results = []
+    assert l.next_refresh() == datetime.datetime.min
+    assert l.outdated()
+
+
+def test_run_once(tmpdir, monkeypatch, levermann_obj):
+    st = Store(str(tmpdir.join("store.sqlite")))
+    levermann_obj("VOW.DE", [3]).save(st)
+    levermann_obj("BAS.DE", [1, 2, 4]).save(st)
+
+    refreshed = []
+
+    def refresh(self, l):
+        refreshed.append(l.stock.symbol)
+        return l.stock.symbol != "BAS.DE"
+
+    monkeypatch.setattr(Scheduler, "refresh", refresh)
+    monkeypatch.setattr(yahoo, "prefetch_stock_infos", lambda symbols: {})
+
+    sched = Scheduler(st)
+    assert sched.run_once(datetime.datetime(2017, 1, 2)) == []
+    assert sched.next_due() == datetime.datetime(2017, 1, 4, 12)
+    assert sched.run_once(datetime.datetime(2017, 1, 5)) == ["VOW.DE"]
+    assert sched.next_due() == datetime.datetime(2017, 1, 6, 12)
+
+    now = datetime.datetime(2017, 1, 10)
+    assert sched.run_once(now) == ["BAS.DE", "VOW.DE"]
+    # failed refreshes are retried
+    assert sched.next_due() == datetime.datetime(2017, 1, 10, 1)
+    assert sched.run_once(now) == []
+
+    # added stocks are refreshed immediately
+    l = levermann_obj("SIE.DE", [])
+    l.save(st)
+    assert sched.run_once(now) == ["SIE.DE"]
+    assert sched.run_once(datetime.datetime(2017, 1, 10, 1)) == ["BAS.DE"]
+    assert refreshed == ["VOW.DE", "BAS.DE", "VOW.DE", "SIE.DE", "BAS.DE"]
+
+
+def test_sync_reloads_changed_stocks(tmpdir, monkeypatch,
+                                     levermann_obj):
+    st = Store(str(tmpdir.join("store.sqlite")))
+    levermann_obj("VOW.DE", [3]).save(st)
+    levermann_obj("BAS.DE", [1, 2, 4]).save(st)
+
+    sched = Scheduler(st)
+    sched.sync()
+    vow = sched.levermann_objs["VOW.DE"]
+    bas = sched.levermann_objs["BAS.DE"]
+
+    # changed by another process, e.g. 'analyser set'
+    l = levermann_obj("VOW.DE", [3])
+    l.stock.name = "Volkswagen AG"
+    l.save(st)
+    sched.sync()
+    assert sched.levermann_objs["VOW.DE"] is not vow
+    assert sched.levermann_objs["VOW.DE"].stock.name == "Volkswagen AG"
+    assert sched.levermann_objs["BAS.DE"] is bas
+
+    # the outdated queue entry of the reloaded stock is skipped
+    assert (sched._pop_due(datetime.datetime(2017, 1, 5)) ==
+            [sched.levermann_objs["VOW.DE"]])
+    assert sched.next_due() == datetime.datetime(2017, 1, 6, 12)
+
+    # changes after the sync aren't overwritten by the refresh
+    l.stock.name = "VW"
+    l.save(st)
+    def evaluate(self, incremental):
+        self.recomputed = []
+        return False
+
+    monkeypatch.setattr(l.stock.__class__, "update_stock_info",
+                        lambda self: None)
+    monkeypatch.setattr(l.__class__, "evaluate", evaluate)
+    assert sched.refresh(vow)
+    assert st.load("VOW.DE")[0].name == "VW"
+    sched.sync()
+    assert sched.levermann_objs["VOW.DE"].stock.name == "VW"
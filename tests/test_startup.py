@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+
+# prints the heavy modules that were imported by running the analyser
+# command with the passed arguments
+RUN_ANALYSER = """
+import runpy
+import sys
+sys.argv = ["analyser"] + sys.argv[1:]
+try:
+    runpy.run_path("analyser", run_name="__main__")
+except SystemExit:
+    pass
+print(" ".join(sorted(m for m in ("lxml", "requests", "numpy", "money")
+                      if m in sys.modules)))
+"""
+
+
+def imported_modules(*args):
+    out = subprocess.run([sys.executable, "-c", RUN_ANALYSER] + list(args),
+                         cwd=ROOT_PATH, check=True, stdout=subprocess.PIPE,
+                         universal_newlines=True).stdout
+    return out.splitlines()[-1].split()
+
+
+def test_help_imports():
+    assert imported_modules("--help") == []
+    assert imported_modules("update", "--help") == []
+
+
+def test_package_imports():
+    code = ("import sys\n"
+            "from stockanalyser import store, metrics, profiling\n"
+            "from stockanalyser.analysis import summary\n"
+            "import stockanalyser.analysis.levermann\n"
+            "print(sorted(m for m in ('lxml', 'requests', 'numpy')"
+            " if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT_PATH,
+                         check=True, stdout=subprocess.PIPE,
+                         universal_newlines=True).stdout
+    assert out.strip() == "[]"
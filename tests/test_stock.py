@@ -4,6 +4,7 @@ from datetime import date
 import pytest
 from stockanalyser.mymoney import Money
 from decimal import Decimal
+from money.exceptions import CurrencyMismatch
 
 def test_set_roe_value():
     cur_year = date.today().year
@@ -74,3 +75,27 @@ def test_per():
     assert round(s.price_earnings_ratio_5year(), 3) == round(per, 3)
 
     assert s.price_earnings_ratio() == (s.quote / 2)
+
+
+def test_currency_mismatch():
+    cur_year = date.today().year
+    s = Stock("VOW.DE")
+    s.set_quote(Money(10, "EUR"))
+    assert s.quote_value() == 10.0
+    s.set_eps(cur_year, Money(2, "EUR"))
+    assert s.price_earnings_ratio_value() == 5.0
+
+    with pytest.raises(CurrencyMismatch):
+        s.set_eps(cur_year + 1, Money(2, "USD"))
+    assert cur_year + 1 not in s.eps
+
+
+def test_unpickle_without_quote_amount():
+    s = Stock("VOW.DE")
+    s.set_quote(Money(10, "EUR"))
+    state = dict(s.__dict__)
+    del state["quote_amount"]
+
+    s = Stock.__new__(Stock)
+    s.__setstate__(state)
+    assert s.quote_value() == 10.0
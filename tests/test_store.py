@@ -0,0 +1,197 @@
+from stockanalyser.stock import EPS
+from stockanalyser import store
+from stockanalyser.analysis import levermann
+from stockanalyser.store import Store, NotFoundError
+from stockanalyser.analysis.levermann import (LevermannResult, CriteriaRating,
+                                              load_levermann,
+                                              load_levermann_objs)
+from stockanalyser.mymoney import Money
+import datetime
+import pickle
+import sqlite3
+import pytest
+
+
+def test_save_load(tmpdir, levermann_obj):
+    st = Store(str(tmpdir.join("store.sqlite")))
+    levermann_obj("VOW.DE", [3, 5]).save(st)
+    levermann_obj("BAS.DE", [1]).save(st)
+
+    assert st.symbols() == ["BAS.DE", "VOW.DE"]
+    assert st.contains("VOW.DE")
+    assert not st.contains("SIE.DE")
+    assert st.symbol_by_isin("DEVOW.DE") == "VOW.DE"
+
+    l = load_levermann("VOW.DE", st)
+    assert l.stock.name == "VOW.DE"
+    assert l.reference_index == "^GDAXI"
+    assert [r.score for r in l.evaluation_results] == [3, 5]
+    assert l.evaluation_results[0].roe.value == 12.5
+
+    assert [x.stock.symbol for x in load_levermann_objs(st)] == ["BAS.DE",
+                                                                "VOW.DE"]
+    assert [s for _, s in st.history("VOW.DE")] == [3, 5]
+    assert [(sym, s) for sym, _, _, s in st.latest_scores()] == [
+        ("BAS.DE", 1), ("VOW.DE", 5)]
+
+    with pytest.raises(NotFoundError):
+        load_levermann("SIE.DE", st)
+
+
+def test_revisions(tmpdir, levermann_obj):
+    st = Store(str(tmpdir.join("store.sqlite")))
+    l = levermann_obj("VOW.DE", [3])
+    assert l.save(st) == 1
+    assert l.save(st) == 2
+    levermann_obj("BAS.DE", [1]).save(st)
+    assert st.revision("VOW.DE") == 2
+    assert st.revisions() == {"BAS.DE": 1, "VOW.DE": 2}
+
+    with pytest.raises(NotFoundError):
+        st.revision("SIE.DE")
+
+
+def test_migrate_revision(tmpdir, levermann_obj):
+    path = str(tmpdir.join("store.sqlite"))
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE stock (symbol TEXT PRIMARY KEY, isin TEXT,"
+                 " name TEXT, cap_type INTEGER, reference_index TEXT,"
+                 " data BLOB NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    st = Store(path)
+    assert levermann_obj("VOW.DE", [3]).save(st) == 1
+
+
+def test_save_new_evaluations(tmpdir, monkeypatch, levermann_obj):
+    st = Store(str(tmpdir.join("store.sqlite")))
+    l = levermann_obj("VOW.DE", [3, 5])
+    l.save(st)
+
+    serialized = []
+    criteria = store._criteria
+    monkeypatch.setattr(store, "_criteria",
+                        lambda r: serialized.append(r) or criteria(r))
+    r = LevermannResult()
+    r.timestamp = datetime.datetime(2017, 1, 5, 12)
+    r._score = 7
+    l.evaluation_results.append(r)
+    l.save(st)
+    # the stored results aren't serialized again
+    assert serialized == [r]
+    assert [s for _, s in st.history("VOW.DE")] == [3, 5, 7]
+
+
+def test_fundamentals_snapshots(tmpdir, levermann_obj):
+    st = Store(str(tmpdir.join("store.sqlite")))
+    l = levermann_obj("VOW.DE", [3])
+    l.save(st)
+    l.save(st)
+    assert len(st.fundamentals_history("VOW.DE")) == 1
+
+    l.stock.set_roe(2016, 15)
+    l.save(st)
+    h = st.fundamentals_history("VOW.DE")
+    assert len(h) == 2
+    assert h[-1][1]["roe"] == {"2016": 15}
+
+
+def test_migrate_pickles(tmpdir, levermann_obj):
+    l = levermann_obj("VOW.DE", [3, 4])
+    with open(str(tmpdir.join("vow.de.levermann.pickle")), "wb") as f:
+        pickle.dump(l, f)
+
+    st = Store(str(tmpdir.join("store.sqlite")))
+    assert st.migrate_pickles(str(tmpdir)) == ["VOW.DE"]
+    assert [s for _, s in st.history("VOW.DE")] == [3, 4]
+
+
+def test_summaries(tmpdir, levermann_obj):
+    st = Store(str(tmpdir.join("store.sqlite")))
+    levermann_obj("VOW.DE", [3, 5]).save(st)
+    levermann_obj("BAS.DE", [7]).save(st)
+
+    summaries = list(st.summaries())
+    assert [s.symbol for s in summaries] == ["BAS.DE", "VOW.DE"]
+    s = summaries[1]
+    assert (s.score, s.prev_score) == (5, 3)
+    assert s.timestamp == datetime.datetime(2017, 1, 2, 12)
+    assert s.recommendation == "BUY"
+    assert s.latest_quarterly_figures_date == datetime.date(2017, 1, 17)
+    assert summaries[0].prev_timestamp is None
+
+    assert len(list(st.summaries(datetime.date(2017, 1, 16)))) == 0
+    assert len(list(st.summaries(datetime.date(2017, 1, 17)))) == 2
+
+
+def test_load_pickles_without_slots(monkeypatch, levermann_obj):
+    # pickles that were created before the classes used __slots__ contain
+    # the attributes as dict
+    def dict_state(obj):
+        return {k: getattr(obj, k) for k in obj.__slots__ if hasattr(obj, k)}
+
+    l = levermann_obj("VOW.DE", [3])
+    r = l.evaluation_results[0]
+    del r.fingerprints
+    with monkeypatch.context() as m:
+        for cls in (LevermannResult, CriteriaRating, EPS):
+            m.setattr(cls, "__getstate__", dict_state)
+        data = pickle.dumps((l.stock, r))
+
+    stock, r = pickle.loads(data)
+    assert stock.eps[2017][0].value == Money(1, "EUR")
+    assert r.timestamp == datetime.datetime(2017, 1, 1, 12)
+    assert r.score == 3
+    assert r.roe.value == 12.5
+    assert r.fingerprints == {}
+
+    r2 = pickle.loads(pickle.dumps(r))
+    assert r2.roe.points == 0
+    assert not hasattr(r2, "__dict__")
+
+
+def test_load_tuple_state_pickles(monkeypatch, levermann_obj):
+    # LevermannResult pickles that stored the state as tuple
+    r = levermann_obj("VOW.DE", [3]).evaluation_results[0]
+    r.fingerprints = {"roe": "abc"}
+    with monkeypatch.context() as m:
+        m.setattr(LevermannResult, "__getstate__",
+                  lambda obj: tuple(getattr(obj, k) for k in
+                                    levermann._TUPLE_STATE_SLOTS))
+        data = pickle.dumps(r)
+
+    r = pickle.loads(data)
+    assert r.score == 3
+    assert r.roe.value == 12.5
+    assert r.fingerprints == {"roe": "abc"}
+    assert isinstance(r.__getstate__(), dict)
+
+
+def test_migrate_criteria(tmpdir, levermann_obj):
+    path = str(tmpdir.join("store.sqlite"))
+    r = levermann_obj("VOW.DE", [3]).evaluation_results[0]
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE evaluation (symbol TEXT NOT NULL, timestamp"
+                 " TEXT NOT NULL, score INTEGER NOT NULL, data BLOB NOT NULL,"
+                 " PRIMARY KEY (symbol, timestamp))")
+    conn.execute("INSERT INTO evaluation VALUES (?, ?, ?, ?)",
+                 ("VOW.DE", r.timestamp.isoformat(), 3, pickle.dumps(r)))
+    conn.commit()
+    conn.close()
+
+    st = Store(path)
+    assert st.evaluations("VOW.DE") == [
+        (r.timestamp, 3, {"roe": {"value": 12.5, "points": 0}})]
+
+
+def test_parse_ts():
+    for ts in (datetime.datetime(2017, 1, 2, 12, 30),
+               datetime.datetime(2017, 1, 2, 12, 30, 5, 123)):
+        assert store._parse_ts(ts.isoformat()) == ts
+    assert store._parse_ts(None) is None
+
+
+def test_parse_date():
+    assert store._parse_date("2017-01-02") == datetime.date(2017, 1, 2)
+    assert store._parse_date(None) is None
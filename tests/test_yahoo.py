@@ -0,0 +1,84 @@
+from stockanalyser.data_source import yahoo
+import json
+import pytest
+
+SUMMARY = {"summaryDetail": {"marketCap": {"raw": 73500000000},
+                             "previousClose": {"raw": 148.52},
+                             "currency": "EUR"},
+           "price": {"shortName": "VOLKSWAGEN AG VZ {ä}"}}
+
+
+def page(summary=SUMMARY):
+    state = {"context": {"dispatcher": {"stores": {
+        "PageStore": {"junk": ["x" * 50, "}{\"ü"] * 500},
+        "QuoteSummaryStore": summary,
+        "StreamStore": {"QuoteSummaryStore": None}}}}}
+    return ("<html><script>\n"
+            "root.App.main = %s;\n"
+            "}(this));\n</script></html>" % json.dumps(
+                state, ensure_ascii=False)).encode("utf-8")
+
+
+def test_extract_quote_summary(monkeypatch):
+    assert yahoo.extract_quote_summary(page()) == SUMMARY
+
+    # the window has to be grown multiple times
+    big = dict(SUMMARY, junk="ä" * 10000)
+    monkeypatch.setattr(yahoo, "EXTRACT_WINDOW", 64)
+    assert yahoo.extract_quote_summary(page(big)) == big
+
+
+def test_extract_missing():
+    with pytest.raises(yahoo.EmptyStockDataResponse):
+        yahoo.extract_quote_summary(b"<html></html>")
+    with pytest.raises(ValueError):
+        p = page()
+        yahoo.extract_quote_summary(p[:p.find(b"previousClose")])
+
+
+def test_get_stock_info(monkeypatch):
+    monkeypatch.setattr(yahoo.common, "fetch", lambda url: page())
+    assert yahoo.get_stock_info("VOW3.DE") == {
+        "Name": "VOLKSWAGEN AG VZ {ä}", "PreviousClose": 148.52,
+        "Currency": "EUR", "MarketCapitalization": 73500000000}
+
+
+def test_get_stock_infos(monkeypatch):
+    quotes = {"VOW3.DE": {"symbol": "VOW3.DE", "shortName": "VOLKSWAGEN",
+                          "regularMarketPreviousClose": 148.52,
+                          "currency": "EUR", "marketCap": 73500000000},
+              "SIE.DE": {"symbol": "SIE.DE", "shortName": "SIEMENS"}}
+    requested = []
+
+    def fetch_json(url):
+        requested.append(url)
+        symbols = yahoo.urllib.parse.parse_qs(
+            yahoo.urllib.parse.urlsplit(url).query)["symbols"][0]
+        return {"quoteResponse": {"result": [quotes[s] for s in
+                                             symbols.split(",")
+                                             if s in quotes]}}
+
+    def fetch(url):
+        requested.append(url)
+        if url.endswith("SIE.DE"):
+            return page()
+        raise yahoo.requests.HTTPError("404")
+
+    monkeypatch.setattr(yahoo, "QUOTE_BATCH_SIZE", 2)
+    monkeypatch.setattr(yahoo.common, "fetch_json", fetch_json)
+    monkeypatch.setattr(yahoo.common, "fetch", fetch)
+
+    infos = yahoo.prefetch_stock_infos(["VOW3.DE", "SIE.DE", "XXX"])
+    # SIE.DE is incomplete in the quote API response, its quote page is
+    # fetched, XXX can't be retrieved at all
+    assert sorted(infos) == ["SIE.DE", "VOW3.DE"]
+    assert infos["VOW3.DE"] == {"Name": "VOLKSWAGEN", "PreviousClose": 148.52,
+                                "Currency": "EUR",
+                                "MarketCapitalization": 73500000000}
+    assert infos["SIE.DE"]["Name"] == "VOLKSWAGEN AG VZ {ä}"
+    assert len(requested) == 4
+
+    # prefetched infos are used once
+    assert yahoo.get_stock_info("VOW3.DE") == infos["VOW3.DE"]
+    with pytest.raises(yahoo.requests.HTTPError):
+        yahoo.get_stock_info("VOW3.DE")